@@ -1,4 +1,4 @@
-import datetime
+from datetime import datetime
 import httpx
 import json
 from typing import Dict, Optional
@@ -0,0 +1,382 @@
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import fcntl
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from app.config import settings
+
+# ElevenLabs output formats are "<codec>_<sample rate>[_<bitrate>]"; Twilio plays raw 8 kHz μ-law as audio/ulaw
+MEDIA_TYPES = {"mp3": "audio/mpeg", "ulaw": "audio/ulaw", "pcm": "audio/L16"}
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+REGISTERED_KEYS = 10000
+TIMINGS = 1000
+LOCK_POLL_SECONDS = 0.02
+PRUNE_INTERVAL_SECONDS = 300
+
+def percentile(values: Iterable[float], fraction: float) -> Optional[float]:
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)], 1)
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """First and last byte of a single-range Range header; None for the whole file.
+
+    Raises ValueError if the range can't be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        # Multiple ranges or other units: serve the whole file, as the spec allows
+        return None
+    start, end = match.groups()
+    if not start:
+        # "bytes=-500" is the last 500 bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range {header} is outside {size} bytes")
+    return start, end
+
+class AudioCache:
+    """Synthesised speech on disk, keyed by a hash of voice, model, format and text.
+
+    Keys are stable across workers and restarts, so a URL handed to Twilio by
+    one worker can be served by any other. A SQLite manifest maps each key to
+    the text it stands for, so audio is synthesised the first time it is
+    fetched, and tracks sizes and last use for least-recently-used eviction
+    once the files pass ``max_bytes``; pinned keys are never evicted. Rows
+    left without audio, evicted or never fetched, are dropped from the
+    manifest once unused for ``manifest_ttl_seconds``.
+    Requests for audio that is still being synthesised wait for it instead of
+    synthesising it again. ``stream`` forwards audio as it is synthesised
+    while writing it to disk; ``first_byte_ms`` and ``complete_ms`` time each
+    miss to its first and last byte.
+    """
+
+    def __init__(self, path: str, max_bytes: int, manifest_ttl_seconds: float = 86400):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.manifest_ttl_seconds = manifest_ttl_seconds
+        self.inflight: Dict[str, asyncio.Future] = {}
+        # Keys this worker has registered and when, so repeat phrases skip the manifest write
+        self.registered: "OrderedDict[str, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+        self.pruned = 0
+        self.pruned_at: Optional[float] = None
+        self.first_byte_ms: deque = deque(maxlen=TIMINGS)
+        self.complete_ms: deque = deque(maxlen=TIMINGS)
+        self.lock = threading.Lock()
+        self.db = None
+
+    @staticmethod
+    def key(voice_id: str, model_id: str, output_format: str, text: str) -> str:
+        """Stable key for a text spoken by a voice"""
+        return hashlib.sha256("\0".join([voice_id, model_id, output_format, text.strip()]).encode()).hexdigest()
+
+    def register(self, text: str, voice_id: str, model_id: Optional[str] = None, output_format: Optional[str] = None) -> str:
+        """Record what a key stands for, so any worker can synthesise it when asked; returns the key"""
+        return self.register_many([text], voice_id, model_id, output_format)[0]
+
+    def register_many(self, texts: List[str], voice_id: str, model_id: Optional[str] = None, output_format: Optional[str] = None) -> List[str]:
+        """Register several texts in one manifest write; returns their keys"""
+        model_id = model_id or settings.elevenlabs_model_id
+        output_format = output_format or settings.elevenlabs_output_format
+        keys = [self.key(voice_id, model_id, output_format, text) for text in texts]
+        if self.known(keys):
+            return keys
+        now = time.time()
+        # Registering counts as use, so a key handed out in a URL isn't pruned before it is fetched
+        self._execute(
+            "INSERT INTO audio (key, voice_id, model_id, output_format, text, size, last_used) "
+            "VALUES (?, ?, ?, ?, ?, NULL, ?) ON CONFLICT (key) DO UPDATE SET last_used = excluded.last_used",
+            [(key, voice_id, model_id, output_format, text.strip(), now) for key, text in zip(keys, texts)],
+            many=True
+        )
+        with self.lock:
+            for key in keys:
+                self.registered[key] = now
+            while len(self.registered) > REGISTERED_KEYS:
+                self.registered.popitem(last=False)
+        return keys
+
+    async def aregister(self, texts: List[str], voice_id: str, model_id: Optional[str] = None, output_format: Optional[str] = None) -> List[str]:
+        """``register_many`` for the event loop: keys are hashed inline, and only unknown ones cost a write, in a thread"""
+        model_id = model_id or settings.elevenlabs_model_id
+        output_format = output_format or settings.elevenlabs_output_format
+        keys = [self.key(voice_id, model_id, output_format, text) for text in texts]
+        if self.known(keys):
+            return keys
+        # Written before the keys are handed out, so no worker can be asked for one it can't look up
+        return await asyncio.to_thread(self.register_many, texts, voice_id, model_id, output_format)
+
+    def known(self, keys: List[str]) -> bool:
+        """Whether this worker has registered all of the keys already, so repeat phrases skip the manifest"""
+        # Registered again after half the TTL, so a key still in use never ages out of the manifest
+        fresh_since = time.time() - self.manifest_ttl_seconds / 2
+        with self.lock:
+            if not all(self.registered.get(key, 0) > fresh_since for key in keys):
+                return False
+            for key in keys:
+                self.registered.move_to_end(key)
+            return True
+
+    def pin(self, owner: str, keys: List[str]):
+        """Keep an owner's keys on disk through eviction, replacing what it pinned before"""
+        self._execute("DELETE FROM pins WHERE owner = ?", (owner,))
+        for key in keys:
+            self._execute("INSERT OR IGNORE INTO pins (owner, key) VALUES (?, ?)", (owner, key))
+
+    def exists(self, key: str, output_format: str) -> bool:
+        return os.path.exists(self.file_path(key, output_format))
+
+    def entry(self, key: str) -> Optional[Dict]:
+        """What a key stands for, or None if it was never registered"""
+        rows = self._execute("SELECT voice_id, model_id, output_format, text FROM audio WHERE key = ?", (key,))
+        if not rows:
+            return None
+        return dict(zip(("voice_id", "model_id", "output_format", "text"), rows[0]))
+
+    def file_path(self, key: str, output_format: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.{output_format.split('_')[0]}")
+
+    @staticmethod
+    def media_type(output_format: str) -> str:
+        return MEDIA_TYPES.get(output_format.split("_")[0], "application/octet-stream")
+
+    async def get(self, key: str, synthesise: Callable[[Dict], Awaitable[Optional[bytes]]]) -> Optional[str]:
+        """Path to a key's audio, synthesising it first if needed; None if unknown or synthesis failed"""
+        entry = await asyncio.to_thread(self.entry, key)
+        if entry is None:
+            return None
+        path = self.file_path(key, entry["output_format"])
+        if self.exists(key, entry["output_format"]):
+            self.hits += 1
+            await asyncio.to_thread(self.touch, key)
+            return path
+
+        task = self.inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._start(key, self.fill(key, entry, synthesise))
+        else:
+            self.waits += 1
+        # A caller hanging up mustn't cancel the synthesis others are waiting for
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, entry: Dict, synthesise: Callable[[Dict], AsyncIterator[bytes]]) -> Optional[AsyncIterator[bytes]]:
+        """Audio for a key chunk by chunk as it is synthesised; None if synthesis failed.
+
+        The first chunk has arrived by the time this returns, so a failure can
+        still be reported before a response is started. Synthesis carries on
+        to disk if the caller stops reading, and other requests for the key
+        wait for the file as they do for ``get``.
+        """
+        chunks: asyncio.Queue = asyncio.Queue()
+        self.misses += 1
+        task = self._start(key, self.fill_stream(key, entry, synthesise, chunks.put_nowait))
+        # Queued after every chunk, since the fill hands those over before it returns
+        task.add_done_callback(lambda _: chunks.put_nowait(None))
+
+        first = await chunks.get()
+        if first is None:
+            path = task.result()
+            if path is None:
+                return None
+            # Another worker had written it already
+            with open(path, "rb") as f:
+                first = f.read()
+
+        async def forward() -> AsyncIterator[bytes]:
+            chunk = first
+            while chunk is not None:
+                yield chunk
+                chunk = await chunks.get()
+
+        return forward()
+
+    def _start(self, key: str, fill) -> asyncio.Future:
+        task = asyncio.ensure_future(fill)
+        self.inflight[key] = task
+        task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return task
+
+    async def fill(self, key: str, entry: Dict, synthesise: Callable[[Dict], Awaitable[Optional[bytes]]]) -> Optional[str]:
+        """Synthesise a key's audio unless another worker has meanwhile"""
+        async def chunks(entry: Dict) -> AsyncIterator[bytes]:
+            audio = await synthesise(entry)
+            if audio:
+                yield audio
+        return await self.fill_stream(key, entry, chunks)
+
+    async def fill_stream(
+        self,
+        key: str,
+        entry: Dict,
+        synthesise: Callable[[Dict], AsyncIterator[bytes]],
+        on_chunk: Optional[Callable[[bytes], None]] = None
+    ) -> Optional[str]:
+        """Write a key's audio as it is synthesised, passing each chunk to ``on_chunk``, unless another worker has meanwhile"""
+        path = self.file_path(key, entry["output_format"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        async with self.locked(os.path.dirname(path)):
+            if os.path.exists(path):
+                return path
+            started = time.perf_counter()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            size = 0
+            try:
+                with open(tmp_path, "wb") as f:
+                    async for chunk in synthesise(entry):
+                        if not chunk:
+                            continue
+                        if not size:
+                            self.first_byte_ms.append((time.perf_counter() - started) * 1000)
+                        f.write(chunk)
+                        size += len(chunk)
+                        if on_chunk:
+                            on_chunk(chunk)
+            except Exception as e:
+                # A caller may have heard part of it, but a truncated clip is never cached
+                print(f"Error synthesising audio {key}: {e}")
+                size = 0
+            except asyncio.CancelledError:
+                # The worker is shutting down mid-synthesis
+                os.remove(tmp_path)
+                raise
+            if not size:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return None
+            # Readers see the whole file or none of it
+            os.replace(tmp_path, path)
+            self.complete_ms.append((time.perf_counter() - started) * 1000)
+        await asyncio.to_thread(self._execute, "UPDATE audio SET size = ?, last_used = ? WHERE key = ?", (size, time.time(), key))
+        await asyncio.to_thread(self.evict)
+        return path
+
+    @asynccontextmanager
+    async def locked(self, directory: str):
+        """Hold a key prefix's lock file; workers on the host wait on it rather than synthesising too.
+
+        The lock is polled rather than waited for, so a worker whose loop is
+        waiting holds no thread while another worker synthesises.
+        """
+        with open(os.path.join(directory, ".lock"), "w") as lock:
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(LOCK_POLL_SECONDS)
+            yield
+
+    def touch(self, key: str):
+        self._execute("UPDATE audio SET last_used = ? WHERE key = ?", (time.time(), key))
+
+    def evict(self):
+        """Delete the least recently used files until the cache fits in max_bytes, and prune the manifest"""
+        total = self._execute("SELECT COALESCE(SUM(size), 0) FROM audio", ())[0][0]
+        if total <= self.max_bytes:
+            self.maybe_prune()
+            return
+        rows = self._execute(
+            "SELECT key, output_format, size FROM audio WHERE size IS NOT NULL "
+            "AND key NOT IN (SELECT key FROM pins) ORDER BY last_used",
+            ()
+        )
+        for key, output_format, size in rows:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.file_path(key, output_format))
+            except FileNotFoundError:
+                pass
+            # The manifest keeps the text until the row is pruned, so the audio is synthesised again if asked for
+            self._execute("UPDATE audio SET size = NULL WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+        self.prune()
+
+    def maybe_prune(self):
+        """Prune the manifest if it hasn't been for a while"""
+        now = time.monotonic()
+        with self.lock:
+            if self.pruned_at is not None and now - self.pruned_at < PRUNE_INTERVAL_SECONDS:
+                return
+            self.pruned_at = now
+        self.prune()
+
+    def prune(self) -> int:
+        """Delete manifest rows without audio that are unused for the TTL and not pinned; returns how many"""
+        rows = self._execute(
+            "DELETE FROM audio WHERE size IS NULL AND last_used < ? "
+            "AND key NOT IN (SELECT key FROM pins) RETURNING key",
+            (time.time() - self.manifest_ttl_seconds,)
+        )
+        with self.lock:
+            for (key,) in rows:
+                self.registered.pop(key, None)
+            self.pruned += len(rows)
+        return len(rows)
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters and disk usage for monitoring"""
+        size, files = self._execute("SELECT COALESCE(SUM(size), 0), COUNT(size) FROM audio", ())[0]
+        lookups = self.hits + self.misses + self.waits
+        return {
+            "files": files,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "evictions": self.evictions,
+            "pruned": self.pruned,
+            "first_byte_ms_p50": percentile(self.first_byte_ms, 0.5),
+            "first_byte_ms_p95": percentile(self.first_byte_ms, 0.95),
+            "complete_ms_p50": percentile(self.complete_ms, 0.5),
+            "complete_ms_p95": percentile(self.complete_ms, 0.95),
+            "hit_rate": ((self.hits + self.waits) / lookups * 100) if lookups > 0 else 0
+        }
+
+    def _execute(self, sql: str, params, many: bool = False) -> list:
+        """Run a statement on the manifest, or ``many`` times over a list of parameters, opening it on first use"""
+        with self.lock:
+            if self.db is None:
+                os.makedirs(self.path, exist_ok=True)
+                self.db = sqlite3.connect(os.path.join(self.path, "manifest.db"), timeout=5, check_same_thread=False)
+                # WAL lets several workers read while one writes
+                self.db.execute("PRAGMA journal_mode=WAL")
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS audio (key TEXT PRIMARY KEY, voice_id TEXT, model_id TEXT, "
+                    "output_format TEXT, text TEXT, size INTEGER, last_used REAL)"
+                )
+                self.db.execute("CREATE INDEX IF NOT EXISTS audio_last_used ON audio (last_used)")
+                self.db.execute("CREATE TABLE IF NOT EXISTS pins (owner TEXT, key TEXT, PRIMARY KEY (owner, key))")
+                self.db.execute("CREATE INDEX IF NOT EXISTS pins_key ON pins (key)")
+            if many:
+                self.db.executemany(sql, params)
+                rows = []
+            else:
+                rows = self.db.execute(sql, params).fetchall()
+            self.db.commit()
+            return rows
+
+audio_cache = AudioCache(
+    settings.audio_cache_path,
+    settings.audio_cache_max_mb * 1024 * 1024,
+    settings.audio_cache_manifest_ttl_seconds
+)
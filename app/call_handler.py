@@ -1,73 +1,342 @@
-import datetime
-from typing import Dict, List, Optional
+import asyncio
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Tuple
 import json
 import re
+import time
 
 from app.appointment_service import AppointmentService
-from app.llm_service import LLMService
+from app.call_log_writer import call_log_writer
+from app.config import settings
+from app.conversation_store import ConversationStore, create_conversation_store
+from app.response_cache import response_cache
+from app.speech_chunker import SpeechChunker
+
+if TYPE_CHECKING:
+    from app.llm_service import LLMService
+
+BOOKING_CONFIRMED = "Perfect! I've booked your appointment. You'll receive a confirmation shortly. Is there anything else I can help you with?"
+BOOKING_FAILED = "I apologize, but I'm having trouble booking your appointment right now. Let me have someone call you back to confirm the details."
+BOOKING_CALLBACK = "I'd be happy to help you book an appointment. Let me have someone call you back to confirm the details."
+STREAM_FAILED = "I'm sorry, I didn't catch that. Could you say it again?"
+DEADLINE_MISSED = "I'm sorry, that's taking me longer than expected. Could you say that again?"
+
+def elapsed_ms(started: float) -> int:
+    """Milliseconds since a time.monotonic() reading"""
+    return int((time.monotonic() - started) * 1000)
+
+async def replay(text: str) -> AsyncIterator[str]:
+    """Yield a stored answer as if it had been streamed"""
+    yield text
+
+class SpeechTurn:
+    """A caller turn whose reply is still being generated.
+    
+    Speakable chunks are queued as soon as the chunker produces them, so the
+    webhook can answer with the first sentence while the rest streams in.
+    """
+    
+    def __init__(self, user_input: str):
+        self.user_input = user_input
+        self.chunks: asyncio.Queue = asyncio.Queue()
+        self.result: Optional[Dict] = None
+        self.task: Optional[asyncio.Task] = None
+    
+    @property
+    def finished(self) -> bool:
+        return self.result is not None and self.chunks.empty()
+    
+    async def next_chunks(self) -> List[str]:
+        """Wait for at least one chunk (or the end of the turn), then drain the rest"""
+        chunks = []
+        if self.chunks.empty() and self.result is None:
+            chunk = await self.chunks.get()
+            if chunk is not None:
+                chunks.append(chunk)
+        while not self.chunks.empty():
+            chunk = self.chunks.get_nowait()
+            if chunk is not None:
+                chunks.append(chunk)
+        return chunks
 
 class CallHandler:
-    def __init__(self):
-        self.llm_service = LLMService()
-        self.appointment_service = AppointmentService()
-        self.conversations = {}  # In production, use Redis
+    def __init__(
+        self,
+        conversation_store: Optional[ConversationStore] = None,
+        llm_service: Optional["LLMService"] = None,
+        appointment_service: Optional[AppointmentService] = None
+    ):
+        if llm_service is None:
+            # Imported here so importing this module doesn't pull in langchain
+            from app.llm_service import LLMService
+            llm_service = LLMService()
+        self.llm_service = llm_service
+        self.appointment_service = appointment_service or AppointmentService()
+        self.conversations = conversation_store or create_conversation_store()
+        self.active_turns: Dict[str, SpeechTurn] = {}
+        self.summarizing = set()
+        self.background_tasks = set()
     
-    def get_conversation_history(self, call_sid: str) -> List[Dict]:
+    async def get_conversation_history(self, call_sid: str) -> List[Dict]:
         """Get conversation history for a call"""
-        return self.conversations.get(call_sid, [])
+        return await self.conversations.get(call_sid)
     
-    def add_to_conversation(self, call_sid: str, role: str, content: str):
+    async def add_to_conversation(self, call_sid: str, role: str, content: str):
         """Add message to conversation history"""
-        if call_sid not in self.conversations:
-            self.conversations[call_sid] = []
+        await self.conversations.append(call_sid, role, content)
+    
+    async def end_conversation(self, call_sid: str):
+        """Drop a finished call's history and any reply still being generated"""
+        task = self.cancel_turn(call_sid)
+        if task is not None:
+            # Otherwise the cancelled turn could write to the history after it is dropped
+            await asyncio.wait([task])
+        await self.conversations.end(call_sid)
+    
+    async def book_from_response(self, client_data: Dict, appointment_json: str) -> Dict:
+        """Book the appointment requested by the model and pick the reply to speak"""
+        try:
+            appointment_data = json.loads(appointment_json.strip())
+            
+            # Book appointment
+            booking_result = await self.appointment_service.book_appointment(
+                client_data,
+                appointment_data
+            )
+            
+            if booking_result["success"]:
+                return {"response": BOOKING_CONFIRMED, "appointment_data": appointment_data}
+            return {"response": BOOKING_FAILED, "appointment_data": appointment_data}
         
-        self.conversations[call_sid].append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        except Exception as e:
+            return {"response": BOOKING_CALLBACK, "appointment_data": None}
+    
+    async def lookup_answer(self, client_data: Dict, user_input: str, history: List[Dict]) -> Tuple[Optional[str], Optional[List[float]]]:
+        """Look for a cached answer to the first question of a call.
+        
+        Returns the answer (if any) and the question embedding, which is needed
+        to store a freshly generated answer.
+        """
+        if not settings.semantic_cache_enabled or len(history) != 1:
+            return None, None
+        
+        embedding = await self.llm_service.vector_store.aembed_query(user_input)
+        return response_cache.lookup(client_data, embedding), embedding
     
     async def process_call(self, client_data: Dict, user_input: str, call_sid: str) -> Dict:
         """Process call and generate response"""
-        # Add user input to conversation
-        self.add_to_conversation(call_sid, "user", user_input)
+        received_at = datetime.utcnow()
+        started = time.monotonic()
         
-        # Get conversation history
-        history = self.get_conversation_history(call_sid)
-        
-        # Generate AI response
-        ai_response = self.llm_service.generate_response(
-            client_data, 
-            user_input, 
-            history
-        )
+        # Add user input to conversation
+        await self.add_to_conversation(call_sid, "user", user_input)
         
-        # Check if response contains appointment booking request
-        appointment_data = None
-        if "BOOK_APPOINTMENT:" in ai_response:
-            try:
-                appointment_json = ai_response.split("BOOK_APPOINTMENT:")[1].strip()
-                appointment_data = json.loads(appointment_json)
-                
-                # Book appointment
-                booking_result = await self.appointment_service.book_appointment(
-                    client_data, 
-                    appointment_data
+        result = {"received_at": received_at}
+        try:
+            # Get conversation history
+            history = await self.get_conversation_history(call_sid)
+            result["seq"] = len(history) - 1
+            
+            # Serve repeat questions from the semantic cache
+            cached_answer, question_embedding = await self.lookup_answer(client_data, user_input, history)
+            
+            # Generate AI response
+            turn_stats = {}
+            if cached_answer is not None:
+                ai_response = cached_answer
+            else:
+                summary, summarized = await self.conversations.get_summary(call_sid)
+                ai_response = await self.llm_service.agenerate_response(
+                    client_data,
+                    user_input,
+                    history,
+                    turn_stats,
+                    summary,
+                    summarized
                 )
-                
-                if booking_result["success"]:
-                    ai_response = "Perfect! I've booked your appointment. You'll receive a confirmation shortly. Is there anything else I can help you with?"
-                else:
-                    ai_response = "I apologize, but I'm having trouble booking your appointment right now. Let me have someone call you back to confirm the details."
+                if question_embedding is not None and "BOOK_APPOINTMENT:" not in ai_response:
+                    response_cache.store(client_data, user_input, question_embedding, ai_response, time.monotonic() - started)
             
-            except Exception as e:
-                ai_response = "I'd be happy to help you book an appointment. Let me have someone call you back to confirm the details."
+            # Check if response contains appointment booking request
+            appointment_data = None
+            if "BOOK_APPOINTMENT:" in ai_response:
+                booking = await self.book_from_response(
+                    client_data,
+                    ai_response.split("BOOK_APPOINTMENT:")[1]
+                )
+                ai_response = booking["response"]
+                appointment_data = booking["appointment_data"]
+        except asyncio.CancelledError:
+            # Cut off by the deadline; the webhook only logs turns that were answered
+            await self.record_missed_turn(call_sid, user_input, result)
+            raise
         
         # Add AI response to conversation
-        self.add_to_conversation(call_sid, "assistant", ai_response)
+        await self.add_to_conversation(call_sid, "assistant", ai_response)
+        self.schedule_summary(call_sid)
         
-        return {
+        latency_ms = elapsed_ms(started)
+        result.update({
             "response": ai_response,
             "appointment_booked": appointment_data is not None,
-            "appointment_data": appointment_data
-        }
\ No newline at end of file
+            "appointment_data": appointment_data,
+            "prompt_tokens": turn_stats.get("prompt_tokens"),
+            "completed_at": datetime.utcnow(),
+            "first_chunk_ms": latency_ms,
+            "latency_ms": latency_ms
+        })
+        return result
+    
+    async def stream_call(self, client_data: Dict, user_input: str, call_sid: str, result: Dict) -> AsyncIterator[str]:
+        """Process call and yield speakable chunks while the response is generated.
+        
+        ``result`` is filled with the same fields ``process_call`` returns once
+        the stream is exhausted.
+        """
+        started = time.monotonic()
+        result["received_at"] = datetime.utcnow()
+        
+        await self.add_to_conversation(call_sid, "user", user_input)
+        history = await self.get_conversation_history(call_sid)
+        result["seq"] = len(history) - 1
+        
+        cached_answer, question_embedding = await self.lookup_answer(client_data, user_input, history)
+        
+        chunker = SpeechChunker()
+        spoken = []
+        turn_stats = {}
+        if cached_answer is not None:
+            tokens = replay(cached_answer)
+        else:
+            summary, summarized = await self.conversations.get_summary(call_sid)
+            tokens = self.llm_service.stream_response(client_data, user_input, history, turn_stats, summary, summarized)
+        
+        async for token in tokens:
+            for chunk in chunker.feed(token):
+                result.setdefault("first_chunk_ms", elapsed_ms(started))
+                spoken.append(chunk)
+                yield chunk
+        for chunk in chunker.flush():
+            result.setdefault("first_chunk_ms", elapsed_ms(started))
+            spoken.append(chunk)
+            yield chunk
+        
+        # The raw booking JSON is never spoken; announce the outcome instead
+        appointment_data = None
+        if chunker.booking_payload is not None:
+            booking = await self.book_from_response(client_data, chunker.booking_payload)
+            appointment_data = booking["appointment_data"]
+            spoken.append(booking["response"])
+            yield booking["response"]
+        
+        ai_response = " ".join(spoken)
+        # Filled before the reply is stored, so a turn cancelled from here on isn't also recorded as missed
+        result.update({
+            "response": ai_response,
+            "appointment_booked": appointment_data is not None,
+            "appointment_data": appointment_data,
+            "prompt_tokens": turn_stats.get("prompt_tokens"),
+            "completed_at": datetime.utcnow(),
+            "latency_ms": elapsed_ms(started)
+        })
+        await self.add_to_conversation(call_sid, "assistant", ai_response)
+        self.schedule_summary(call_sid)
+        
+        if cached_answer is None and question_embedding is not None and chunker.booking_payload is None:
+            response_cache.store(client_data, user_input, question_embedding, ai_response, time.monotonic() - started)
+    
+    async def record_missed_turn(self, call_sid: str, user_input: str, result: Dict):
+        """Record the fallback as the reply to a turn stopped before it was answered"""
+        if "seq" not in result or "response" in result:
+            # The utterance never reached the history, or the reply already did
+            return
+        result.update({
+            "response": DEADLINE_MISSED,
+            "appointment_booked": False,
+            "appointment_data": None,
+            "completed_at": datetime.utcnow()
+        })
+        # Keeps the history alternating, so the next prompt doesn't open with two caller turns
+        await self.add_to_conversation(call_sid, "assistant", DEADLINE_MISSED)
+        call_log_writer.log_turn(call_sid, user_input, result)
+    
+    def schedule_summary(self, call_sid: str):
+        """Update the call's rolling summary in the background"""
+        if call_sid in self.summarizing:
+            return
+        self.summarizing.add(call_sid)
+        task = asyncio.create_task(self.update_summary(call_sid))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+    
+    async def update_summary(self, call_sid: str):
+        """Fold turns that no longer fit the history budget into the summary"""
+        try:
+            history = await self.get_conversation_history(call_sid)
+            summary, summarized = await self.conversations.get_summary(call_sid)
+            builder = self.llm_service.context_builder
+            if builder.window_start(history) <= summarized:
+                return
+            
+            # Summarise down to half the budget so the next few turns fit without another pass
+            keep_from = builder.window_start(history, builder.token_budget // 2)
+            summary = await self.llm_service.summarize(summary, history[summarized:keep_from])
+            await self.conversations.set_summary(call_sid, summary, keep_from)
+        except Exception as e:
+            print(f"Error summarising conversation: {e}")
+        finally:
+            self.summarizing.discard(call_sid)
+    
+    def start_turn(self, client_data: Dict, user_input: str, call_sid: str) -> SpeechTurn:
+        """Start generating a reply in the background and return its turn"""
+        # A turn still streaming would otherwise append its reply after this one's utterance
+        previous = self.cancel_turn(call_sid)
+        turn = SpeechTurn(user_input)
+        self.active_turns[call_sid] = turn
+        
+        async def pump():
+            result = {}
+            try:
+                if previous is not None:
+                    # Let the superseded turn record its fallback before this utterance joins the history
+                    await asyncio.wait([previous])
+                async for chunk in self.stream_call(client_data, user_input, call_sid, result):
+                    turn.chunks.put_nowait(chunk)
+            except asyncio.CancelledError:
+                await self.record_missed_turn(call_sid, user_input, result)
+                turn.result = result
+                turn.chunks.put_nowait(None)
+                raise
+            except Exception as e:
+                print(f"Error streaming response: {e}")
+                result.update({
+                    "response": STREAM_FAILED,
+                    "appointment_booked": False,
+                    "appointment_data": None,
+                    "completed_at": datetime.utcnow()
+                })
+                turn.chunks.put_nowait(STREAM_FAILED)
+            turn.result = result
+            # Wake up a reader blocked on an empty queue
+            turn.chunks.put_nowait(None)
+            # Logged here rather than by the last redirect, which may never come or reach another worker
+            call_log_writer.log_turn(call_sid, user_input, result)
+        
+        turn.task = asyncio.create_task(pump())
+        return turn
+    
+    def get_turn(self, call_sid: str) -> Optional[SpeechTurn]:
+        """Get the turn still being spoken for a call"""
+        return self.active_turns.get(call_sid)
+    
+    def end_turn(self, call_sid: str):
+        """Forget a turn once all of its chunks have been spoken"""
+        self.active_turns.pop(call_sid, None)
+    
+    def cancel_turn(self, call_sid: str) -> Optional[asyncio.Task]:
+        """Stop generating a turn that missed its deadline or was superseded, returning its task"""
+        turn = self.active_turns.pop(call_sid, None)
+        if turn and turn.task:
+            turn.task.cancel()
+            return turn.task
+        return None
@@ -0,0 +1,211 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import asyncio
+
+from sqlalchemy import func, insert
+
+from app.config import settings
+from app.database import CallLog, CallTurn, SessionLocal
+
+# Pending write: ("call", CallLog row), ("turn", CallTurn row) or ("booked", {"call_sid": ...})
+Record = Tuple[str, Dict]
+
+class CallLogWriter:
+    """Write-behind queue for call logs and turns.
+    
+    Requests only enqueue rows; a background task writes them in batches once
+    ``batch_size`` rows are waiting or ``flush_seconds`` have passed. When the
+    queue is full, or the writer is not running, rows are written inline so
+    nothing is dropped.
+    """
+    
+    def __init__(self, max_queue: int = 10000, batch_size: int = 200, flush_seconds: float = 0.5):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue: Optional[asyncio.Queue] = None
+        self.batch_ready: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+        self.inline_writes = 0
+        self.retries = 0
+        self.dropped = 0
+    
+    def start(self):
+        """Start the background flush task on the running loop"""
+        if self.task is None:
+            self.queue = asyncio.Queue(self.max_queue)
+            self.batch_ready = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        """Flush everything still queued and stop the background task"""
+        if self.task is None:
+            return
+        await self.queue.put(None)
+        # Don't wait out the flush interval
+        self.batch_ready.set()
+        await self.task
+        self.task = None
+    
+    def log_call(self, client_id: str, caller_phone: str, call_sid: str):
+        """Record the start of a call"""
+        self.enqueue([("call", {
+            "client_id": client_id,
+            "caller_phone": caller_phone,
+            "call_sid": call_sid,
+            "conversation": None,
+            "appointment_booked": False,
+            "created_at": datetime.utcnow()
+        })])
+    
+    def log_turn(self, call_sid: str, user_input: str, result: Dict):
+        """Record a completed turn: the caller's utterance and the reply"""
+        seq = result.get("seq")
+        started_at = result.get("received_at") or datetime.utcnow()
+        records = [
+            ("turn", {
+                "call_sid": call_sid,
+                "seq": seq,
+                "role": "user",
+                "content": user_input,
+                "started_at": started_at,
+                "completed_at": None,
+                "first_chunk_ms": None,
+                "latency_ms": None,
+                "prompt_tokens": None
+            }),
+            ("turn", {
+                "call_sid": call_sid,
+                "seq": None if seq is None else seq + 1,
+                "role": "assistant",
+                "content": result["response"],
+                "started_at": started_at,
+                "completed_at": result.get("completed_at") or datetime.utcnow(),
+                "first_chunk_ms": result.get("first_chunk_ms"),
+                "latency_ms": result.get("latency_ms"),
+                "prompt_tokens": result.get("prompt_tokens")
+            })
+        ]
+        if result["appointment_booked"]:
+            records.append(("booked", {"call_sid": call_sid}))
+        self.enqueue(records)
+    
+    def enqueue(self, records: List[Record]):
+        """Queue rows for the next batch, writing them inline if the queue is saturated"""
+        if self.task is None or self.queue.maxsize - self.queue.qsize() < len(records):
+            self.inline_writes += 1
+            self.write(records)
+            return
+        for record in records:
+            self.queue.put_nowait(record)
+        if self.queue.qsize() >= self.batch_size:
+            self.batch_ready.set()
+    
+    async def run(self):
+        """Collect queued rows into batches and write them off the event loop"""
+        stopping = False
+        while not stopping:
+            first = await self.queue.get()
+            if first is not None:
+                # Give the batch time to fill unless it already has
+                try:
+                    await asyncio.wait_for(self.batch_ready.wait(), self.flush_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            self.batch_ready.clear()
+            
+            batch = []
+            record = first
+            while True:
+                if record is None:
+                    stopping = True
+                else:
+                    batch.append(record)
+                if len(batch) >= self.batch_size or self.queue.empty():
+                    break
+                record = self.queue.get_nowait()
+            
+            if batch:
+                await asyncio.to_thread(self.write, batch)
+    
+    def write(self, records: List[Record]):
+        """Write a batch, retrying it once, then row by row so only rows that can't be written are dropped"""
+        for attempt in range(2):
+            try:
+                self.insert(records)
+                self.written += len(records)
+                self.batches += 1
+                return
+            except Exception as e:
+                print(f"Error writing call logs: {e}")
+                if attempt == 0:
+                    self.retries += 1
+        
+        # One bad row, such as a duplicate call, mustn't take the rest of the batch with it
+        for record in records:
+            try:
+                self.insert([record])
+                self.written += 1
+            except Exception as e:
+                self.dropped += 1
+                print(f"Error writing call log row, dropped: {e}")
+    
+    def insert(self, records: List[Record]):
+        """Insert rows in a single transaction"""
+        calls = [row for kind, row in records if kind == "call"]
+        turns = [row for kind, row in records if kind == "turn"]
+        booked = {row["call_sid"] for kind, row in records if kind == "booked"}
+        
+        db = SessionLocal()
+        try:
+            self._assign_missing_seq(db, turns)
+            if calls:
+                db.execute(insert(CallLog), calls)
+            if turns:
+                db.execute(insert(CallTurn), turns)
+            if booked:
+                db.query(CallLog).filter(CallLog.call_sid.in_(booked)).update(
+                    {"appointment_booked": True}, synchronize_session=False
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def stats(self) -> Dict:
+        """Get queue depth and write counters for monitoring"""
+        return {
+            "queued": self.queue.qsize() if self.queue else 0,
+            "max_queue": self.max_queue,
+            "written": self.written,
+            "batches": self.batches,
+            "inline_writes": self.inline_writes,
+            "retries": self.retries,
+            "dropped": self.dropped
+        }
+    
+    @staticmethod
+    def _assign_missing_seq(db, turns: List[Dict]):
+        """Number turns that failed before the handler assigned them a position"""
+        next_seq: Dict[str, int] = {}
+        for row in turns:
+            if row["seq"] is not None:
+                next_seq[row["call_sid"]] = max(next_seq.get(row["call_sid"], 0), row["seq"] + 1)
+        for row in turns:
+            if row["seq"] is None:
+                call_sid = row["call_sid"]
+                if call_sid not in next_seq:
+                    last_seq = db.query(func.max(CallTurn.seq)).filter(CallTurn.call_sid == call_sid).scalar()
+                    next_seq[call_sid] = 0 if last_seq is None else last_seq + 1
+                row["seq"] = next_seq[call_sid]
+                next_seq[call_sid] += 1
+
+call_log_writer = CallLogWriter(
+    settings.call_log_queue_size,
+    settings.call_log_batch_size,
+    settings.call_log_flush_seconds
+)
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+import copy
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import Client
+
+def snapshot_client(client: Client) -> Mapping:
+    """Build a read-only view of the client fields used while handling calls"""
+    return MappingProxyType({
+        "client_id": client.client_id,
+        "business_name": client.business_name,
+        "industry": client.industry,
+        "business_hours": copy.deepcopy(client.business_hours),
+        "services": client.services,
+        "faqs": client.faqs,
+        "phone_number": client.phone_number,
+        "appointment_webhook_url": client.appointment_webhook_url,
+        "voice_id": client.voice_id,
+        "is_active": client.is_active,
+        "updated_at": client.updated_at
+    })
+
+class ClientCache:
+    """In-process LRU cache of client snapshots keyed by client_id and phone number.
+
+    Entries are dropped explicitly when a client is updated; the TTL bounds how
+    long another worker can keep serving a stale snapshot.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.snapshots: "OrderedDict[str, Tuple[float, Mapping]]" = OrderedDict()
+        self.phone_index: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_by_phone(self, db: Session, phone_number: str) -> Optional[Mapping]:
+        """Get the snapshot for the client that owns a dialed number"""
+        with self.lock:
+            snapshot = self._lookup(self.phone_index.get(phone_number))
+        if snapshot is not None:
+            return snapshot
+
+        client = db.query(Client).filter(Client.phone_number == phone_number).first()
+        return self.put(client) if client else None
+
+    def get_by_client_id(self, db: Session, client_id: str) -> Optional[Mapping]:
+        """Get the snapshot for a client by id"""
+        with self.lock:
+            snapshot = self._lookup(client_id)
+        if snapshot is not None:
+            return snapshot
+
+        client = db.query(Client).filter(Client.client_id == client_id).first()
+        return self.put(client) if client else None
+
+    def put(self, client: Client) -> Mapping:
+        """Cache a fresh snapshot of a client"""
+        snapshot = snapshot_client(client)
+        with self.lock:
+            self._drop(client.client_id)
+            self.snapshots[client.client_id] = (time.monotonic(), snapshot)
+            self.phone_index[client.phone_number] = client.client_id
+            while len(self.snapshots) > self.max_size:
+                oldest_id, _ = next(iter(self.snapshots.items()))
+                self._drop(oldest_id)
+        return snapshot
+
+    def invalidate(self, client_id: str):
+        """Forget a client after its profile changes"""
+        with self.lock:
+            self._drop(client_id)
+
+    def clear(self):
+        """Forget every cached client"""
+        with self.lock:
+            self.snapshots.clear()
+            self.phone_index.clear()
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.snapshots),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups * 100) if lookups > 0 else 0
+        }
+
+    def _lookup(self, client_id: Optional[str]) -> Optional[Mapping]:
+        """Return a live entry and count the lookup; caller holds the lock"""
+        entry = self.snapshots.get(client_id) if client_id else None
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            if entry is not None:
+                self._drop(client_id)
+            self.misses += 1
+            return None
+
+        self.snapshots.move_to_end(client_id)
+        self.hits += 1
+        return entry[1]
+
+    def _drop(self, client_id: str):
+        """Remove a client and its phone index entry; caller holds the lock"""
+        entry = self.snapshots.pop(client_id, None)
+        if entry is not None and self.phone_index.get(entry[1]["phone_number"]) == client_id:
+            del self.phone_index[entry[1]["phone_number"]]
+
+client_cache = ClientCache(settings.client_cache_size, settings.client_cache_ttl_seconds)
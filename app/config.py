@@ -12,6 +12,17 @@ class Settings(BaseSettings):
     
     # ElevenLabs
     elevenlabs_api_key: str
+    elevenlabs_model_id: str = "eleven_monolingual_v1"
+    elevenlabs_output_format: str = "ulaw_8000"  # What the phone network carries, so Twilio plays it without transcoding
+    elevenlabs_streaming_latency: str = "2"  # ElevenLabs' 0-4 trade of quality for time to first audio
+    elevenlabs_max_concurrency: int = 5  # The plan's concurrent requests (e.g. Creator 5, Pro 10) divided by worker processes
+    elevenlabs_max_retries: int = 3  # Retries of a request rejected with 429
+    elevenlabs_retry_seconds: float = 0.5  # First backoff delay; doubles on each retry
+    elevenlabs_timeout_seconds: float = 30.0
+    elevenlabs_voices_ttl_seconds: int = 3600  # The voice catalogue is refreshed in the background once older than this
+    
+    # Deepgram
+    deepgram_api_key: Optional[str] = None
     
     # Database
     database_url: str
@@ -24,11 +35,83 @@ class Settings(BaseSettings):
     debug: bool = False
     host: str = "0.0.0.0"
     port: int = 8000
+    warm_services_on_startup: bool = True  # Build LLM/vector/TTS clients in the background at startup
+    
+    # Calls
+    call_mode: str = "gather"  # "gather" (a webhook per turn) or "media_stream" (call audio over a WebSocket)
+    streaming_responses: bool = True  # Speak the first sentence while the rest generates
+    turn_deadline_seconds: float = 8.0  # Max silence before the caller hears a fallback
+    llm_max_concurrency: int = 20  # In-flight completions per worker
+    conversation_backend: str = "memory"  # "memory" or "redis" (shared across workers)
+    conversation_max_calls: int = 10000  # Calls kept by the memory backend
+    conversation_ttl_seconds: int = 3600  # Idle calls are forgotten after this
+    history_token_budget: int = 1200  # Prompt tokens for verbatim history; older turns are summarised
+    llm_model: str = "gpt-4o"
+    summary_model: str = "gpt-4o-mini"
+    call_log_queue_size: int = 10000  # Pending call log writes before falling back to inline writes
+    call_log_batch_size: int = 200
+    call_log_flush_seconds: float = 0.5
+    speech_recognizer: str = "whisper"  # media_stream STT: "whisper" (OpenAI, utterances cut at pauses) or "deepgram" (streaming)
+    whisper_model: str = "whisper-1"
+    vad_threshold: int = 800  # RMS of 16-bit samples counted as speech
+    vad_start_ms: int = 200  # Speech that starts an utterance (and interrupts the reply being spoken)
+    vad_end_ms: int = 600  # Silence that ends one
+    barge_in: bool = True  # Let callers talk over the assistant in media_stream mode
+    media_stream_voice_id: str = "21m00Tcm4TlvDq8ikWAM"  # For clients without a voice; Twilio's own TTS can't speak into a stream
+    
+    # Caches
+    client_cache_size: int = 1000
+    client_cache_ttl_seconds: int = 300
+    embedding_cache_path: str = "./cache/embeddings.sqlite3"
+    embedding_cache_size: int = 10000
+    embedding_cache_ttl_seconds: int = 3600
+    embedding_cache_disk_size: int = 100000  # Rows kept in the SQLite tier, oldest dropped first
+    audio_cache_path: str = "./cache/audio"  # Synthesised speech, shared by the workers on a host
+    audio_cache_max_mb: int = 500
+    audio_cache_manifest_ttl_seconds: int = 86400  # Manifest rows without audio, unused this long, are dropped
+    semantic_cache_enabled: bool = False  # Serve stored answers to repeat first questions
+    semantic_cache_threshold: float = 0.95  # Min cosine similarity between questions
+    semantic_cache_size: int = 500  # Answers kept per client
+    semantic_cache_ttl_seconds: int = 86400
+    
+    # Knowledge ingestion
+    vector_backend: str = "chroma"  # "chroma" or "numpy" (in-process matrices for small tenants)
+    vector_index_path: str = "./vector_index"
+    vector_index_max_loaded: int = 256  # Tenants kept mapped by the numpy backend
+    vector_precision: str = "float32"  # numpy backend storage: "float32", "float16" or "int8"
+    vector_keep_exact: bool = True  # Keep float32 originals on disk to re-rank quantised results exactly
+    vector_rerank_factor: int = 4  # Candidates re-ranked per requested result
+    vector_layout: str = "dedicated"  # "dedicated" (a collection per client) or "shared" (small clients share collections)
+    vector_shared_collections: int = 16  # Shared collections small clients are spread across
+    vector_dedicated_chunks: int = 5000  # Clients with more chunks than this are promoted to a collection of their own
+    lexical_index_path: str = "./lexical_index"
+    retrieval_mode: str = "vector"  # "vector" or "hybrid" (vector + BM25 with adaptive k)
+    retrieval_candidates: int = 10  # Chunks taken from each ranking before fusion
+    hybrid_vector_weight: float = 0.6  # Share of the fused score from cosine similarity
+    retrieval_min_score: float = 0.35  # Hybrid chunks scoring below this are not sent
+    retrieval_relative_cutoff: float = 0.7  # ...nor those below this fraction of the best chunk
+    embedding_provider: str = "openai"  # "openai" or "local" (ONNX model on the CPU)
+    local_embedding_model_path: str = "./models/all-MiniLM-L6-v2"
+    local_embedding_batch_size: int = 32
+    local_embedding_workers: int = 2  # Threads running local inference
+    embedding_batch_size: int = 64  # Chunks per embeddings request
+    embedding_concurrency: int = 4  # Embeddings requests in flight per upload
+    embedding_max_retries: int = 3
+    embedding_retry_seconds: float = 1.0  # First backoff delay; doubles on each retry
+    ingestion_use_celery: bool = True  # False runs upload jobs inside the API process
+    ingestion_enqueue_timeout_seconds: float = 5.0  # Longest an upload waits on the Celery broker
+    ingestion_spool_path: str = "./spool"  # Uploads wait here until their job finishes
+    ingestion_stale_seconds: int = 600  # A running job silent this long can be resumed
+    extraction_max_upload_mb: int = 50
+    extraction_max_pages: int = 2000
+    extraction_workers: int = 4  # Processes parsing one large PDF
+    extraction_parallel_pages: int = 100  # PDFs with at least this many pages are parsed in parallel
+    extraction_pages_per_task: int = 25
     
     # N8N
     n8n_base_url: Optional[str] = None
     
     class Config:
         env_file = ".env"
-        
+
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,97 @@
+from typing import TYPE_CHECKING, Callable, Dict
+import threading
+import time
+
+if TYPE_CHECKING:
+    from app.call_handler import CallHandler
+    from app.elevenlabs_service import ElevenLabsService
+    from app.ingestion_service import IngestionService
+    from app.llm_service import LLMService
+    from app.twilio_service import TwilioService
+    from app.vector_store import VectorStore
+
+class Container:
+    """Builds each shared service once, on first use.
+    
+    Service modules are imported inside the builders, so importing the app
+    does not load langchain, Chroma or the ElevenLabs SDK. ``timings`` records
+    how long each service took to build (including any dependencies built
+    for it on the way), in milliseconds.
+    """
+    
+    def __init__(self):
+        self.services: Dict[str, object] = {}
+        self.timings: Dict[str, float] = {}
+        # Re-entrant: building a service may build the services it depends on
+        self.lock = threading.RLock()
+    
+    def get(self, name: str, build: Callable[[], object]):
+        """Get a service, building it the first time it is asked for"""
+        service = self.services.get(name)
+        if service is not None:
+            return service
+        with self.lock:
+            service = self.services.get(name)
+            if service is None:
+                started = time.perf_counter()
+                service = build()
+                self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+                self.services[name] = service
+        return service
+    
+    @property
+    def vector_store(self) -> "VectorStore":
+        def build():
+            from app.vector_store import VectorStore
+            return VectorStore()
+        return self.get("vector_store", build)
+    
+    @property
+    def llm_service(self) -> "LLMService":
+        def build():
+            from app.llm_service import LLMService
+            return LLMService(self.vector_store)
+        return self.get("llm_service", build)
+    
+    @property
+    def call_handler(self) -> "CallHandler":
+        def build():
+            from app.call_handler import CallHandler
+            return CallHandler(llm_service=self.llm_service)
+        return self.get("call_handler", build)
+    
+    @property
+    def ingestion_service(self) -> "IngestionService":
+        def build():
+            from app.ingestion_service import IngestionService
+            return IngestionService(self.vector_store)
+        return self.get("ingestion_service", build)
+    
+    @property
+    def twilio_service(self) -> "TwilioService":
+        def build():
+            from app.twilio_service import TwilioService
+            return TwilioService()
+        return self.get("twilio_service", build)
+    
+    @property
+    def elevenlabs_service(self) -> "ElevenLabsService":
+        def build():
+            from app.elevenlabs_service import ElevenLabsService
+            return ElevenLabsService()
+        return self.get("elevenlabs_service", build)
+    
+    def warm(self):
+        """Build every service now rather than on the first call"""
+        try:
+            self.call_handler
+            self.twilio_service
+            self.elevenlabs_service
+        except Exception as e:
+            print(f"Error warming services: {e}")
+    
+    def stats(self) -> Dict:
+        """Get which services are built and how long each took"""
+        return {"built": list(self.services), "timings_ms": dict(self.timings)}
+
+container = Container()
@@ -0,0 +1,55 @@
+from typing import Dict, List, Optional
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from app.token_counter import MESSAGE_OVERHEAD, count_tokens
+
+class ContextBuilder:
+    """Fit a call's history into a token budget for the prompt.
+
+    The newest turns are kept verbatim; anything older is represented by the
+    call's rolling summary, which is computed off the hot path.
+    """
+
+    def __init__(self, token_budget: int = 1200):
+        self.token_budget = token_budget
+
+    def without_current(self, history: List[Dict], user_message: str) -> List[Dict]:
+        """Drop the current utterance, which is sent separately, from the history"""
+        if history and history[-1]['role'] == 'user' and history[-1]['content'] == user_message:
+            return history[:-1]
+        return history
+
+    def window_start(self, history: List[Dict], token_budget: Optional[int] = None) -> int:
+        """Index of the oldest message that still fits in the budget"""
+        budget = self.token_budget if token_budget is None else token_budget
+        used = 0
+        start = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            used += count_tokens(history[i]['content']) + MESSAGE_OVERHEAD
+            if used > budget:
+                break
+            start = i
+        return start
+
+    def build(self, history: List[Dict], user_message: str, summary: Optional[str] = None, summarized: int = 0) -> List:
+        """Build the history messages for a turn.
+
+        ``summarized`` is how many of the oldest messages the summary covers;
+        those are never repeated verbatim.
+        """
+        history = self.without_current(history, user_message)
+        start = max(self.window_start(history), summarized if summary else 0)
+
+        messages = []
+        if summary:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        for msg in history[start:]:
+            if msg['role'] == 'user':
+                messages.append(HumanMessage(content=msg['content']))
+            elif msg['role'] == 'assistant':
+                messages.append(AIMessage(content=msg['content']))
+
+        # Add current message
+        messages.append(HumanMessage(content=user_message))
+        return messages
@@ -0,0 +1,132 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import json
+import time
+
+from app.config import settings
+
+# Compact per-message record: (role, content, unix timestamp)
+Message = Tuple[str, str, float]
+
+def expand_message(message: Message) -> Dict:
+    """Turn a compact record into the dict shape the rest of the app uses"""
+    role, content, timestamp = message
+    return {
+        "role": role,
+        "content": content,
+        "timestamp": datetime.utcfromtimestamp(timestamp).isoformat()
+    }
+
+class ConversationStore(ABC):
+    """Per-call conversation history"""
+
+    @abstractmethod
+    async def get(self, call_sid: str) -> List[Dict]:
+        """Get the messages of a call, oldest first"""
+
+    @abstractmethod
+    async def append(self, call_sid: str, role: str, content: str):
+        """Add a message to a call"""
+
+    @abstractmethod
+    async def get_summary(self, call_sid: str) -> Tuple[Optional[str], int]:
+        """Get a call's rolling summary and how many of its oldest messages it covers"""
+
+    @abstractmethod
+    async def set_summary(self, call_sid: str, summary: str, summarized: int):
+        """Replace a call's rolling summary"""
+
+    @abstractmethod
+    async def end(self, call_sid: str):
+        """Forget a call once it has finished"""
+
+class InMemoryConversationStore(ConversationStore):
+    """Process-local store that evicts idle calls and caps how many it keeps"""
+
+    def __init__(self, max_calls: int = 10000, ttl_seconds: float = 3600):
+        self.max_calls = max_calls
+        self.ttl_seconds = ttl_seconds
+        self.calls: "OrderedDict[str, Tuple[float, List[Message]]]" = OrderedDict()
+        self.summaries: Dict[str, Tuple[str, int]] = {}
+
+    async def get(self, call_sid: str) -> List[Dict]:
+        entry = self.calls.get(call_sid)
+        if entry is None:
+            return []
+        if time.monotonic() - entry[0] > self.ttl_seconds:
+            await self.end(call_sid)
+            return []
+        return [expand_message(message) for message in entry[1]]
+
+    async def append(self, call_sid: str, role: str, content: str):
+        entry = self.calls.pop(call_sid, None)
+        if entry and time.monotonic() - entry[0] <= self.ttl_seconds:
+            messages = entry[1]
+        else:
+            messages = []
+            self.summaries.pop(call_sid, None)
+        messages.append((role, content, time.time()))
+        self.calls[call_sid] = (time.monotonic(), messages)
+
+        # Most recently active calls are at the end
+        while len(self.calls) > self.max_calls:
+            evicted, _ = self.calls.popitem(last=False)
+            self.summaries.pop(evicted, None)
+
+    async def get_summary(self, call_sid: str) -> Tuple[Optional[str], int]:
+        if call_sid not in self.calls:
+            return None, 0
+        return self.summaries.get(call_sid, (None, 0))
+
+    async def set_summary(self, call_sid: str, summary: str, summarized: int):
+        if call_sid in self.calls:
+            self.summaries[call_sid] = (summary, summarized)
+
+    async def end(self, call_sid: str):
+        self.calls.pop(call_sid, None)
+        self.summaries.pop(call_sid, None)
+
+class RedisConversationStore(ConversationStore):
+    """Store shared by every worker, so any of them can serve a call's next turn"""
+
+    def __init__(self, redis, ttl_seconds: float = 3600, prefix: str = "conversation:"):
+        self.redis = redis
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+
+    async def get(self, call_sid: str) -> List[Dict]:
+        records = await self.redis.lrange(self.prefix + call_sid, 0, -1)
+        return [expand_message(json.loads(record)) for record in records]
+
+    async def append(self, call_sid: str, role: str, content: str):
+        key = self.prefix + call_sid
+        await self.redis.rpush(key, json.dumps([role, content, time.time()]))
+        # Idle calls expire on their own if the end-of-call callback never arrives
+        await self.redis.expire(key, self.ttl_seconds)
+
+    async def get_summary(self, call_sid: str) -> Tuple[Optional[str], int]:
+        record = await self.redis.get(self.prefix + call_sid + ":summary")
+        if record is None:
+            return None, 0
+        summary, summarized = json.loads(record)
+        return summary, summarized
+
+    async def set_summary(self, call_sid: str, summary: str, summarized: int):
+        await self.redis.set(
+            self.prefix + call_sid + ":summary",
+            json.dumps([summary, summarized]),
+            ex=self.ttl_seconds
+        )
+
+    async def end(self, call_sid: str):
+        await self.redis.delete(self.prefix + call_sid, self.prefix + call_sid + ":summary")
+
+def create_conversation_store() -> ConversationStore:
+    """Build the conversation store selected by settings"""
+    if settings.conversation_backend == "redis":
+        from redis import asyncio as aioredis
+        redis = aioredis.from_url(settings.redis_url, decode_responses=True)
+        return RedisConversationStore(redis, settings.conversation_ttl_seconds)
+    return InMemoryConversationStore(settings.conversation_max_calls, settings.conversation_ttl_seconds)
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -34,11 +34,46 @@ class CallLog(Base):
     client_id = Column(String, nullable=False)
     caller_phone = Column(String, nullable=False)
     call_sid = Column(String, unique=True, nullable=False)
-    conversation = Column(JSON)  # Store conversation history
+    conversation = Column(JSON)  # Legacy conversation history; new turns go to call_turns
     appointment_booked = Column(Boolean, default=False)
     call_duration = Column(Integer)  # in seconds
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class CallTurn(Base):
+    __tablename__ = "call_turns"
+    __table_args__ = (Index("ix_call_turns_call_sid_seq", "call_sid", "seq"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    call_sid = Column(String, nullable=False)
+    seq = Column(Integer, nullable=False)  # Position in the call, starting at 0
+    role = Column(String, nullable=False)  # "user" or "assistant"
+    content = Column(Text, nullable=False)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime)
+    first_chunk_ms = Column(Integer)  # Utterance to first speakable chunk (assistant turns)
+    latency_ms = Column(Integer)  # Utterance to complete reply (assistant turns)
+    prompt_tokens = Column(Integer)
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, unique=True, index=True, nullable=False)
+    client_id = Column(String, nullable=False, index=True)
+    source = Column(String, nullable=False)  # Original file name
+    file_path = Column(String, nullable=False)  # Spooled upload, removed once ingested
+    status = Column(String, default="queued")  # queued, running, completed, failed, cancelled
+    attempts = Column(Integer, default=0)
+    pages_total = Column(Integer)
+    pages_parsed = Column(Integer, default=0)
+    chunks_total = Column(Integer)
+    chunks_embedded = Column(Integer, default=0)
+    failures = Column(Integer, default=0)  # Chunks that could not be embedded
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime)
+
 class Knowledge(Base):
     __tablename__ = "knowledge"
     
@@ -47,7 +82,9 @@ class Knowledge(Base):
     content = Column(Text, nullable=False)
     source = Column(String)  # file name or source description
     embedding_id = Column(String)  # ChromaDB document ID
+    version = Column(Integer, default=1)  # Bumped each time the source's content changes
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 # Create database engine and session
 engine = create_engine(settings.database_url)
@@ -1,32 +1,156 @@
-from typing import Dict, List
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from app.audio_cache import percentile
 from app.config import settings
-from elevenlabs.client import ElevenLabs
-import io
+from elevenlabs.client import AsyncElevenLabs
+from elevenlabs.core.api_error import ApiError
+import asyncio
+import httpx
+import random
+import time
+
+TIMINGS = 1000
 
 class ElevenLabsService:
+    """ElevenLabs text-to-speech shared by every call in the worker.
+
+    Requests go through one pooled async HTTP client, so connections stay warm
+    between phrases and no thread is held while audio downloads, and at most
+    ``elevenlabs_max_concurrency`` run at once; the rest wait on the event
+    loop for a slot rather than being rejected by ElevenLabs. A request
+    rejected with 429 anyway is retried with exponential backoff.
+    ``queue_ms`` and ``synthesis_ms`` time the wait for a slot and the request
+    itself. The voice catalogue is cached and refreshed in the background once
+    stale.
+    """
+
     def __init__(self):
-        self.client = ElevenLabs(api_key=settings.elevenlabs_api_key)
+        self.http_client = httpx.AsyncClient(
+            timeout=settings.elevenlabs_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=settings.elevenlabs_max_concurrency + 2,
+                max_keepalive_connections=settings.elevenlabs_max_concurrency,
+                keepalive_expiry=60
+            )
+        )
+        self.client = AsyncElevenLabs(api_key=settings.elevenlabs_api_key, httpx_client=self.http_client)
+        self.slots = asyncio.Semaphore(settings.elevenlabs_max_concurrency)
+        self.queue_ms: deque = deque(maxlen=TIMINGS)
+        self.synthesis_ms: deque = deque(maxlen=TIMINGS)
+        self.requests = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.retries = 0
+        self.failures = 0
+        self.voices: Optional[List[Dict]] = None
+        self.voices_fetched_at = 0.0
+        self.voices_refresh: Optional[asyncio.Task] = None
+
+    async def request(self, send: Callable[[], AsyncIterator[bytes]]) -> AsyncIterator[bytes]:
+        """Audio of a TTS request, sent once a slot is free and retried while ElevenLabs answers 429"""
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self.in_flight += 1
+        self.requests += 1
+        self.queue_ms.append((started - queued) * 1000)
+        try:
+            for attempt in range(settings.elevenlabs_max_retries + 1):
+                chunks = send()
+                try:
+                    # The SDK only sends the request when the first chunk is asked for
+                    first = await anext(chunks, None)
+                except ApiError as e:
+                    if e.status_code != 429 or attempt == settings.elevenlabs_max_retries:
+                        raise
+                    self.retries += 1
+                    await asyncio.sleep(settings.elevenlabs_retry_seconds * 2 ** attempt * random.uniform(0.5, 1.5))
+                    continue
+                if first is not None:
+                    yield first
+                async for chunk in chunks:
+                    yield chunk
+                return
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.synthesis_ms.append((time.perf_counter() - started) * 1000)
+            self.in_flight -= 1
+            self.slots.release()
 
-    def generate_speech(self, text: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM") -> bytes:
+    async def generate_speech(self, text: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM", model_id: str = None, output_format: str = None) -> bytes:
         """Generate speech audio from text"""
         try:
-            audio = self.client.text_to_speech.convert(
+            audio = self.request(lambda: self.client.text_to_speech.convert(
                 voice_id=voice_id,
-                model_id="eleven_monolingual_v1",
+                model_id=model_id or settings.elevenlabs_model_id,
+                output_format=output_format or settings.elevenlabs_output_format,
                 text=text
-            )
+            ))
             # Convert generator response into bytes
-            audio_bytes = b"".join(audio)
+            audio_bytes = b"".join([chunk async for chunk in audio])
             return audio_bytes
         except Exception as e:
             print(f"Error generating speech: {e}")
             return None
 
-    def get_available_voices(self) -> List[Dict]:
-        """Get available ElevenLabs voices"""
+    async def synthesise(self, entry: Dict) -> bytes:
+        """Generate speech for an audio cache entry"""
+        return await self.generate_speech(entry["text"], entry["voice_id"], entry["model_id"], entry["output_format"])
+
+    def stream_speech(self, text: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM", model_id: str = None, output_format: str = None) -> AsyncIterator[bytes]:
+        """Generate speech audio from text, yielding chunks as ElevenLabs sends them"""
+        return self.request(lambda: self.client.text_to_speech.convert_as_stream(
+            voice_id=voice_id,
+            model_id=model_id or settings.elevenlabs_model_id,
+            output_format=output_format or settings.elevenlabs_output_format,
+            optimize_streaming_latency=settings.elevenlabs_streaming_latency,
+            text=text
+        ))
+
+    def synthesise_stream(self, entry: Dict) -> AsyncIterator[bytes]:
+        """Stream speech for an audio cache entry"""
+        return self.stream_speech(entry["text"], entry["voice_id"], entry["model_id"], entry["output_format"])
+
+    async def get_available_voices(self) -> List[Dict]:
+        """Get available ElevenLabs voices from the cached catalogue, fetching it the first time"""
+        if self.voices is None:
+            await self.refresh_voices()
+            return self.voices or []
+
+        stale = time.monotonic() - self.voices_fetched_at > settings.elevenlabs_voices_ttl_seconds
+        if stale and (self.voices_refresh is None or self.voices_refresh.done()):
+            # Callers get the stale catalogue rather than waiting on ElevenLabs
+            self.voices_refresh = asyncio.create_task(self.refresh_voices())
+        return self.voices
+
+    async def refresh_voices(self):
+        """Fetch the voice catalogue, keeping the previous one if that fails"""
         try:
-            voices = self.client.voices.get_all()
-            return [{"id": v.voice_id, "name": v.name} for v in voices.voices]
+            voices = await self.client.voices.get_all()
+            self.voices = [{"id": v.voice_id, "name": v.name} for v in voices.voices]
+            self.voices_fetched_at = time.monotonic()
         except Exception as e:
             print(f"Error fetching voices: {e}")
-            return []
+
+    def stats(self) -> Dict:
+        """Get request counters and how long requests waited for a slot versus took"""
+        return {
+            "max_concurrency": settings.elevenlabs_max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "queue_ms_p50": percentile(self.queue_ms, 0.5),
+            "queue_ms_p95": percentile(self.queue_ms, 0.95),
+            "synthesis_ms_p50": percentile(self.synthesis_ms, 0.5),
+            "synthesis_ms_p95": percentile(self.synthesis_ms, 0.95),
+            "voices": len(self.voices or []),
+            "voices_age_seconds": round(time.monotonic() - self.voices_fetched_at) if self.voices is not None else None
+        }
@@ -0,0 +1,204 @@
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from app.config import settings
+
+PRUNE_INTERVAL_SECONDS = 300
+FAQ_QUESTION = re.compile(r"^\s*Q:\s*(.+?)(?:\s+A:.*)?$", re.MULTILINE | re.IGNORECASE)
+
+def normalize_text(text: str) -> str:
+    """Normalise an utterance so trivially different phrasings share a key"""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    return text.strip(" .,!?;:")
+
+def parse_faq_questions(faqs: Optional[str]) -> List[str]:
+    """Pull the questions out of a client's free-text FAQ block"""
+    if not faqs:
+        return []
+    # Questions start a line with "Q:"; the answer may follow on the same line
+    return [q.strip() for q in FAQ_QUESTION.findall(faqs) if q.strip()]
+
+class EmbeddingCache:
+    """Two-tier cache of query embeddings keyed by model and normalised text.
+
+    The first tier is an in-memory LRU with a TTL. The second is a SQLite file
+    that survives restarts and is shared by every worker on the host; its rows
+    expire after the same TTL and at most ``max_disk_rows`` are kept, pruned
+    when the file is first used and every few minutes after.
+    """
+
+    def __init__(self, path: str, max_size: int = 10000, ttl_seconds: float = 3600, max_disk_rows: int = 100000):
+        self.path = path
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_rows = max_disk_rows
+        self.memory: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.pruned = 0
+        self.pruned_at: Optional[float] = None
+        self.lock = threading.Lock()
+        self.db = None
+
+    def key(self, model: str, text: str) -> str:
+        """Stable cache key for a text embedded with a model"""
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode()).hexdigest()
+
+    def get_memory(self, model: str, text: str) -> Optional[List[float]]:
+        """Look up the in-memory tier only"""
+        key = self.key(model, text)
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl_seconds:
+                del self.memory[key]
+                return None
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return entry[1]
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Look up an embedding in memory, then on disk"""
+        embedding = self.get_memory(model, text)
+        if embedding is not None:
+            return embedding
+
+        self.maybe_prune()
+        key = self.key(model, text)
+        rows = self._execute(
+            "SELECT vector FROM embeddings WHERE key = ? AND created_at >= ?",
+            (key, time.time() - self.ttl_seconds)
+        )
+        if not rows:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        embedding = array("f", rows[0][0]).tolist()
+        self._remember(key, embedding)
+        with self.lock:
+            self.disk_hits += 1
+        return embedding
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        """Store an embedding in both tiers"""
+        self.put_many(model, [text], [embedding])
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Store several embeddings in both tiers with a single disk write"""
+        self.maybe_prune()
+        rows = []
+        for text, embedding in zip(texts, embeddings):
+            key = self.key(model, text)
+            self._remember(key, list(embedding))
+            rows.append((key, model, array("f", embedding).tobytes(), time.time()))
+        self._execute(
+            "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+            rows,
+            many=True
+        )
+
+    def missing(self, model: str, texts: List[str]) -> List[str]:
+        """Return the texts (deduplicated by key) that are not cached yet"""
+        seen = set()
+        missing = []
+        for text in texts:
+            key = self.key(model, text)
+            if key in seen:
+                continue
+            seen.add(key)
+            if self.get(model, text) is None:
+                missing.append(text)
+        return missing
+
+    def maybe_prune(self):
+        """Prune the disk tier if it hasn't been for a while"""
+        now = time.monotonic()
+        with self.lock:
+            if self.pruned_at is not None and now - self.pruned_at < PRUNE_INTERVAL_SECONDS:
+                return
+            self.pruned_at = now
+        self.prune()
+
+    def prune(self) -> int:
+        """Delete disk rows older than the TTL, then the oldest beyond ``max_disk_rows``; returns how many"""
+        removed = self._delete("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        removed += self._delete(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_rows,)
+        )
+        with self.lock:
+            self.pruned += removed
+        return removed
+
+    def stats(self) -> Dict:
+        """Get per-tier hit counters for monitoring"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "size": len(self.memory),
+            "max_size": self.max_size,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "pruned": self.pruned,
+            "hit_rate": (hits / lookups * 100) if lookups > 0 else 0
+        }
+
+    def _remember(self, key: str, embedding: List[float]):
+        """Put an entry in the in-memory tier, evicting the least recently used"""
+        with self.lock:
+            self.memory[key] = (time.monotonic(), embedding)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_size:
+                self.memory.popitem(last=False)
+
+    def _execute(self, sql: str, params, many: bool = False) -> List:
+        """Run a statement on the shared SQLite file, opening it on first use"""
+        with self.lock:
+            self._connect()
+            if many:
+                self.db.executemany(sql, params)
+                self.db.commit()
+                return []
+            return self.db.execute(sql, params).fetchall()
+
+    def _delete(self, sql: str, params) -> int:
+        """Run a delete on the shared SQLite file and return how many rows it removed"""
+        with self.lock:
+            self._connect()
+            removed = self.db.execute(sql, params).rowcount
+            self.db.commit()
+            return removed
+
+    def _connect(self):
+        if self.db is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        # WAL lets several workers read while one writes
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, model TEXT, vector BLOB, created_at REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+
+embedding_cache = EmbeddingCache(
+    settings.embedding_cache_path,
+    settings.embedding_cache_size,
+    settings.embedding_cache_ttl_seconds,
+    settings.embedding_cache_disk_size
+)
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import asyncio
+import os
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.config import settings
+
+# What OpenAIEmbeddings used before collections recorded their model
+LEGACY_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+def create_embeddings() -> Embeddings:
+    """Build the embedding provider selected by settings.
+    
+    Providers follow langchain's Embeddings interface and expose the name of
+    their model as ``model``; collections and cached embeddings are tagged
+    with it.
+    """
+    if settings.embedding_provider == "local":
+        return LocalEmbeddings(
+            settings.local_embedding_model_path,
+            batch_size=settings.local_embedding_batch_size,
+            workers=settings.local_embedding_workers
+        )
+    from langchain_community.embeddings import OpenAIEmbeddings
+    return OpenAIEmbeddings(api_key=settings.openai_api_key)
+
+class LocalEmbeddings(Embeddings):
+    """A sentence-transformer model exported to ONNX, run on the CPU in-process.
+    
+    ``model_path`` holds ``model.onnx`` and ``tokenizer.json`` (see
+    scripts/download_embedding_model.py). Texts are sorted by length and
+    embedded in batches, so padding stays small; async callers share a
+    small thread pool instead of the default executor.
+    """
+    
+    def __init__(self, model_path: str, batch_size: int = 32, workers: int = 2, max_length: int = 256):
+        self.model_path = model_path
+        self.model = os.path.basename(os.path.normpath(model_path))
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_length = max_length
+        self.session = None
+        self.tokenizer = None
+        self.input_names: List[str] = []
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embeddings")
+        self.lock = threading.Lock()
+    
+    def load(self):
+        """Load the model and tokenizer on first use"""
+        with self.lock:
+            if self.session is not None:
+                return
+            import onnxruntime
+            from tokenizers import Tokenizer
+            
+            options = onnxruntime.SessionOptions()
+            # Leave a core per pool thread rather than every run claiming them all
+            options.intra_op_num_threads = max((os.cpu_count() or 1) // self.workers, 1)
+            self.session = onnxruntime.InferenceSession(
+                os.path.join(self.model_path, "model.onnx"), options, providers=["CPUExecutionProvider"]
+            )
+            self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_path, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.enable_padding()
+            self.tokenizer = tokenizer
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Mean-pooled, unit-length embeddings for a list of texts"""
+        self.load()
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        vectors = np.zeros((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch])
+            ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+            mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(ids)
+            hidden = self.session.run(None, feeds)[0]
+            
+            pooled = (hidden * mask[..., None]).sum(axis=1) / np.clip(mask.sum(axis=1, keepdims=True), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            if not vectors.shape[1]:
+                vectors = np.zeros((len(texts), pooled.shape[1]), dtype=np.float32)
+            vectors[batch] = pooled
+        return vectors
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist() if texts else []
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.embed_documents, texts)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.embed_query, text)
+
+def collection_model(collection) -> str:
+    """The embedding model a collection was built with"""
+    return (getattr(collection, "metadata", None) or {}).get("embedding_model", LEGACY_EMBEDDING_MODEL)
@@ -17,6 +17,10 @@ class AppointmentBookingError(AICallAssistantException):
     """Raised when appointment booking fails"""
     pass
 
+class DocumentTooLargeError(AICallAssistantException):
+    """Raised when an upload exceeds the size or page limits"""
+    pass
+
 def create_error_response(status_code: int, detail: str, error_code: str = None) -> HTTPException:
     """Create standardized error response"""
     error_dict = {"detail": detail}
@@ -0,0 +1,162 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import math
+import multiprocessing
+import os
+import re
+import zipfile
+
+from app.config import settings
+from app.exceptions import DocumentTooLargeError
+
+TEXT_BLOCK_CHARS = 64 * 1024
+DOCX_PAGE_CHARS = 3000  # About a page of prose, for documents that don't record their page count
+
+# Extension -> function returning the page count (if known) and a generator of page texts
+EXTRACTORS: Dict[str, Callable[[str], Tuple[Optional[int], Iterator[str]]]] = {}
+MIME_TYPES: Dict[str, str] = {}
+
+def register(extension: str, *mime_types: str):
+    """Register an extractor for a file extension and the MIME types uploads send for it"""
+    def decorator(extractor):
+        EXTRACTORS[extension] = extractor
+        for mime_type in mime_types:
+            MIME_TYPES[mime_type] = extension
+        return extractor
+    return decorator
+
+def extractor_for(filename: str, content_type: Optional[str] = None) -> Optional[str]:
+    """Get the registered extension for an upload, from its name or else its MIME type"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in EXTRACTORS:
+        return extension
+    return MIME_TYPES.get((content_type or "").split(";")[0].strip())
+
+def extract_pages(path: str) -> Tuple[Optional[int], Iterator[str]]:
+    """Open a spooled upload and return its page count (if known) and its pages' text"""
+    extension = os.path.splitext(path)[1].lower()
+    extractor = EXTRACTORS.get(extension)
+    if extractor is None:
+        raise ValueError(f"Unsupported file type: {extension}")
+    return extractor(path)
+
+def check_page_limit(pages_total: int):
+    if pages_total > settings.extraction_max_pages:
+        raise DocumentTooLargeError(f"Document has {pages_total} pages; the limit is {settings.extraction_max_pages}")
+
+@register(".pdf", "application/pdf")
+def extract_pdf(path: str) -> Tuple[int, Iterator[str]]:
+    # Parsers are imported on first use; they are slow to import and most workers never need them
+    import PyPDF2
+    
+    # Given a path PyPDF2 reads the whole file into memory; given a file it seeks as needed
+    with open(path, "rb") as f:
+        pages_total = len(PyPDF2.PdfReader(f).pages)
+    check_page_limit(pages_total)
+    
+    ranges = [
+        (start, min(start + settings.extraction_pages_per_task, pages_total))
+        for start in range(0, pages_total, settings.extraction_pages_per_task)
+    ]
+    workers = min(settings.extraction_workers, os.cpu_count() or 1)
+    if pages_total >= settings.extraction_parallel_pages and workers > 1:
+        if not multiprocessing.current_process().daemon:
+            return pages_total, parallel_pdf_pages(path, ranges, workers)
+        # Celery's prefork pool runs tasks in daemonic processes, which may not start their own
+        print(f"Parsing {pages_total} pages serially: start the Celery worker with --pool threads to parse in parallel")
+    return pages_total, serial_pdf_pages(path, ranges)
+
+def pdf_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Extract a run of pages with a reader of its own, so parsed objects are freed afterwards"""
+    import PyPDF2
+    
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[number].extract_text() or "" for number in range(start, stop)]
+
+def serial_pdf_pages(path: str, ranges: List[Tuple[int, int]]) -> Iterator[str]:
+    for start, stop in ranges:
+        yield from pdf_page_range(path, start, stop)
+
+def parallel_pdf_pages(path: str, ranges: List[Tuple[int, int]], workers: int) -> Iterator[str]:
+    """Extract page ranges in worker processes, yielding pages in order.
+    
+    Only a few ranges are in flight at once, so extracted text doesn't pile up
+    faster than the chunker and embedder consume it.
+    """
+    # Spawned rather than forked: the API process runs threads
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    pending = deque()
+    remaining = iter(ranges)
+    try:
+        for start, stop in remaining:
+            pending.append(pool.submit(pdf_page_range, path, start, stop))
+            if len(pending) >= workers * 2:
+                break
+    except Exception as e:
+        # Workers start on first submit, so a process that can't start them fails here
+        print(f"Error starting extraction workers, parsing serially: {e}")
+        pool.shutdown(cancel_futures=True)
+        yield from serial_pdf_pages(path, ranges)
+        return
+    
+    with pool:
+        while pending:
+            pages = pending.popleft().result()
+            for start, stop in remaining:
+                pending.append(pool.submit(pdf_page_range, path, start, stop))
+                break
+            yield from pages
+
+@register(".docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+def extract_docx(path: str) -> Tuple[int, Iterator[str]]:
+    import docx
+    
+    paragraphs = [paragraph.text for paragraph in docx.Document(path).paragraphs]
+    chars = sum(len(text) + 1 for text in paragraphs)
+    # Word's recorded count can be stale or missing, so long text counts for at least its length in pages
+    pages_total = max(docx_page_count(path) or 0, math.ceil(chars / DOCX_PAGE_CHARS), 1)
+    check_page_limit(pages_total)
+    return pages_total, docx_pages(paragraphs, chars / pages_total)
+
+def docx_page_count(path: str) -> Optional[int]:
+    """The page count Word recorded when it last saved the document, if it did"""
+    with zipfile.ZipFile(path) as archive:
+        try:
+            properties = archive.read("docProps/app.xml").decode("utf-8", "replace")
+        except KeyError:
+            return None
+    match = re.search(r"<(?:\w+:)?Pages>(\d+)<", properties)
+    return int(match.group(1)) if match else None
+
+def docx_pages(paragraphs: List[str], page_chars: float) -> Iterator[str]:
+    """Group paragraphs into blocks of about a page, so progress counts pages as for PDFs"""
+    page = []
+    size = 0
+    for text in paragraphs:
+        page.append(text)
+        size += len(text) + 1
+        if size >= page_chars:
+            yield "\n".join(page)
+            page = []
+            size = 0
+    if page:
+        yield "\n".join(page)
+
+@register(".txt", "text/plain")
+def extract_txt(path: str) -> Tuple[None, Iterator[str]]:
+    def blocks():
+        with open(path, encoding="utf-8") as f:
+            lines = []
+            size = 0
+            for line in f:
+                lines.append(line)
+                size += len(line)
+                if size >= TEXT_BLOCK_CHARS:
+                    yield "".join(lines).removesuffix("\n")
+                    lines = []
+                    size = 0
+            if lines:
+                yield "".join(lines).removesuffix("\n")
+    return None, blocks()
@@ -0,0 +1,253 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, TextIO
+import os
+import tempfile
+import uuid
+
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+
+from app.client_cache import client_cache
+from app.config import settings
+from app.database import Client, IngestionJob, Knowledge, SessionLocal
+from app.exceptions import DocumentTooLargeError
+from app.extractors import extract_pages
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+class IngestionCancelled(Exception):
+    """Raised at a checkpoint when a job has been cancelled through the API"""
+
+def record_knowledge_source(db: Session, client_id: str, source: str, content: str, document_ids: List[str]) -> int:
+    """Keep one Knowledge row per source, bumping its version when the content changes"""
+    rows = db.query(Knowledge).filter(
+        Knowledge.client_id == client_id,
+        Knowledge.source == source
+    ).order_by(Knowledge.id).all()
+    
+    if rows:
+        knowledge = rows[0]
+        # Earlier uploads of the same source left duplicate rows behind
+        for duplicate in rows[1:]:
+            db.delete(duplicate)
+        if knowledge.content != content:
+            knowledge.content = content
+            knowledge.version = (knowledge.version or 1) + 1
+    else:
+        knowledge = Knowledge(client_id=client_id, source=source, content=content, version=1)
+        db.add(knowledge)
+    
+    knowledge.embedding_id = ",".join(document_ids)
+    db.commit()
+    return knowledge.version
+
+class IngestionService:
+    """Runs knowledge uploads as resumable background jobs.
+    
+    Uploads are spooled to disk and parsed, chunked and embedded outside the
+    request. Each embedded batch is stored straight away and chunk ids are
+    content-addressed, so a cancelled, failed or interrupted job picks up
+    where it stopped when resumed.
+    """
+    
+    def __init__(self, vector_store=None):
+        self._vector_store = vector_store
+    
+    @property
+    def vector_store(self):
+        if self._vector_store is None:
+            from app.container import container
+            self._vector_store = container.vector_store
+        return self._vector_store
+    
+    def create_job(self, db: Session, client_id: str, source: str, extension: str) -> IngestionJob:
+        """Register a job for an upload that is about to be spooled"""
+        job_id = uuid.uuid4().hex
+        job = IngestionJob(
+            job_id=job_id,
+            client_id=client_id,
+            source=source,
+            file_path=os.path.join(settings.ingestion_spool_path, f"{job_id}{extension}"),
+            status=JOB_QUEUED
+        )
+        db.add(job)
+        db.commit()
+        return job
+    
+    async def spool(self, file: UploadFile, job: IngestionJob):
+        """Copy an upload to disk a chunk at a time instead of holding it in memory"""
+        import aiofiles
+        
+        max_bytes = settings.extraction_max_upload_mb * 1024 * 1024
+        size = 0
+        os.makedirs(os.path.dirname(job.file_path), exist_ok=True)
+        try:
+            async with aiofiles.open(job.file_path, "wb") as f:
+                while True:
+                    chunk = await file.read(SPOOL_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        break
+                    await f.write(chunk)
+        except Exception:
+            # A partial upload can't be resumed, so don't leave it behind
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            raise
+        if size > max_bytes:
+            os.remove(job.file_path)
+            raise DocumentTooLargeError(f"Upload is larger than {settings.extraction_max_upload_mb}MB")
+    
+    def run(self, job_id: str):
+        """Parse, chunk and embed a job's upload, recording progress as it goes"""
+        db = SessionLocal()
+        try:
+            job = db.query(IngestionJob).filter(IngestionJob.job_id == job_id).first()
+            # A redelivered task finds its job still marked running
+            if job is None or job.status not in (JOB_QUEUED, JOB_RUNNING):
+                return
+            
+            job.status = JOB_RUNNING
+            job.attempts = (job.attempts or 0) + 1
+            job.failures = 0
+            job.error = None
+            db.commit()
+            
+            try:
+                os.makedirs(settings.ingestion_spool_path, exist_ok=True)
+                # The text goes to disk as it is parsed rather than piling up in memory while the job embeds
+                with tempfile.TemporaryFile("w+", encoding="utf-8", dir=settings.ingestion_spool_path) as text:
+                    self.embed(db, job, self.parse(db, job, text), text)
+            except IngestionCancelled:
+                pass
+            except Exception as e:
+                print(f"Error ingesting {job.source}: {e}")
+                self.fail(db, job, str(e))
+        finally:
+            db.close()
+    
+    def parse(self, db: Session, job: IngestionJob, text: TextIO) -> Iterator[str]:
+        """Yield the upload's text page by page, copying it to ``text`` and recording progress as pages are chunked"""
+        pages_total, pages = extract_pages(job.file_path)
+        job.pages_total = pages_total
+        job.pages_parsed = 0
+        db.commit()
+        
+        for page in pages:
+            text.write(f"\n{page}" if job.pages_parsed else page)
+            job.pages_parsed += 1
+            if job.pages_parsed % 10 == 0:
+                db.commit()
+                if self.cancelled(db, job):
+                    raise IngestionCancelled(job.job_id)
+            yield page
+        db.commit()
+    
+    def embed(self, db: Session, job: IngestionJob, pages: Iterator[str], text: TextIO):
+        """Embed the chunks that aren't stored yet, then retire the source's stale ones"""
+        vector_store = self.vector_store
+        collection = vector_store.create_collection_for_client(job.client_id)
+        document_ids, new_chunks, stale_ids = vector_store.plan_source(collection, job.client_id, pages, job.source)
+        job.chunks_total = len(document_ids)
+        job.chunks_embedded = len(document_ids) - len(new_chunks)
+        db.commit()
+        
+        for batch in vector_store.batch_chunks(list(new_chunks.items())):
+            if self.cancelled(db, job):
+                raise IngestionCancelled(job.job_id)
+            try:
+                embeddings = vector_store.embed_documents([chunk for _, chunk in batch])
+            except Exception as e:
+                print(f"Error embedding {len(batch)} chunks of {job.source}: {e}")
+                job.failures += len(batch)
+                job.error = str(e)
+                db.commit()
+                continue
+            vector_store.apply_source(collection, job.client_id, job.source, dict(batch), embeddings, [])
+            job.chunks_embedded += len(batch)
+            db.commit()
+        
+        if job.failures:
+            # Keep the previous version's chunks until every new one is stored
+            self.fail(db, job, f"{job.failures} chunks could not be embedded; resume the job to retry them")
+            return
+        
+        vector_store.apply_source(collection, job.client_id, job.source, {}, [], stale_ids)
+        vector_store.promote_if_large(job.client_id, collection)
+        text.seek(0)
+        record_knowledge_source(db, job.client_id, job.source, text.read(), document_ids)
+        if new_chunks or stale_ids:
+            # A new profile version makes every worker drop answers cached from the old knowledge
+            db.query(Client).filter(Client.client_id == job.client_id).update({"updated_at": datetime.utcnow()})
+            client_cache.invalidate(job.client_id)
+        
+        job.status = JOB_COMPLETED
+        job.completed_at = datetime.utcnow()
+        db.commit()
+        try:
+            os.remove(job.file_path)
+        except FileNotFoundError:
+            pass
+    
+    def fail(self, db: Session, job: IngestionJob, error: str):
+        job.status = JOB_FAILED
+        job.error = error
+        db.commit()
+    
+    def cancelled(self, db: Session, job: IngestionJob) -> bool:
+        """Check whether the job was cancelled through the API since it started"""
+        db.refresh(job, ["status"])
+        return job.status == JOB_CANCELLED
+    
+    def cancel(self, db: Session, job: IngestionJob) -> bool:
+        """Ask a queued or running job to stop at its next checkpoint"""
+        if job.status not in (JOB_QUEUED, JOB_RUNNING):
+            return False
+        job.status = JOB_CANCELLED
+        db.commit()
+        return True
+    
+    def resumable(self, job: IngestionJob) -> bool:
+        """A job can be resumed if it stopped, or if its worker stopped reporting progress"""
+        if not os.path.exists(job.file_path):
+            return False
+        if job.status in (JOB_FAILED, JOB_CANCELLED):
+            return True
+        stale = datetime.utcnow() - timedelta(seconds=settings.ingestion_stale_seconds)
+        return job.status == JOB_RUNNING and job.updated_at < stale
+    
+    def resume(self, db: Session, job: IngestionJob) -> bool:
+        """Queue a stopped job again; already stored chunks are not re-embedded"""
+        if not self.resumable(job):
+            return False
+        job.status = JOB_QUEUED
+        job.error = None
+        db.commit()
+        return True
+    
+    @staticmethod
+    def job_status(job: IngestionJob) -> Dict:
+        return {
+            "job_id": job.job_id,
+            "client_id": job.client_id,
+            "source": job.source,
+            "status": job.status,
+            "attempts": job.attempts,
+            "pages_total": job.pages_total,
+            "pages_parsed": job.pages_parsed,
+            "chunks_total": job.chunks_total,
+            "chunks_embedded": job.chunks_embedded,
+            "failures": job.failures,
+            "error": job.error,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at,
+            "completed_at": job.completed_at
+        }
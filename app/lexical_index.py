@@ -0,0 +1,168 @@
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+import fcntl
+import json
+import math
+import os
+import re
+import threading
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from have how i if in is it me my of on or "
+    "our so that the their there this to we what when where which who why will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word and number tokens, without stopwords"""
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """Inverted index over one client's chunks, scored with Okapi BM25"""
+
+    def __init__(self, documents: Optional[Dict[str, Dict[str, int]]] = None, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: Dict[str, Dict[str, int]] = {}  # chunk id -> term frequencies
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> chunk id -> frequency
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+        for doc_id, terms in (documents or {}).items():
+            self.add_terms(doc_id, terms)
+
+    def add(self, doc_id: str, text: str):
+        """Index a chunk, replacing it if it was already indexed"""
+        self.remove(doc_id)
+        self.add_terms(doc_id, dict(Counter(tokenize(text))))
+
+    def add_terms(self, doc_id: str, terms: Dict[str, int]):
+        self.documents[doc_id] = terms
+        self.lengths[doc_id] = sum(terms.values())
+        self.total_length += self.lengths[doc_id]
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+
+    def remove(self, doc_id: str):
+        """Drop a chunk from the index"""
+        terms = self.documents.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.lengths.pop(doc_id)
+        for term in terms:
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Best-scoring chunk ids for a query, highest first"""
+        count = len(self.documents)
+        if not count:
+            return []
+        average_length = self.total_length / count
+
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = frequency + self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+class LexicalIndexStore:
+    """Per-client BM25 indexes persisted as JSON next to the vectors.
+
+    Indexes are loaded on first use and the least recently used are dropped
+    from memory; a file rewritten by another worker is picked up on next use.
+    Writes hold a per-client file lock, so updates from several workers apply
+    one after the other to the latest file.
+    """
+
+    def __init__(self, path: str, max_loaded: int = 256):
+        self.path = path
+        self.max_loaded = max_loaded
+        self.indexes: "OrderedDict[str, Tuple[tuple, BM25Index]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+    def index_path(self, client_id: str) -> str:
+        return os.path.join(self.path, f"{client_id}.json")
+
+    @staticmethod
+    def version(path: str) -> tuple:
+        # Every save replaces the file, so its inode changes even within one mtime tick
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def get(self, client_id: str) -> Optional[BM25Index]:
+        """Get a client's index, or None if it has never been built"""
+        path = self.index_path(client_id)
+        try:
+            version = self.version(path)
+        except FileNotFoundError:
+            return None
+
+        with self.lock:
+            entry = self.indexes.get(client_id)
+            if entry is not None and entry[0] == version:
+                self.indexes.move_to_end(client_id)
+                return entry[1]
+
+        with open(path) as f:
+            index = BM25Index(json.load(f))
+        self.remember(client_id, version, index)
+        return index
+
+    @contextmanager
+    def writing(self, client_id: str) -> Iterator[None]:
+        """Hold a client's index against other threads and processes while it is read and rewritten"""
+        os.makedirs(self.path, exist_ok=True)
+        with self.write_lock:
+            with open(os.path.join(self.path, f"{client_id}.lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                yield
+
+    def build(self, client_id: str, chunks: Dict[str, str]) -> BM25Index:
+        """Index every chunk of a client from scratch"""
+        index = BM25Index()
+        for doc_id, text in chunks.items():
+            index.add(doc_id, text)
+        with self.writing(client_id):
+            self.save(client_id, index)
+        return index
+
+    def update(self, client_id: str, added: Dict[str, str], removed: List[str]) -> Optional[BM25Index]:
+        """Apply an ingestion's changes; returns None if the client has no index yet"""
+        with self.writing(client_id):
+            # Read inside the lock, so another worker's update isn't overwritten
+            current = self.get(client_id)
+            if current is None:
+                return None
+            # Searches may be using the loaded index; change a copy and swap it in
+            index = BM25Index(dict(current.documents), current.k1, current.b)
+            for doc_id in removed:
+                index.remove(doc_id)
+            for doc_id, text in added.items():
+                index.add(doc_id, text)
+            self.save(client_id, index)
+        return index
+
+    def save(self, client_id: str, index: BM25Index):
+        """Write an index atomically and keep it loaded; caller holds ``writing()``"""
+        path = self.index_path(client_id)
+        with open(path + ".tmp", "w") as f:
+            json.dump(index.documents, f)
+        os.replace(path + ".tmp", path)
+        self.remember(client_id, self.version(path), index)
+
+    def remember(self, client_id: str, version: tuple, index: BM25Index):
+        with self.lock:
+            self.indexes[client_id] = (version, index)
+            self.indexes.move_to_end(client_id)
+            while len(self.indexes) > self.max_loaded:
+                self.indexes.popitem(last=False)
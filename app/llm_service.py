@@ -1,55 +1,66 @@
 from langchain_community.chat_models.openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
-from typing import List, Dict, Optional
-import json
+from langchain.schema import HumanMessage, SystemMessage
+from typing import AsyncIterator, List, Dict, Optional
+import asyncio
+import logging
 
 from app.vector_store import VectorStore
 from app.config import settings
+from app.context_builder import ContextBuilder
+from app.prompt_compiler import prompt_compiler
+from app.token_counter import count_message_tokens
+
+call_logger = logging.getLogger("call_events")
 
 class LLMService:
-    def __init__(self):
+    def __init__(self, vector_store: Optional[VectorStore] = None):
         self.llm = ChatOpenAI(
-            model="gpt-4o",
+            model=settings.llm_model,
             temperature=0.7,
             max_tokens=500,
             api_key=settings.openai_api_key
         )
-        self.vector_store = VectorStore()
+        # Cheaper model for folding old turns into a call's rolling summary
+        self.summary_llm = ChatOpenAI(
+            model=settings.summary_model,
+            temperature=0,
+            max_tokens=200,
+            api_key=settings.openai_api_key
+        )
+        self.vector_store = vector_store or VectorStore()
+        self.context_builder = ContextBuilder(settings.history_token_budget)
+        # Caps in-flight completions so a burst of calls queues instead of
+        # tripping provider rate limits
+        self.semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
     
     def create_system_prompt(self, client_data: Dict, relevant_knowledge: List[Dict]) -> str:
-        knowledge_context = "\n".join([doc['content'] for doc in relevant_knowledge])
-        
-        business_hours_str = ""
-        if client_data.get('business_hours'):
-            business_hours_str = json.dumps(client_data['business_hours'], indent=2)
-        
-        return f"""You are an AI assistant representing {client_data['business_name']}.
+        return prompt_compiler.render(client_data, relevant_knowledge)
+    
+    def record_prompt_tokens(self, client_data: Dict, messages: List, turn_stats: Optional[Dict]):
+        """Report how many prompt tokens a turn sends and how many are the cacheable prefix"""
+        _, static_tokens = prompt_compiler.static_prefix(client_data)
+        prompt_tokens = count_message_tokens(messages)
+        call_logger.info(
+            f"Prompt tokens for client {client_data['client_id']}: "
+            f"{prompt_tokens} total, {static_tokens} static prefix"
+        )
+        if turn_stats is not None:
+            turn_stats["prompt_tokens"] = prompt_tokens
+            turn_stats["static_prompt_tokens"] = static_tokens
+    
+    def build_messages(self, client_data: Dict, user_message: str, conversation_history: List[Dict], relevant_knowledge: List[Dict], summary: Optional[str] = None, summarized: int = 0) -> List:
+        """Build the chat messages for a caller turn"""
+        # Create system prompt
+        system_prompt = self.create_system_prompt(client_data, relevant_knowledge)
         
-Business Information:
-- Business Name: {client_data['business_name']}
-- Industry: {client_data.get('industry', 'N/A')}
-- Services: {client_data.get('services', 'N/A')}
-- Business Hours: {business_hours_str}
-- Phone: {client_data['phone_number']}
-
-Relevant Knowledge Base:
-{knowledge_context}
-
-FAQs:
-{client_data.get('faqs', 'No FAQs available')}
-
-Instructions:
-1. You are a professional, friendly receptionist for this business
-2. Answer questions using the knowledge base and business information provided
-3. If someone wants to book an appointment, collect: name, phone, preferred date/time, service type
-4. Always stay in character as a representative of this business
-5. Be helpful, professional, and concise
-6. If you don't know something, say you'll have someone get back to them
-7. For appointment booking, confirm details before proceeding
-
-When booking appointments, respond with: "BOOK_APPOINTMENT: {{appointment_details_json}}"
-"""
+        # History within the token budget, then the current message
+        return [SystemMessage(content=system_prompt)] + self.context_builder.build(
+            conversation_history,
+            user_message,
+            summary,
+            summarized
+        )
     
     def generate_response(self, client_data: Dict, user_message: str, conversation_history: List[Dict]) -> str:
         # Search for relevant knowledge
@@ -59,22 +70,52 @@ When booking appointments, respond with: "BOOK_APPOINTMENT: {{appointment_detail
             k=3
         )
         
-        # Create system prompt
-        system_prompt = self.create_system_prompt(client_data, relevant_knowledge)
+        messages = self.build_messages(client_data, user_message, conversation_history, relevant_knowledge)
         
-        # Build conversation history
-        messages = [SystemMessage(content=system_prompt)]
+        # Generate response
+        response = self.llm.invoke(messages)
+        return response.content
+    
+    async def agenerate_response(self, client_data: Dict, user_message: str, conversation_history: List[Dict], turn_stats: Optional[Dict] = None, summary: Optional[str] = None, summarized: int = 0) -> str:
+        """Generate a response without blocking the event loop"""
+        relevant_knowledge = await self.vector_store.asearch_knowledge(
+            client_data['client_id'], 
+            user_message, 
+            k=3
+        )
         
-        # Add conversation history
-        for msg in conversation_history[-10:]:  # Last 10 messages for context
-            if msg['role'] == 'user':
-                messages.append(HumanMessage(content=msg['content']))
-            elif msg['role'] == 'assistant':
-                messages.append(AIMessage(content=msg['content']))
+        messages = self.build_messages(client_data, user_message, conversation_history, relevant_knowledge, summary, summarized)
+        self.record_prompt_tokens(client_data, messages, turn_stats)
         
-        # Add current message
-        messages.append(HumanMessage(content=user_message))
+        async with self.semaphore:
+            response = await self.llm.ainvoke(messages)
+        return response.content
+    
+    async def stream_response(self, client_data: Dict, user_message: str, conversation_history: List[Dict], turn_stats: Optional[Dict] = None, summary: Optional[str] = None, summarized: int = 0) -> AsyncIterator[str]:
+        """Yield response tokens as the model produces them"""
+        relevant_knowledge = await self.vector_store.asearch_knowledge(
+            client_data['client_id'], 
+            user_message, 
+            k=3
+        )
         
-        # Generate response
-        response = self.llm.invoke(messages)
-        return response.content
\ No newline at end of file
+        messages = self.build_messages(client_data, user_message, conversation_history, relevant_knowledge, summary, summarized)
+        self.record_prompt_tokens(client_data, messages, turn_stats)
+        
+        async with self.semaphore:
+            async for chunk in self.llm.astream(messages):
+                if chunk.content:
+                    yield chunk.content
+    
+    async def summarize(self, summary: Optional[str], messages: List[Dict]) -> str:
+        """Fold older turns into a call's rolling summary"""
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        prompt = (
+            "Update the summary of this phone call between a caller and a receptionist. "
+            "Keep names, phone numbers, dates, times, services and anything the caller asked for. "
+            "Reply with the summary only.\n\n"
+            f"Current summary:\n{summary or 'None'}\n\n"
+            f"New turns:\n{transcript}"
+        )
+        response = await self.summary_llm.ainvoke([HumanMessage(content=prompt)])
+        return response.content
@@ -1,49 +1,66 @@
+import asyncio
 from datetime import datetime
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Request
-from fastapi.responses import Response
+import hashlib
+import os
+import time
+from fastapi import BackgroundTasks, FastAPI, Depends, HTTPException, UploadFile, File, Form, Request, WebSocket
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy import Engine
 from sqlalchemy.orm import Session
-from typing import List, Optional
-import aiofiles
-import PyPDF2
-import docx
-from io import BytesIO
-    
-from app.call_handler import CallHandler
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.audio_cache import audio_cache, parse_range
+from app.call_handler import DEADLINE_MISSED
+from app.call_log_writer import call_log_writer
+from app.client_cache import client_cache, snapshot_client
 from app.config import settings
-from app.database import Base, CallLog, Client, Knowledge, get_db, engine
-from app.elevenlabs_service import ElevenLabsService
-from app.llm_service import LLMService
+from app.container import container
+from app.exceptions import DocumentTooLargeError
+from app.extractors import extractor_for
+from app.ingestion_service import record_knowledge_source
+from app.database import Base, CallLog, CallTurn, Client, IngestionJob, Knowledge, get_db, engine
+from app.logging_config import setup_logging
+from app.media_stream import MediaStreamSession
 from app.models import ClientCreate, ClientResponse
-from app.twilio_service import TwilioService
-from app.vector_store import VectorStore
+from app.monitoring import router as monitoring_router
+from app.phrase_bank import NUMBER_UNAVAILABLE, greeting, phrase_bank
+from app.prompt_compiler import prompt_compiler
+from app.response_cache import response_cache
+from app.speech_recognizer import create_speech_recognizer
 
 from twilio.twiml.voice_response import VoiceResponse
 
 
 app = FastAPI(title="AI Call Assistant API", version="1.0.0")
-
-# Initialize services
-vector_store = VectorStore()
-llm_service = LLMService()
-twilio_service = TwilioService()
-elevenlabs_service = ElevenLabsService()
-call_handler = CallHandler()
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+app.include_router(monitoring_router)
 
 @app.on_event("startup")
 async def startup_event():
+    setup_logging()
+    
+    # Create database tables
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    container.timings["database"] = round((time.perf_counter() - started) * 1000, 1)
+    
+    call_log_writer.start()
+    if settings.warm_services_on_startup:
+        # Build the services off the event loop so the worker can take requests meanwhile
+        app.state.warm_services = asyncio.create_task(asyncio.to_thread(container.warm))
     print("AI Call Assistant API starting up...")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write out call logs still waiting in the queue
+    await call_log_writer.stop()
+
 @app.get("/")
 async def root():
     return {"message": "AI Call Assistant API", "status": "running"}
 
 # Client Management Endpoints
 @app.post("/clients", response_model=ClientResponse)
-async def create_client(client: ClientCreate, db: Session = Depends(get_db)):
+async def create_client(client: ClientCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Create a new client"""
     # Check if phone number already exists
     existing_client = db.query(Client).filter(Client.phone_number == client.phone_number).first()
@@ -57,7 +74,12 @@ async def create_client(client: ClientCreate, db: Session = Depends(get_db)):
     db.refresh(db_client)
     
     # Create vector store collection for client
-    vector_store.create_collection_for_client(db_client.client_id)
+    container.vector_store.create_collection_for_client(db_client.client_id)
+    
+    # Embed the FAQ questions callers are most likely to ask
+    background_tasks.add_task(container.vector_store.prewarm_faqs, db_client.faqs)
+    # Have the greeting and fallbacks ready in the client's voice before its first call
+    background_tasks.add_task(phrase_bank.render, snapshot_client(db_client))
     
     return db_client
 
@@ -75,7 +97,7 @@ async def get_client(client_id: str, db: Session = Depends(get_db)):
     return client
 
 @app.put("/clients/{client_id}", response_model=ClientResponse)
-async def update_client(client_id: str, client_update: ClientCreate, db: Session = Depends(get_db)):
+async def update_client(client_id: str, client_update: ClientCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Update client information"""
     client = db.query(Client).filter(Client.client_id == client_id).first()
     if not client:
@@ -87,8 +109,18 @@ async def update_client(client_id: str, client_update: ClientCreate, db: Session
     client.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(client)
+    invalidate_client(client_id)
+    background_tasks.add_task(container.vector_store.prewarm_faqs, client.faqs)
+    # A new business name means a new greeting
+    background_tasks.add_task(phrase_bank.render, snapshot_client(client))
     return client
 
+def invalidate_client(client_id: str):
+    """Drop everything cached from a client's profile after it changes"""
+    client_cache.invalidate(client_id)
+    prompt_compiler.invalidate(client_id)
+    response_cache.invalidate(client_id)
+
 # Knowledge Management Endpoints
 @app.post("/clients/{client_id}/knowledge/text")
 async def add_text_knowledge(
@@ -102,83 +134,137 @@ async def add_text_knowledge(
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
+    # Untitled snippets get a source per content, so re-posting one is a no-op
+    source = source or f"manual_input_{hashlib.sha256(content.encode()).hexdigest()[:12]}"
+    
     # Add to vector store
-    document_ids = vector_store.add_knowledge(client_id, content, source)
+    report = await container.vector_store.aadd_knowledge(client_id, content, source)
+    if report["added"] or report["removed"]:
+        # A new profile version makes every worker drop answers cached from the old knowledge
+        client.updated_at = datetime.utcnow()
     
     # Save to database
-    knowledge = Knowledge(
-        client_id=client_id,
-        content=content,
-        source=source or "manual_input",
-        embedding_id=",".join(document_ids)
-    )
-    db.add(knowledge)
-    db.commit()
+    version = record_knowledge_source(db, client_id, source, content, report["document_ids"])
+    if report["added"] or report["removed"]:
+        invalidate_client(client_id)
     
-    return {"message": "Knowledge added successfully", "document_ids": document_ids}
+    return {"message": "Knowledge added successfully", "source": source, "version": version, **report}
 
 @app.post("/clients/{client_id}/knowledge/upload")
 async def upload_knowledge_file(
     client_id: str,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    """Upload and process knowledge file (PDF, DOCX, TXT)"""
+    """Upload a knowledge file (PDF, DOCX, TXT) and queue it for processing"""
     client = db.query(Client).filter(Client.client_id == client_id).first()
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    # Read file content
-    content = await file.read()
-    
-    # Extract text based on file type
-    text_content = ""
-    if file.filename.endswith('.pdf'):
-        text_content = extract_pdf_text(content)
-    elif file.filename.endswith('.docx'):
-        text_content = extract_docx_text(content)
-    elif file.filename.endswith('.txt'):
-        text_content = content.decode('utf-8')
-    else:
+    extension = extractor_for(file.filename, file.content_type)
+    if extension is None:
         raise HTTPException(status_code=400, detail="Unsupported file type")
     
-    # Add to vector store
-    document_ids = vector_store.add_knowledge(client_id, text_content, file.filename)
-    
-    # Save to database
-    knowledge = Knowledge(
-        client_id=client_id,
-        content=text_content,
-        source=file.filename,
-        embedding_id=",".join(document_ids)
-    )
-    db.add(knowledge)
-    db.commit()
-    
-    return {"message": "File processed successfully", "document_ids": document_ids}
-
-def extract_pdf_text(content: bytes) -> str:
-    """Extract text from PDF"""
+    # Spool to disk and hand off to a worker; parsing and embedding happen there
+    job = container.ingestion_service.create_job(db, client_id, file.filename, extension)
     try:
-        pdf_file = BytesIO(content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        await container.ingestion_service.spool(file, job)
+    except DocumentTooLargeError as e:
+        container.ingestion_service.fail(db, job, str(e))
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
+        print(f"Error spooling upload {file.filename}: {e}")
+        container.ingestion_service.fail(db, job, f"Upload could not be saved: {e}")
+        raise HTTPException(status_code=500, detail="Upload could not be saved")
+    await enqueue_ingestion(db, job, background_tasks)
+    
+    return {"message": "File queued for processing", "job_id": job.job_id, "status": job.status}
 
-def extract_docx_text(content: bytes) -> str:
-    """Extract text from DOCX"""
-    try:
-        doc = docx.Document(BytesIO(content))
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing DOCX: {str(e)}")
+@app.get("/clients/{client_id}/knowledge/jobs")
+async def get_ingestion_jobs(client_id: str, limit: int = 20, db: Session = Depends(get_db)):
+    """List a client's recent knowledge ingestion jobs"""
+    jobs = db.query(IngestionJob).filter(
+        IngestionJob.client_id == client_id
+    ).order_by(IngestionJob.created_at.desc()).limit(limit).all()
+    return [container.ingestion_service.job_status(job) for job in jobs]
+
+@app.get("/clients/{client_id}/knowledge/jobs/{job_id}")
+async def get_ingestion_job(client_id: str, job_id: str, db: Session = Depends(get_db)):
+    """Get an ingestion job's status and progress"""
+    job = get_job_or_404(db, client_id, job_id)
+    return container.ingestion_service.job_status(job)
+
+@app.post("/clients/{client_id}/knowledge/jobs/{job_id}/cancel")
+async def cancel_ingestion_job(client_id: str, job_id: str, db: Session = Depends(get_db)):
+    """Stop an ingestion job; chunks stored so far are kept so it can be resumed"""
+    job = get_job_or_404(db, client_id, job_id)
+    if not container.ingestion_service.cancel(db, job):
+        raise HTTPException(status_code=409, detail=f"Job is already {job.status}")
+    return container.ingestion_service.job_status(job)
+
+@app.post("/clients/{client_id}/knowledge/jobs/{job_id}/resume")
+async def resume_ingestion_job(
+    client_id: str,
+    job_id: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Restart a cancelled, failed or interrupted ingestion job"""
+    job = get_job_or_404(db, client_id, job_id)
+    if not container.ingestion_service.resume(db, job):
+        raise HTTPException(status_code=409, detail=f"Job is {job.status} and cannot be resumed")
+    await enqueue_ingestion(db, job, background_tasks)
+    return container.ingestion_service.job_status(job)
+
+def get_job_or_404(db: Session, client_id: str, job_id: str) -> IngestionJob:
+    job = db.query(IngestionJob).filter(
+        IngestionJob.job_id == job_id,
+        IngestionJob.client_id == client_id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
+async def enqueue_ingestion(db: Session, job: IngestionJob, background_tasks: BackgroundTasks):
+    """Send a job to the Celery workers, or run it in this process if they can't be reached"""
+    job_id = job.job_id
+    if settings.ingestion_use_celery:
+        try:
+            from app.tasks.ingestion_tasks import ingest_knowledge
+            # Publishing waits on the broker, so it runs off the event loop and is given up on if the broker hangs
+            await asyncio.wait_for(asyncio.to_thread(ingest_knowledge.delay, job_id), settings.ingestion_enqueue_timeout_seconds)
+            return
+        except asyncio.TimeoutError:
+            # The message may still reach a worker, which skips a failed job, so don't also run it here
+            print(f"Error queueing ingestion job {job_id}: the broker did not answer")
+            container.ingestion_service.fail(db, job, "Timed out queueing the job; resume it to retry")
+            return
+        except Exception as e:
+            print(f"Error queueing ingestion job {job_id}, running it in-process: {e}")
+    background_tasks.add_task(container.ingestion_service.run, job_id)
+
+@app.delete("/clients/{client_id}/knowledge/{source:path}")
+async def delete_knowledge_source(client_id: str, source: str, db: Session = Depends(get_db)):
+    """Remove a knowledge source and all of its chunks"""
+    client = db.query(Client).filter(Client.client_id == client_id).first()
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+    
+    removed = await asyncio.to_thread(container.vector_store.delete_source, client_id, source)
+    deleted = db.query(Knowledge).filter(
+        Knowledge.client_id == client_id,
+        Knowledge.source == source
+    ).delete()
+    if removed or deleted:
+        # A new profile version makes every worker drop answers cached from the old knowledge
+        client.updated_at = datetime.utcnow()
+    db.commit()
+    if not removed and not deleted:
+        raise HTTPException(status_code=404, detail="Knowledge source not found")
+    invalidate_client(client_id)
+    
+    return {"message": "Knowledge source deleted", "removed": removed}
 
 # Call Handling Endpoints
 @app.post("/call/incoming")
@@ -191,29 +277,24 @@ async def handle_incoming_call(request: Request, db: Session = Depends(get_db)):
     call_sid = form_data.get("CallSid")
     
     # Find client by phone number
-    client = db.query(Client).filter(Client.phone_number == to_number).first()
+    client = client_cache.get_by_phone(db, to_number)
     
-    if not client or not client.is_active:
+    if not client or not client["is_active"]:
         response = VoiceResponse()
-        response.say("I'm sorry, this number is not currently available. Please try again later.")
+        await container.twilio_service.add_speech(response, [NUMBER_UNAVAILABLE], client["voice_id"] if client else None)
         response.hangup()
         return Response(content=str(response), media_type="application/xml")
     
-    # Create call log
-    call_log = CallLog(
-        client_id=client.client_id,
-        caller_phone=from_number,
-        call_sid=call_sid,
-        conversation=[]
-    )
-    db.add(call_log)
-    db.commit()
+    # Create call log; written in the background so the greeting isn't delayed
+    call_log_writer.log_call(client["client_id"], from_number, call_sid)
     
-    # Generate greeting
-    greeting = f"Hello! Thank you for calling {client.business_name}. How can I help you today?"
+    if settings.call_mode == "media_stream":
+        # The whole call runs over the WebSocket, greeting included
+        twiml = container.twilio_service.create_media_stream_twiml(f"wss://{request.url.netloc}/call/media-stream", to_number)
+        return Response(content=twiml, media_type="application/xml")
     
-    # Create TwiML response
-    twiml = twilio_service.create_twiml_response(greeting, client.voice_id)
+    # Create TwiML response; the phrase bank has already rendered the greeting
+    twiml = await container.twilio_service.create_twiml_response(greeting(client["business_name"]), client["voice_id"])
     
     return Response(content=twiml, media_type="application/xml")
 
@@ -227,53 +308,131 @@ async def process_speech(request: Request, db: Session = Depends(get_db)):
     to_number = form_data.get("To")
     
     # Find client
-    client = db.query(Client).filter(Client.phone_number == to_number).first()
-    if not client:
+    client_data = client_cache.get_by_phone(db, to_number)
+    if not client_data:
         response = VoiceResponse()
         response.say("I'm sorry, there was an error. Please try again.")
         response.hangup()
         return Response(content=str(response), media_type="application/xml")
     
-    # Convert client to dict for processing
-    client_data = {
-        "client_id": client.client_id,
-        "business_name": client.business_name,
-        "industry": client.industry,
-        "business_hours": client.business_hours,
-        "services": client.services,
-        "faqs": client.faqs,
-        "phone_number": client.phone_number
-    }
+    if settings.streaming_responses:
+        # Answer with the first sentence; Twilio fetches the rest via a redirect
+        turn = container.call_handler.start_turn(client_data, speech_result, call_sid)
+        try:
+            chunks = await asyncio.wait_for(turn.next_chunks(), settings.turn_deadline_seconds)
+        except asyncio.TimeoutError:
+            container.call_handler.cancel_turn(call_sid)
+            twiml = await container.twilio_service.create_twiml_response(DEADLINE_MISSED, client_data["voice_id"])
+            return Response(content=twiml, media_type="application/xml")
+        if turn.finished:
+            container.call_handler.end_turn(call_sid)
+        twiml = await container.twilio_service.create_streaming_twiml(chunks, client_data["voice_id"], turn.finished)
+        return Response(content=twiml, media_type="application/xml")
     
     # Process the call
-    result = await call_handler.process_call(client_data, speech_result, call_sid)
+    try:
+        result = await asyncio.wait_for(
+            container.call_handler.process_call(client_data, speech_result, call_sid),
+            settings.turn_deadline_seconds
+        )
+    except asyncio.TimeoutError:
+        twiml = await container.twilio_service.create_twiml_response(DEADLINE_MISSED, client_data["voice_id"])
+        return Response(content=twiml, media_type="application/xml")
     
     # Update call log
-    call_log = db.query(CallLog).filter(CallLog.call_sid == call_sid).first()
-    if call_log:
-        conversation = call_log.conversation or []
-        conversation.extend([
-            {"role": "user", "content": speech_result, "timestamp": datetime.utcnow().isoformat()},
-            {"role": "assistant", "content": result["response"], "timestamp": datetime.utcnow().isoformat()}
-        ])
-        call_log.conversation = conversation
-        if result["appointment_booked"]:
-            call_log.appointment_booked = True
-        db.commit()
+    call_log_writer.log_turn(call_sid, speech_result, result)
     
     # Generate TwiML response
-    twiml = twilio_service.create_twiml_response(result["response"], client.voice_id)
+    twiml = await container.twilio_service.create_twiml_response(result["response"], client_data["voice_id"])
+    
+    return Response(content=twiml, media_type="application/xml")
+
+@app.post("/call/continue-speech")
+async def continue_speech(request: Request, db: Session = Depends(get_db)):
+    """Speak the next chunks of a reply that is still being generated"""
+    form_data = await request.form()
+    
+    call_sid = form_data.get("CallSid")
+    to_number = form_data.get("To")
+    
+    client_data = client_cache.get_by_phone(db, to_number)
+    turn = container.call_handler.get_turn(call_sid)
+    if not client_data or not turn:
+        # Turns live in the worker that started them, so a redirect reaching another
+        # worker ends the reply here; deployments with several workers need sticky sessions
+        twiml = await container.twilio_service.create_streaming_twiml([], client_data["voice_id"] if client_data else None)
+        return Response(content=twiml, media_type="application/xml")
+    
+    try:
+        chunks = await asyncio.wait_for(turn.next_chunks(), settings.turn_deadline_seconds)
+    except asyncio.TimeoutError:
+        container.call_handler.cancel_turn(call_sid)
+        twiml = await container.twilio_service.create_twiml_response(DEADLINE_MISSED, client_data["voice_id"])
+        return Response(content=twiml, media_type="application/xml")
+    
+    if turn.finished:
+        container.call_handler.end_turn(call_sid)
     
+    twiml = await container.twilio_service.create_streaming_twiml(chunks, client_data["voice_id"], turn.finished)
     return Response(content=twiml, media_type="application/xml")
 
+@app.websocket("/call/media-stream")
+async def media_stream(websocket: WebSocket, db: Session = Depends(get_db)):
+    """Hold a call over a Twilio Media Stream: streaming STT, replies and TTS, with barge-in"""
+    def find_client(phone_number: str):
+        try:
+            return client_cache.get_by_phone(db, phone_number)
+        finally:
+            # Don't hold a connection for the length of the call
+            db.close()
+    
+    await websocket.accept()
+    session = MediaStreamSession(websocket, container.call_handler, create_speech_recognizer(), find_client)
+    await session.run()
+
+@app.post("/call/status")
+async def call_status(request: Request):
+    """Handle Twilio call status callbacks"""
+    form_data = await request.form()
+    
+    # Free the conversation as soon as the call is over
+    if form_data.get("CallStatus") in ("completed", "busy", "failed", "no-answer", "canceled"):
+        await container.call_handler.end_conversation(form_data.get("CallSid"))
+    
+    return {"message": "Status received"}
+
+def load_conversations(db: Session, calls: List[CallLog]) -> Dict[str, List[Dict]]:
+    """Rebuild the conversation of each call from its turns"""
+    conversations = {call.call_sid: [] for call in calls}
+    if not conversations:
+        return conversations
+    
+    turns = db.query(CallTurn).filter(
+        CallTurn.call_sid.in_(list(conversations))
+    ).order_by(CallTurn.call_sid, CallTurn.seq).all()
+    for turn in turns:
+        conversations[turn.call_sid].append({
+            "role": turn.role,
+            "content": turn.content,
+            "timestamp": (turn.completed_at or turn.started_at).isoformat(),
+            "latency_ms": turn.latency_ms
+        })
+    
+    # Calls recorded before call_turns existed keep their legacy JSON history
+    for call in calls:
+        if not conversations[call.call_sid] and call.conversation:
+            conversations[call.call_sid] = call.conversation
+    return conversations
+
 # Voice Management Endpoints
 @app.get("/voices")
 async def get_available_voices():
     """Get available ElevenLabs voices"""
-    return elevenlabs_service.get_available_voices()
+    # Served from the cached catalogue; only the first request waits for ElevenLabs
+    return await container.elevenlabs_service.get_available_voices()
 
 @app.put("/clients/{client_id}/voice")
-async def set_client_voice(client_id: str, voice_id: str = Form(...), db: Session = Depends(get_db)):
+async def set_client_voice(client_id: str, background_tasks: BackgroundTasks, voice_id: str = Form(...), db: Session = Depends(get_db)):
     """Set client's preferred voice"""
     client = db.query(Client).filter(Client.client_id == client_id).first()
     if not client:
@@ -281,16 +440,67 @@ async def set_client_voice(client_id: str, voice_id: str = Form(...), db: Sessio
     
     client.voice_id = voice_id
     db.commit()
+    invalidate_client(client_id)
+    background_tasks.add_task(phrase_bank.render, snapshot_client(client))
     
     return {"message": "Voice updated successfully"}
 
 # Audio Generation Endpoint
 @app.get("/audio/{voice_id}/{text_hash}")
-async def get_audio(voice_id: str, text_hash: str):
-    """Get generated audio file"""
-    # In production, implement caching mechanism
-    # For now, return a placeholder response
-    return {"message": "Audio generation endpoint - implement caching"}
+async def get_audio(voice_id: str, text_hash: str, request: Request):
+    """Get generated audio, synthesising it on first request"""
+    entry = await asyncio.to_thread(audio_cache.entry, text_hash)
+    if entry is None or entry["voice_id"] != voice_id:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    
+    etag = f'"{text_hash}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # The URL names the content, so it never changes
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    media_type = audio_cache.media_type(entry["output_format"])
+    if (
+        not request.headers.get("range")
+        and text_hash not in audio_cache.inflight
+        and not audio_cache.exists(text_hash, entry["output_format"])
+    ):
+        # Forward audio as ElevenLabs sends it rather than once the whole clip is ready
+        chunks = await audio_cache.stream(text_hash, entry, stream_audio)
+        if chunks is None:
+            raise HTTPException(status_code=503, detail="Audio could not be generated")
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
+    
+    path = await audio_cache.get(text_hash, synthesise_audio)
+    if path is None:
+        raise HTTPException(status_code=503, detail="Audio could not be generated")
+    
+    size = os.path.getsize(path)
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    
+    start, end = byte_range
+    with open(path, "rb") as f:
+        f.seek(start)
+        content = f.read(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(content=content, status_code=206, media_type=media_type, headers=headers)
+
+async def synthesise_audio(entry: Dict) -> Optional[bytes]:
+    """Synthesise an audio cache entry with ElevenLabs"""
+    return await container.elevenlabs_service.synthesise(entry)
+
+def stream_audio(entry: Dict) -> AsyncIterator[bytes]:
+    """Stream an audio cache entry from ElevenLabs"""
+    return container.elevenlabs_service.synthesise_stream(entry)
 
 # Analytics Endpoints
 @app.get("/clients/{client_id}/analytics")
@@ -337,13 +547,14 @@ async def get_client_calls(client_id: str, limit: int = 50, db: Session = Depend
     calls = db.query(CallLog).filter(
         CallLog.client_id == client_id
     ).order_by(CallLog.created_at.desc()).limit(limit).all()
+    conversations = load_conversations(db, calls)
     
     return [
         {
             "id": call.id,
             "caller_phone": call.caller_phone,
             "call_sid": call.call_sid,
-            "conversation": call.conversation,
+            "conversation": conversations[call.call_sid],
             "appointment_booked": call.appointment_booked,
             "call_duration": call.call_duration,
             "created_at": call.created_at
@@ -359,23 +570,14 @@ async def test_conversation(
     db: Session = Depends(get_db)
 ):
     """Test conversation with AI assistant"""
-    client = db.query(Client).filter(Client.client_id == client_id).first()
-    if not client:
+    client_data = client_cache.get_by_client_id(db, client_id)
+    if not client_data:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    client_data = {
-        "client_id": client.client_id,
-        "business_name": client.business_name,
-        "industry": client.industry,
-        "business_hours": client.business_hours,
-        "services": client.services,
-        "faqs": client.faqs,
-        "phone_number": client.phone_number
-    }
-    
     # Generate test response
     test_call_sid = f"test_{client_id}_{datetime.utcnow().timestamp()}"
-    result = await call_handler.process_call(client_data, message, test_call_sid)
+    result = await container.call_handler.process_call(client_data, message, test_call_sid)
+    await container.call_handler.end_conversation(test_call_sid)
     
     return result
 
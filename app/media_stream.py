@@ -0,0 +1,229 @@
+from collections import deque
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Mapping, Optional, Set
+import asyncio
+import base64
+import time
+
+from fastapi import WebSocket
+
+from app.audio_cache import audio_cache, percentile
+from app.call_handler import DEADLINE_MISSED, STREAM_FAILED
+from app.call_log_writer import call_log_writer
+from app.config import settings
+from app.phrase_bank import greeting
+from app.speech_recognizer import SpeechRecognizer, VoiceActivityDetector
+
+if TYPE_CHECKING:
+    from app.call_handler import CallHandler
+
+MEDIA_STREAM_FORMAT = "ulaw_8000"  # The only audio a media stream carries
+FRAME_BYTES = 1600  # 200 ms per outbound message when replaying cached audio
+TIMINGS = 1000
+
+async def speech_audio(text: str, voice_id: str) -> AsyncIterator[bytes]:
+    """A text's μ-law audio in a voice, from the audio cache or streamed from ElevenLabs into it"""
+    from app.container import container
+    elevenlabs_service = container.elevenlabs_service
+    key = (await audio_cache.aregister([text], voice_id, output_format=MEDIA_STREAM_FORMAT))[0]
+    entry = await asyncio.to_thread(audio_cache.entry, key)
+    if key not in audio_cache.inflight and not audio_cache.exists(key, MEDIA_STREAM_FORMAT):
+        chunks = await audio_cache.stream(key, entry, elevenlabs_service.synthesise_stream)
+        if chunks is not None:
+            async for chunk in chunks:
+                yield chunk
+        return
+
+    path = await audio_cache.get(key, elevenlabs_service.synthesise)
+    if path is None:
+        return
+    with open(path, "rb") as f:
+        audio = f.read()
+    for start in range(0, len(audio), FRAME_BYTES):
+        yield audio[start:start + FRAME_BYTES]
+
+class MediaStreamMetrics:
+    """Counters and turn latencies across this worker's media stream calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.active = 0
+        self.turns = 0
+        self.barge_ins = 0
+        # From the caller's last word to the first audio of the reply
+        self.first_audio_ms: deque = deque(maxlen=TIMINGS)
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "active": self.active,
+            "turns": self.turns,
+            "barge_ins": self.barge_ins,
+            "first_audio_ms_p50": percentile(self.first_audio_ms, 0.5),
+            "first_audio_ms_p95": percentile(self.first_audio_ms, 0.95)
+        }
+
+media_stream_metrics = MediaStreamMetrics()
+
+class MediaStreamSession:
+    """One call held over a Twilio Media Stream instead of Gather webhooks.
+
+    The caller's audio goes to the speech recognizer; each utterance it
+    finishes is answered with ``CallHandler.stream_call``, and each speakable
+    chunk is synthesised straight into the stream. A mark follows each chunk
+    and Twilio echoes it once played, so the session knows while the
+    assistant is still talking. If the caller starts speaking then, the
+    audio Twilio has queued is cleared and the reply is dropped (barge-in).
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        call_handler: "CallHandler",
+        recognizer: SpeechRecognizer,
+        find_client: Callable[[str], Optional[Mapping]],
+        speak: Optional[Callable[[str, str], AsyncIterator[bytes]]] = None
+    ):
+        self.websocket = websocket
+        self.call_handler = call_handler
+        self.recognizer = recognizer
+        self.find_client = find_client
+        self.speak = speak or speech_audio
+        self.vad = VoiceActivityDetector(settings.vad_threshold, settings.vad_start_ms, settings.vad_end_ms)
+        self.stream_sid: Optional[str] = None
+        self.call_sid: Optional[str] = None
+        self.client: Optional[Mapping] = None
+        self.voice_id: Optional[str] = None
+        self.marks: Set[str] = set()
+        self.sent_marks = 0
+        self.reply: Optional[asyncio.Task] = None
+        self.listener: Optional[asyncio.Task] = None
+        self.speech_ended: Optional[float] = None
+        self.turn_started: Optional[float] = None
+
+    @property
+    def speaking(self) -> bool:
+        """Whether a reply is being generated or its audio is still playing"""
+        return bool(self.marks) or (self.reply is not None and not self.reply.done())
+
+    async def run(self):
+        """Handle the stream's events until Twilio stops it or hangs up"""
+        try:
+            async for message in self.websocket.iter_json():
+                event = message.get("event")
+                if event == "start":
+                    if not await self.start(message):
+                        break
+                elif event == "media":
+                    await self.receive(message["media"])
+                elif event == "mark":
+                    self.marks.discard(message["mark"]["name"])
+                elif event == "stop":
+                    break
+        finally:
+            await self.close()
+
+    async def start(self, message: Dict) -> bool:
+        self.stream_sid = message["streamSid"]
+        self.call_sid = message["start"]["callSid"]
+        parameters = message["start"].get("customParameters") or {}
+        self.client = await asyncio.to_thread(self.find_client, parameters.get("To"))
+        if not self.client:
+            print(f"Error starting media stream for call {self.call_sid}: no client for {parameters.get('To')}")
+            return False
+
+        self.voice_id = self.client["voice_id"] or settings.media_stream_voice_id
+        media_stream_metrics.calls += 1
+        media_stream_metrics.active += 1
+        await self.recognizer.start()
+        self.listener = asyncio.create_task(self.listen())
+        # Pre-rendered by the phrase bank, and interruptible like any reply
+        self.reply = asyncio.create_task(self.say(greeting(self.client["business_name"])))
+        return True
+
+    async def receive(self, media: Dict):
+        """Pass caller audio to the recognizer and watch it for barge-in"""
+        if media.get("track", "inbound") != "inbound":
+            return
+        audio = base64.b64decode(media["payload"])
+        await self.recognizer.send(audio)
+        event = self.vad.feed(audio)
+        if event == "start" and settings.barge_in and self.speaking:
+            await self.barge_in()
+        elif event == "end":
+            self.speech_ended = time.monotonic() - settings.vad_end_ms / 1000
+
+    async def barge_in(self):
+        """Stop talking: drop the reply and whatever audio Twilio still has queued"""
+        media_stream_metrics.barge_ins += 1
+        if self.reply is not None:
+            self.reply.cancel()
+        if self.marks:
+            self.marks.clear()
+            await self.websocket.send_json({"event": "clear", "streamSid": self.stream_sid})
+
+    async def listen(self):
+        async for utterance in self.recognizer.utterances():
+            if self.reply is not None:
+                # A new utterance supersedes a reply that hasn't finished
+                self.reply.cancel()
+            self.reply = asyncio.create_task(self.answer(utterance))
+
+    async def answer(self, utterance: str):
+        """Speak the reply to an utterance chunk by chunk as it is generated"""
+        self.turn_started = self.speech_ended or time.monotonic()
+        self.speech_ended = None
+        result = {}
+        chunks = self.call_handler.stream_call(self.client, utterance, self.call_sid, result)
+        try:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), settings.turn_deadline_seconds)
+            except asyncio.TimeoutError:
+                await self.say(DEADLINE_MISSED)
+                return
+            except StopAsyncIteration:
+                chunk = None
+            if chunk is not None:
+                await self.say(chunk)
+            async for chunk in chunks:
+                await self.say(chunk)
+        except asyncio.CancelledError:
+            await chunks.aclose()
+            raise
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            result.update({
+                "response": STREAM_FAILED,
+                "appointment_booked": False,
+                "appointment_data": None,
+                "completed_at": datetime.utcnow()
+            })
+            await self.say(STREAM_FAILED)
+        media_stream_metrics.turns += 1
+        call_log_writer.log_turn(self.call_sid, utterance, result)
+
+    async def say(self, text: str):
+        """Send a text's audio into the stream, then a mark to learn when it has played"""
+        async for audio in self.speak(text, self.voice_id):
+            if self.turn_started is not None:
+                media_stream_metrics.first_audio_ms.append((time.monotonic() - self.turn_started) * 1000)
+                self.turn_started = None
+            await self.websocket.send_json({
+                "event": "media",
+                "streamSid": self.stream_sid,
+                "media": {"payload": base64.b64encode(audio).decode()}
+            })
+        self.sent_marks += 1
+        name = str(self.sent_marks)
+        self.marks.add(name)
+        await self.websocket.send_json({"event": "mark", "streamSid": self.stream_sid, "mark": {"name": name}})
+
+    async def close(self):
+        for task in (self.reply, self.listener):
+            if task is not None:
+                task.cancel()
+        await self.recognizer.close()
+        if self.client:
+            media_stream_metrics.active -= 1
+        if self.call_sid:
+            await self.call_handler.end_conversation(self.call_sid)
@@ -1,6 +1,14 @@
 from fastapi import APIRouter
 from app.database import SessionLocal
 from app.database import Client, CallLog
+from app.audio_cache import audio_cache
+from app.call_log_writer import call_log_writer
+from app.client_cache import client_cache
+from app.container import container
+from app.embedding_cache import embedding_cache
+from app.media_stream import media_stream_metrics
+from app.phrase_bank import phrase_bank
+from app.response_cache import response_cache
 import psutil
 import os
 
@@ -53,4 +61,35 @@ async def call_metrics():
             "conversion_rate": (appointments_booked / total_calls * 100) if total_calls > 0 else 0
         }
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@router.get("/metrics/cache")
+async def cache_metrics():
+    """Get hit/miss counters for the in-process caches"""
+    return {
+        "audio": audio_cache.stats(),
+        "clients": client_cache.stats(),
+        "embeddings": embedding_cache.stats(),
+        "phrases": phrase_bank.stats(),
+        "responses": response_cache.stats()
+    }
+
+@router.get("/metrics/call-log")
+async def call_log_metrics():
+    """Get queue depth and write counters for the call log writer"""
+    return call_log_writer.stats()
+
+@router.get("/metrics/tts")
+async def tts_metrics():
+    """Get ElevenLabs request counters, queueing delay and synthesis time"""
+    return container.elevenlabs_service.stats()
+
+@router.get("/metrics/media-streams")
+async def media_stream_stats():
+    """Get turn latency and barge-in counters for calls held over media streams"""
+    return media_stream_metrics.stats()
+
+@router.get("/startup")
+async def startup_metrics():
+    """Get how long each service took to build in this worker"""
+    return container.stats()
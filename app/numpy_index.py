@@ -0,0 +1,410 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+
+PRECISIONS = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+BLOCK_ROWS = 4096
+
+def quantise(vectors: np.ndarray, precision: str):
+    """Encode float32 rows at a storage precision; int8 rows get a scale each"""
+    if precision == "int8":
+        scales = np.abs(vectors).max(axis=1, initial=0) / 127
+        # All-zero rows keep a scale of 1 rather than dividing by zero
+        scales = np.where(scales > 0, scales, 1).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+    return vectors.astype(PRECISIONS[precision]), None
+
+class VectorMatrix:
+    """A tenant's vectors as scanned by queries, at float32, float16 or int8.
+
+    Quantised matrices may also keep the float32 originals on disk; queries
+    scan the small codes and read only their best candidates' originals to
+    re-rank them exactly.
+    """
+
+    def __init__(self, precision: str, codes: np.ndarray, scales: Optional[np.ndarray] = None, exact: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.codes = codes
+        self.scales = scales
+        self.exact = exact if exact is not None or precision != "float32" else codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def dimensions(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def approximate(self) -> bool:
+        return self.precision != "float32"
+
+    def rows(self, index) -> np.ndarray:
+        """Float32 rows: the originals if kept, otherwise decoded from the codes"""
+        if self.exact is not None:
+            return np.asarray(self.exact[index], dtype=np.float32)
+        rows = np.asarray(self.codes[index], dtype=np.float32)
+        if self.scales is not None:
+            rows *= np.asarray(self.scales[index])[..., None]
+        return rows
+
+    def dots(self, query: np.ndarray, index: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dot product of every row (or the indexed rows) with the query, decoding a block of rows at a time"""
+        codes = self.codes if index is None else self.codes[index]
+        scales = self.scales if index is None or self.scales is None else self.scales[index]
+        if not self.approximate:
+            return codes @ query
+        dots = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            block = np.asarray(codes[start:start + BLOCK_ROWS], dtype=np.float32) @ query
+            if scales is not None:
+                block *= scales[start:start + BLOCK_ROWS]
+            dots[start:start + BLOCK_ROWS] = block
+        return dots
+
+    def nbytes(self) -> Dict[str, int]:
+        """Bytes scanned by every query, and bytes kept on disk"""
+        scanned = self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        exact = self.exact.nbytes if self.exact is not None and self.exact is not self.codes else 0
+        return {"scanned": scanned, "disk": scanned + exact}
+
+class NumpyCollection:
+    """One tenant's vectors, or a shared collection's, as a contiguous matrix memory-mapped from disk.
+
+    Implements the subset of Chroma's collection API that VectorStore uses
+    (add, get, delete, query, count), with the same squared-L2 distances, so
+    the two backends are interchangeable. Vectors are written at ``precision``
+    (see VectorMatrix); a collection stored at another precision is read as
+    it is and converted the next time it is written.
+    """
+
+    def __init__(self, path: str, precision: str = "float32", keep_exact: bool = True, rerank_factor: int = 4):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown vector precision: {precision}")
+        self.path = path
+        self.precision = precision
+        self.keep_exact = keep_exact
+        self.rerank_factor = rerank_factor
+        self.metadata: Dict = {}
+        self.lock = threading.Lock()
+        # (ids, documents, metadatas, matrix, squared norms), swapped as a whole
+        # so queries running on other threads never see a half-updated tenant
+        self.snapshot = ([], [], [], VectorMatrix("float32", np.zeros((0, 0), dtype=np.float32)), np.zeros(0, dtype=np.float32))
+        # Row numbers per metadata value, for the snapshot they were built from
+        self.partitions = (self.snapshot, {})
+        self.loaded_version: Optional[tuple] = None
+        self.load()
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def load(self):
+        """Map the tenant's matrix and read its ids, documents and metadata"""
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        count, dimensions = len(meta["ids"]), meta["dimensions"]
+        # Collections written before quantisation only have a float32 "vectors" file
+        precision = meta.get("precision", "float32")
+
+        def mapped(key: str, dtype, shape):
+            if not count or not meta.get(key):
+                return None
+            # Pages are read on demand; the OS can drop them again under pressure
+            return np.memmap(os.path.join(self.path, meta[key]), dtype=dtype, mode="r", shape=shape)
+
+        exact = mapped("vectors", np.float32, (count, dimensions))
+        codes = exact if precision == "float32" else mapped("codes", PRECISIONS[precision], (count, dimensions))
+        if codes is None:
+            codes = np.zeros((count, dimensions), dtype=PRECISIONS[precision])
+        matrix = VectorMatrix(precision, codes, mapped("scales", np.float32, (count,)), exact)
+
+        norms = mapped("norms", np.float32, (count,))
+        if norms is None:
+            norms = np.einsum("ij,ij->i", exact, exact) if count else np.zeros(0, dtype=np.float32)
+        self.snapshot = (meta["ids"], meta["documents"], meta["metadatas"], matrix, np.asarray(norms))
+        self.metadata = meta.get("metadata") or {}
+        self.loaded_version = self.version()
+
+    def version(self) -> Optional[tuple]:
+        # Every save replaces meta.json, so its inode changes even within one mtime tick
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def is_stale(self) -> bool:
+        """Whether another worker has rewritten the collection since it was loaded"""
+        version = self.version()
+        return version is not None and version != self.loaded_version
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        """Hold the collection against other threads and processes, with the latest snapshot loaded.
+
+        Writes rebuild the whole collection from the snapshot, so one made
+        from a snapshot another writer has since replaced would undo its rows.
+        """
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, ".lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if self.is_stale():
+                    self.load()
+                yield
+
+    def count(self) -> int:
+        return len(self.snapshot[0])
+
+    def add(self, embeddings: List[List[float]], documents: List[str], metadatas: List[Dict], ids: List[str]):
+        """Append rows, replacing any with the same id"""
+        with self.writing():
+            old_ids, old_documents, old_metadatas, matrix, _ = self.snapshot
+            new = np.asarray(embeddings, dtype=np.float32)
+            replaced = set(ids)
+            keep = [i for i, doc_id in enumerate(old_ids) if doc_id not in replaced]
+            old = matrix.rows(keep) if old_ids else np.zeros((0, new.shape[1]), dtype=np.float32)
+            self.save(
+                [old_ids[i] for i in keep] + list(ids),
+                [old_documents[i] for i in keep] + list(documents),
+                [old_metadatas[i] for i in keep] + list(metadatas),
+                np.vstack([old, new])
+            )
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, include: Optional[List[str]] = None) -> Dict:
+        """Get rows by id and/or exact metadata match"""
+        snapshot = self.snapshot
+        rows = self.match(snapshot, ids, where)
+        result = {
+            "ids": [snapshot[0][i] for i in rows],
+            "documents": [snapshot[1][i] for i in rows],
+            "metadatas": [snapshot[2][i] for i in rows]
+        }
+        if include and "embeddings" in include:
+            result["embeddings"] = snapshot[3].rows(rows).tolist()
+        return result
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        """Remove rows by id and/or exact metadata match"""
+        with self.writing():
+            old_ids, old_documents, old_metadatas, matrix, _ = self.snapshot
+            drop = set(self.match(self.snapshot, ids, where))
+            if not drop:
+                return
+            keep = [i for i in range(len(old_ids)) if i not in drop]
+            self.save(
+                [old_ids[i] for i in keep],
+                [old_documents[i] for i in keep],
+                [old_metadatas[i] for i in keep],
+                matrix.rows(keep).reshape(len(keep), matrix.dimensions)
+            )
+
+    def rewrite(self):
+        """Store every row again at the collection's configured precision"""
+        with self.writing():
+            ids, documents, metadatas, matrix, _ = self.snapshot
+            self.save(ids, documents, metadatas, matrix.rows(list(range(len(ids)))).reshape(len(ids), matrix.dimensions))
+
+    def nbytes(self) -> Dict[str, int]:
+        """Bytes of vectors scanned per query and kept on disk, excluding documents"""
+        matrix, norms = self.snapshot[3], self.snapshot[4]
+        sizes = matrix.nbytes()
+        return {"scanned": sizes["scanned"] + norms.nbytes, "disk": sizes["disk"] + norms.nbytes}
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, where: Optional[Dict] = None) -> Dict:
+        """Top-k by squared L2 distance, in one pass over the matrix per query.
+
+        A ``where`` filter limits the pass to the matching rows. Quantised
+        matrices rank a few times ``n_results`` candidates from the codes,
+        then re-rank those with their float32 originals when kept.
+        """
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        snapshot = self.snapshot
+        ids, documents, metadatas, matrix, norms = snapshot
+        index = np.asarray(self.match(snapshot, None, where), dtype=np.int64) if where else None
+        if index is not None:
+            norms = norms[index]
+        for embedding in query_embeddings:
+            if not len(norms):
+                for key in result:
+                    result[key].append([])
+                continue
+            query = np.asarray(embedding, dtype=np.float32)
+            distances = norms - 2 * matrix.dots(query, index) + query @ query
+            k = min(n_results, len(distances))
+            if matrix.approximate and matrix.exact is not None:
+                candidates = min(k * self.rerank_factor, len(distances))
+                top = np.argpartition(distances, candidates - 1)[:candidates]
+                rows = top if index is None else index[top]
+                exact = norms[top] - 2 * (matrix.rows(rows) @ query) + query @ query
+                order = np.argsort(exact)[:k]
+                top = top[order]
+                distances[top] = exact[order]
+            else:
+                top = np.argpartition(distances, k - 1)[:k]
+                top = top[np.argsort(distances[top])]
+            rows = top if index is None else index[top]
+            result["ids"].append([ids[i] for i in rows])
+            result["documents"].append([documents[i] for i in rows])
+            result["metadatas"].append([metadatas[i] for i in rows])
+            result["distances"].append([float(distances[i]) for i in top])
+        return result
+
+    def match(self, snapshot, ids: Optional[List[str]], where: Optional[Dict]) -> List[int]:
+        """Row numbers matching an id list and exact metadata values"""
+        conditions = self.conditions(where)
+        if conditions:
+            # Look the first condition up instead of checking every row against it
+            key, value = conditions[0]
+            candidates = self.partition(snapshot, key).get(value, [])
+        else:
+            candidates = range(len(snapshot[0]))
+        wanted = set(ids) if ids is not None else None
+        return [
+            i for i in candidates
+            if (wanted is None or snapshot[0][i] in wanted)
+            and all(snapshot[2][i].get(key) == value for key, value in conditions[1:])
+        ]
+
+    @staticmethod
+    def conditions(where: Optional[Dict]) -> List[tuple]:
+        """Flatten a where filter, including Chroma's ``{"$and": [...]}`` form, to key/value pairs"""
+        if not where:
+            return []
+        if "$and" in where:
+            return [condition for clause in where["$and"] for condition in NumpyCollection.conditions(clause)]
+        return list(where.items())
+
+    def partition(self, snapshot, key: str) -> Dict:
+        """Row numbers for each value of a metadata key, built once per snapshot"""
+        built_for, partitions = self.partitions
+        if built_for is not snapshot:
+            partitions = {}
+            self.partitions = (snapshot, partitions)
+        rows = partitions.get(key)
+        if rows is None:
+            rows = {}
+            for i, metadata in enumerate(snapshot[2]):
+                rows.setdefault(metadata.get(key), []).append(i)
+            partitions[key] = rows
+        return rows
+
+    def save(self, ids: List[str], documents: List[str], metadatas: List[Dict], vectors: np.ndarray):
+        """Write new matrix files, then point the metadata at them; caller holds ``writing()``"""
+        os.makedirs(self.path, exist_ok=True)
+        previous = []
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                old_meta = json.load(f)
+            previous = [old_meta.get(key) for key in ("vectors", "codes", "scales", "norms")]
+
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        version = uuid.uuid4().hex
+        files = {}
+
+        def write(key: str, array: np.ndarray, extension: str):
+            files[key] = f"{key}-{version}.{extension}"
+            array.tofile(os.path.join(self.path, files[key]))
+
+        if self.precision == "float32" or self.keep_exact:
+            write("vectors", vectors, "f32")
+        if self.precision != "float32":
+            codes, scales = quantise(vectors, self.precision)
+            write("codes", codes, "f16" if self.precision == "float16" else "i8")
+            if scales is not None:
+                write("scales", scales, "f32")
+        # Norms of the originals keep distances exact to the query's side
+        write("norms", np.einsum("ij,ij->i", vectors, vectors).astype(np.float32), "f32")
+
+        meta = {
+            "ids": ids,
+            "documents": documents,
+            "metadatas": metadatas,
+            "dimensions": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            "precision": self.precision,
+            "metadata": self.metadata,
+            **files
+        }
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        # Readers see either the old matrix or the new one, never a partial write
+        os.replace(tmp_path, self.meta_path)
+
+        self.load()
+        for name in previous:
+            if name and name not in files.values():
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+class NumpyVectorClient:
+    """Chroma-client lookalike that keeps recently used tenants' matrices loaded"""
+
+    def __init__(self, path: str, max_loaded: int = 256, precision: str = "float32", keep_exact: bool = True, rerank_factor: int = 4):
+        self.path = path
+        self.max_loaded = max_loaded
+        self.precision = precision
+        self.keep_exact = keep_exact
+        self.rerank_factor = rerank_factor
+        self.collections: "OrderedDict[str, NumpyCollection]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        """Get an existing collection, loading it if needed; raises ValueError if missing"""
+        with self.lock:
+            collection = self.collections.get(name)
+            if collection is not None and not collection.is_stale():
+                self.collections.move_to_end(name)
+                return collection
+        path = os.path.join(self.path, name)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.remember(name, self.open(path))
+
+    def create_collection(self, name: str, metadata: Optional[Dict] = None) -> NumpyCollection:
+        """Create an empty collection"""
+        collection = self.open(os.path.join(self.path, name))
+        with collection.writing():
+            # Another worker may have created it first
+            if collection.version() is None:
+                collection.metadata = metadata or {}
+                collection.save([], [], [], np.zeros((0, 0), dtype=np.float32))
+        return self.remember(name, collection)
+
+    def delete_collection(self, name: str):
+        """Remove a collection and its files"""
+        with self.lock:
+            self.collections.pop(name, None)
+        shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def list_collections(self) -> List[str]:
+        """Names of every collection on disk"""
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if os.path.exists(os.path.join(self.path, name, "meta.json")))
+
+    def open(self, path: str) -> NumpyCollection:
+        return NumpyCollection(path, self.precision, self.keep_exact, self.rerank_factor)
+
+    def remember(self, name: str, collection: NumpyCollection) -> NumpyCollection:
+        """Keep a collection loaded, evicting the least recently used tenants"""
+        with self.lock:
+            self.collections[name] = collection
+            self.collections.move_to_end(name)
+            while len(self.collections) > self.max_loaded:
+                self.collections.popitem(last=False)
+        return collection
@@ -0,0 +1,81 @@
+from typing import TYPE_CHECKING, Dict, List, Mapping
+import asyncio
+
+from app.audio_cache import AudioCache, audio_cache
+from app.call_handler import BOOKING_CALLBACK, BOOKING_CONFIRMED, BOOKING_FAILED, DEADLINE_MISSED, STREAM_FAILED
+
+if TYPE_CHECKING:
+    from app.elevenlabs_service import ElevenLabsService
+
+NUMBER_UNAVAILABLE = "I'm sorry, this number is not currently available. Please try again later."
+
+def greeting(business_name: str) -> str:
+    """What every call to a client opens with"""
+    return f"Hello! Thank you for calling {business_name}. How can I help you today?"
+
+def client_phrases(client: Mapping) -> List[str]:
+    """Everything a client's calls can say word for word, whatever the caller asks"""
+    return [
+        greeting(client["business_name"]),
+        BOOKING_CONFIRMED,
+        BOOKING_FAILED,
+        BOOKING_CALLBACK,
+        STREAM_FAILED,
+        DEADLINE_MISSED,
+        NUMBER_UNAVAILABLE
+    ]
+
+class PhraseBank:
+    """Pre-renders each client's fixed phrases in its voice.
+
+    Rendering runs in the background when a client is created or its name or
+    voice changes, so by the time a call needs the greeting or a fallback its
+    TwiML points at audio already on disk. A client's phrases are pinned in
+    the audio cache until its next render replaces them.
+    """
+
+    def __init__(self, cache: AudioCache = None, elevenlabs_service: "ElevenLabsService" = None):
+        self.cache = cache or audio_cache
+        self._elevenlabs_service = elevenlabs_service
+        self.rendered = 0
+        self.failures = 0
+
+    @property
+    def elevenlabs_service(self) -> "ElevenLabsService":
+        if self._elevenlabs_service is None:
+            from app.container import container
+            self._elevenlabs_service = container.elevenlabs_service
+        return self._elevenlabs_service
+
+    async def render(self, client: Mapping) -> int:
+        """Synthesise a client's phrases that aren't on disk yet; returns how many were"""
+        voice_id = client.get("voice_id")
+        if not voice_id:
+            # Without a custom voice, calls use Twilio's own TTS
+            await asyncio.to_thread(self.cache.pin, client["client_id"], [])
+            return 0
+
+        keys = await asyncio.to_thread(self.register, client, voice_id)
+        rendered = 0
+        for key in keys:
+            entry = await asyncio.to_thread(self.cache.entry, key)
+            if self.cache.exists(key, entry["output_format"]):
+                continue
+            if await self.cache.fill(key, entry, self.elevenlabs_service.synthesise) is None:
+                print(f"Error rendering phrase for client {client['client_id']}: {entry['text']}")
+                self.failures += 1
+                continue
+            rendered += 1
+        self.rendered += rendered
+        return rendered
+
+    def register(self, client: Mapping, voice_id: str) -> List[str]:
+        keys = self.cache.register_many(client_phrases(client), voice_id)
+        # Pinned before synthesising, so eviction can't remove a phrase before a call uses it
+        self.cache.pin(client["client_id"], keys)
+        return keys
+
+    def stats(self) -> Dict:
+        return {"rendered": self.rendered, "failures": self.failures}
+
+phrase_bank = PhraseBank()
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from typing import Dict, List, Mapping, Tuple
+import json
+import threading
+
+from app.token_counter import count_tokens
+
+class PromptCompiler:
+    """Render the static part of each client's system prompt once.
+
+    The static prefix (business profile, FAQs, instructions) comes first and is
+    byte-identical across turns, so provider-side prompt caching can reuse it;
+    per-turn retrieved knowledge is appended after it.
+    """
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self.prefixes: "OrderedDict[str, Tuple[str, str, int]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def static_prefix(self, client_data: Mapping) -> Tuple[str, int]:
+        """Get the compiled static prompt and its token count for a client"""
+        client_id = client_data['client_id']
+        fingerprint = str(client_data.get('updated_at'))
+        with self.lock:
+            entry = self.prefixes.get(client_id)
+            if entry and entry[0] == fingerprint:
+                self.prefixes.move_to_end(client_id)
+                return entry[1], entry[2]
+
+        prefix = self.compile(client_data)
+        token_count = count_tokens(prefix)
+        with self.lock:
+            self.prefixes[client_id] = (fingerprint, prefix, token_count)
+            self.prefixes.move_to_end(client_id)
+            while len(self.prefixes) > self.max_size:
+                self.prefixes.popitem(last=False)
+        return prefix, token_count
+
+    def compile(self, client_data: Mapping) -> str:
+        """Render the parts of the system prompt that only change with the client"""
+        business_hours_str = ""
+        if client_data.get('business_hours'):
+            business_hours_str = json.dumps(client_data['business_hours'], indent=2)
+
+        return f"""You are an AI assistant representing {client_data['business_name']}.
+
+Business Information:
+- Business Name: {client_data['business_name']}
+- Industry: {client_data.get('industry') or 'N/A'}
+- Services: {client_data.get('services') or 'N/A'}
+- Business Hours: {business_hours_str}
+- Phone: {client_data['phone_number']}
+
+FAQs:
+{client_data.get('faqs') or 'No FAQs available'}
+
+Instructions:
+1. You are a professional, friendly receptionist for this business
+2. Answer questions using the knowledge base and business information provided
+3. If someone wants to book an appointment, collect: name, phone, preferred date/time, service type
+4. Always stay in character as a representative of this business
+5. Be helpful, professional, and concise
+6. If you don't know something, say you'll have someone get back to them
+7. For appointment booking, confirm details before proceeding
+
+When booking appointments, respond with: "BOOK_APPOINTMENT: {{appointment_details_json}}"
+"""
+
+    def render(self, client_data: Mapping, relevant_knowledge: List[Dict]) -> str:
+        """Build the full system prompt for a turn"""
+        prefix, _ = self.static_prefix(client_data)
+        if not relevant_knowledge:
+            return prefix
+
+        knowledge_context = "\n".join([doc['content'] for doc in relevant_knowledge])
+        return f"""{prefix}
+Relevant Knowledge Base:
+{knowledge_context}
+"""
+
+    def invalidate(self, client_id: str):
+        """Drop a client's compiled prompt after its profile changes"""
+        with self.lock:
+            self.prefixes.pop(client_id, None)
+
+prompt_compiler = PromptCompiler()
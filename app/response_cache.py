@@ -0,0 +1,124 @@
+from typing import Dict, List, Mapping, Optional
+import threading
+import time
+
+import numpy as np
+
+from app.config import settings
+
+class ClientAnswers:
+    """Cached single-turn answers for one client, with a matrix of question vectors"""
+
+    def __init__(self):
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        self.latencies: List[float] = []
+        self.created: List[float] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.fingerprint: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+class SemanticResponseCache:
+    """Per-client cache that answers repeat questions without calling the LLM.
+
+    Only answers to the first question of a call are stored, so a cached answer
+    never depends on earlier conversation. Entries are tied to the client's
+    profile version and dropped when the client's knowledge changes.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 500, ttl_seconds: float = 86400):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clients: Dict[str, ClientAnswers] = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, client_data: Mapping, embedding: List[float]) -> Optional[str]:
+        """Return a stored answer whose question is similar enough, if any"""
+        with self.lock:
+            entry = self._entry(client_data)
+            answer = None
+            vector = self._unit(embedding)
+            if len(entry.answers) and entry.vectors.shape[1] == len(vector):
+                similarities = entry.vectors @ vector
+                best = int(np.argmax(similarities))
+                fresh = time.time() - entry.created[best] <= self.ttl_seconds
+                if similarities[best] >= self.threshold and fresh:
+                    answer = entry.answers[best]
+                    entry.latency_saved += entry.latencies[best]
+
+            if answer is None:
+                entry.misses += 1
+            else:
+                entry.hits += 1
+            return answer
+
+    def store(self, client_data: Mapping, question: str, embedding: List[float], answer: str, latency: float):
+        """Remember the answer to a first-turn question"""
+        with self.lock:
+            entry = self._entry(client_data)
+            vector = self._unit(embedding)
+            if entry.vectors.shape[1] != len(vector):
+                entry.vectors = np.zeros((0, len(vector)), dtype=np.float32)
+
+            entry.questions.append(question)
+            entry.answers.append(answer)
+            entry.latencies.append(latency)
+            entry.created.append(time.time())
+            entry.vectors = np.vstack([entry.vectors, vector])
+
+            # Drop the oldest answers once the client is over its budget
+            excess = len(entry.answers) - self.max_entries
+            if excess > 0:
+                del entry.questions[:excess], entry.answers[:excess]
+                del entry.latencies[:excess], entry.created[:excess]
+                entry.vectors = entry.vectors[excess:]
+
+    def invalidate(self, client_id: str):
+        """Forget a client's answers after its knowledge or profile changes"""
+        with self.lock:
+            entry = self.clients.get(client_id)
+            if entry:
+                self._reset(entry)
+
+    def stats(self) -> Dict:
+        """Get hit rate and latency saved per client"""
+        with self.lock:
+            return {
+                client_id: {
+                    "entries": len(entry.answers),
+                    "hits": entry.hits,
+                    "misses": entry.misses,
+                    "hit_rate": (entry.hits / (entry.hits + entry.misses) * 100) if entry.hits + entry.misses > 0 else 0,
+                    "latency_saved_seconds": round(entry.latency_saved, 3)
+                }
+                for client_id, entry in self.clients.items()
+            }
+
+    def _entry(self, client_data: Mapping) -> ClientAnswers:
+        """Get a client's answers, clearing them if the profile changed; caller holds the lock"""
+        entry = self.clients.setdefault(client_data['client_id'], ClientAnswers())
+        fingerprint = str(client_data.get('updated_at'))
+        if entry.fingerprint != fingerprint:
+            self._reset(entry)
+            entry.fingerprint = fingerprint
+        return entry
+
+    @staticmethod
+    def _reset(entry: ClientAnswers):
+        entry.questions, entry.answers, entry.latencies, entry.created = [], [], [], []
+        entry.vectors = np.zeros((0, 0), dtype=np.float32)
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+response_cache = SemanticResponseCache(
+    settings.semantic_cache_threshold,
+    settings.semantic_cache_size,
+    settings.semantic_cache_ttl_seconds
+)
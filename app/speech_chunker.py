@@ -0,0 +1,83 @@
+import re
+from typing import List, Optional, Tuple
+
+BOOKING_MARKER = "BOOK_APPOINTMENT:"
+
+# A sentence ends at terminal punctuation (optionally followed by a closing
+# quote or bracket) and whitespace.
+SENTENCE_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+class SpeechChunker:
+    """Cut a stream of LLM tokens into speakable sentence chunks.
+
+    Text after the booking marker is never emitted as speech; it is collected
+    into ``booking_payload`` so the caller can parse it once the stream ends.
+    """
+
+    def __init__(self, min_chars: int = 12, max_chars: int = 250):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+        self.booking_payload: Optional[str] = None
+
+    def feed(self, token: str) -> List[str]:
+        """Add a token and return any chunks that are ready to be spoken"""
+        if self.booking_payload is not None:
+            self.booking_payload += token
+            return []
+
+        self.buffer += token
+
+        # Everything after the marker is appointment JSON, never speech
+        if BOOKING_MARKER in self.buffer:
+            speakable, self.booking_payload = self.buffer.split(BOOKING_MARKER, 1)
+            self.buffer = ""
+            chunks, _ = self._split(speakable, final=True)
+            return chunks
+
+        # Hold back a trailing partial marker ("BOOK_APP") until it resolves
+        held = self._partial_marker_length(self.buffer)
+        chunks, consumed = self._split(self.buffer[:len(self.buffer) - held], final=False)
+        self.buffer = self.buffer[consumed:]
+        return chunks
+
+    def flush(self) -> List[str]:
+        """Return whatever speakable text is left once the stream has ended"""
+        if self.booking_payload is not None:
+            return []
+        text, self.buffer = self.buffer, ""
+        chunks, _ = self._split(text, final=True)
+        return chunks
+
+    def _split(self, text: str, final: bool) -> Tuple[List[str], int]:
+        """Split text at sentence boundaries and report how much was consumed"""
+        chunks = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(text):
+            # Merge very short pieces ("Dr.", "Hi.") into the next sentence
+            if len(text[start:match.end()].strip()) < self.min_chars:
+                continue
+            chunks.append(text[start:match.end()].strip())
+            start = match.end()
+
+        tail = text[start:]
+        if final:
+            if tail.strip():
+                chunks.append(tail.strip())
+            start = len(text)
+        elif len(tail) > self.max_chars:
+            # No sentence end in sight: break at the last comma or space
+            cut = max(tail.rfind(", ", 0, self.max_chars), tail.rfind(" ", 0, self.max_chars))
+            if cut > 0:
+                chunks.append(tail[:cut + 1].strip())
+                start += cut + 1
+
+        return [c for c in chunks if c], start
+
+    @staticmethod
+    def _partial_marker_length(text: str) -> int:
+        """Length of the longest suffix of text that starts the booking marker"""
+        for size in range(min(len(BOOKING_MARKER) - 1, len(text)), 0, -1):
+            if BOOKING_MARKER.startswith(text[-size:]):
+                return size
+        return 0
@@ -0,0 +1,235 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import AsyncIterator, Optional
+from urllib.parse import urlencode
+import asyncio
+import io
+import json
+import wave
+
+import numpy as np
+
+from app.config import settings
+
+SAMPLE_RATE = 8000  # Media Streams carry 8 kHz μ-law, one byte per sample
+PREROLL_MS = 300
+
+def _mulaw_table() -> np.ndarray:
+    codes = ~np.arange(256, dtype=np.uint8)
+    exponent = (codes >> 4) & 0x07
+    magnitude = (((codes & 0x0F).astype(np.int32) << 3) + 0x84 << exponent) - 0x84
+    return np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+
+MULAW = _mulaw_table()
+
+def decode_mulaw(audio: bytes) -> np.ndarray:
+    """16-bit samples of 8 kHz μ-law audio"""
+    return MULAW[np.frombuffer(audio, dtype=np.uint8)]
+
+def encode_mulaw(samples: np.ndarray) -> bytes:
+    """μ-law bytes of 16-bit samples"""
+    samples = samples.astype(np.int32)
+    magnitude = np.minimum(np.abs(samples), 32635) + 0x84
+    exponent = np.floor(np.log2(magnitude)).astype(np.int32) - 7
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    codes = ((samples < 0) << 7) | (exponent << 4) | mantissa
+    return (~codes & 0xFF).astype(np.uint8).tobytes()
+
+class VoiceActivityDetector:
+    """Tracks whether the caller is speaking from the loudness of their audio.
+
+    ``feed`` returns "start" once a frame completes ``start_ms`` of unbroken
+    speech, and "end" once one completes ``end_ms`` of silence after it.
+    """
+
+    def __init__(self, threshold: int, start_ms: int, end_ms: int):
+        self.threshold = threshold
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.speaking = False
+        self.voiced_ms = 0.0
+        self.silent_ms = 0.0
+
+    def feed(self, audio: bytes) -> Optional[str]:
+        if not audio:
+            return None
+        samples = decode_mulaw(audio).astype(np.float32)
+        duration_ms = len(audio) * 1000 / SAMPLE_RATE
+        if np.sqrt(np.mean(samples * samples)) >= self.threshold:
+            self.voiced_ms += duration_ms
+            self.silent_ms = 0.0
+        else:
+            self.silent_ms += duration_ms
+            self.voiced_ms = 0.0
+
+        if not self.speaking and self.voiced_ms >= self.start_ms:
+            self.speaking = True
+            return "start"
+        if self.speaking and self.silent_ms >= self.end_ms:
+            self.speaking = False
+            return "end"
+        return None
+
+class SpeechRecognizer(ABC):
+    """Turns a call's inbound audio into the caller's finished utterances"""
+
+    def __init__(self):
+        self.results: asyncio.Queue = asyncio.Queue()
+
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def send(self, audio: bytes):
+        """Pass on a frame of the caller's μ-law audio"""
+
+    async def close(self):
+        # Ends utterances()
+        self.results.put_nowait(None)
+
+    async def utterances(self) -> AsyncIterator[str]:
+        while True:
+            text = await self.results.get()
+            if text is None:
+                return
+            yield text
+
+class WhisperRecognizer(SpeechRecognizer):
+    """Cuts utterances where the caller pauses and transcribes each with OpenAI.
+
+    Transcription starts the moment the pause is long enough, rather than
+    after Gather's fixed timeout, and utterances are delivered in the order
+    they were spoken.
+    """
+
+    def __init__(self, api_key: str, model: str = "whisper-1"):
+        super().__init__()
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI(api_key=api_key)
+        self.model = model
+        self.vad = VoiceActivityDetector(settings.vad_threshold, settings.vad_start_ms, settings.vad_end_ms)
+        # Speech before the detector is sure it started is kept, so first syllables aren't lost
+        self.preroll: deque = deque()
+        self.preroll_bytes = 0
+        self.audio = bytearray()
+        self.previous: Optional[asyncio.Task] = None
+
+    async def send(self, audio: bytes):
+        event = self.vad.feed(audio)
+        if event == "start":
+            self.audio = bytearray(b"".join(self.preroll))
+            self.preroll.clear()
+            self.preroll_bytes = 0
+        if self.vad.speaking or event == "end":
+            self.audio += audio
+        else:
+            self.preroll.append(audio)
+            self.preroll_bytes += len(audio)
+            while self.preroll_bytes > PREROLL_MS * SAMPLE_RATE // 1000:
+                self.preroll_bytes -= len(self.preroll.popleft())
+        if event == "end":
+            self.previous = asyncio.create_task(self.deliver(bytes(self.audio), self.previous))
+            self.audio = bytearray()
+
+    async def deliver(self, audio: bytes, previous: Optional[asyncio.Task]):
+        text = await self.transcribe(audio)
+        if previous is not None:
+            await previous
+        if text:
+            self.results.put_nowait(text)
+
+    async def transcribe(self, audio: bytes) -> str:
+        wav = io.BytesIO()
+        with wave.open(wav, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes(decode_mulaw(audio).tobytes())
+        try:
+            transcription = await self.client.audio.transcriptions.create(
+                model=self.model,
+                file=("utterance.wav", wav.getvalue()),
+                language="en"
+            )
+            return transcription.text.strip()
+        except Exception as e:
+            print(f"Error transcribing speech: {e}")
+            return ""
+
+    async def close(self):
+        if self.previous is not None:
+            self.previous.cancel()
+        await super().close()
+
+class DeepgramRecognizer(SpeechRecognizer):
+    """Streams the call's audio to Deepgram, which transcribes it as it arrives"""
+
+    URL = "wss://api.deepgram.com/v1/listen"
+
+    def __init__(self, api_key: str):
+        super().__init__()
+        self.api_key = api_key
+        self.connection = None
+        self.reader: Optional[asyncio.Task] = None
+        self.words = []
+
+    async def start(self):
+        import websockets
+        query = urlencode({
+            "encoding": "mulaw",
+            "sample_rate": SAMPLE_RATE,
+            "channels": 1,
+            "model": "nova-2-phonecall",
+            "interim_results": "true",
+            "endpointing": settings.vad_end_ms,
+            "utterance_end_ms": max(settings.vad_end_ms, 1000),
+            "smart_format": "true"
+        })
+        self.connection = await websockets.connect(
+            f"{self.URL}?{query}", additional_headers={"Authorization": f"Token {self.api_key}"}
+        )
+        self.reader = asyncio.create_task(self.read())
+
+    async def send(self, audio: bytes):
+        try:
+            await self.connection.send(audio)
+        except Exception as e:
+            print(f"Error sending audio to Deepgram: {e}")
+
+    async def read(self):
+        try:
+            async for message in self.connection:
+                data = json.loads(message)
+                if data.get("type") == "Results":
+                    transcript = data["channel"]["alternatives"][0]["transcript"]
+                    if data.get("is_final") and transcript:
+                        self.words.append(transcript)
+                    if data.get("speech_final"):
+                        self.finish()
+                elif data.get("type") == "UtteranceEnd":
+                    # Sent when endpointing missed the end of speech in a noisy line
+                    self.finish()
+        except Exception as e:
+            print(f"Error reading from Deepgram: {e}")
+
+    def finish(self):
+        if self.words:
+            self.results.put_nowait(" ".join(self.words))
+            self.words = []
+
+    async def close(self):
+        if self.connection is not None:
+            try:
+                await self.connection.send(json.dumps({"type": "CloseStream"}))
+                await self.connection.close()
+            except Exception:
+                pass
+        if self.reader is not None:
+            self.reader.cancel()
+        await super().close()
+
+def create_speech_recognizer() -> SpeechRecognizer:
+    """Build a recognizer for one call, of the kind selected by settings"""
+    if settings.speech_recognizer == "deepgram":
+        return DeepgramRecognizer(settings.deepgram_api_key)
+    return WhisperRecognizer(settings.openai_api_key, settings.whisper_model)
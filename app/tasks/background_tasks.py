@@ -1,10 +1,10 @@
 from celery import Celery
 import httpx
 from app.database import SessionLocal
-from app.database import CallLog
+from app.database import CallLog, CallTurn
 import asyncio
 
-from app.tasks import celery_app
+from app.tasks.celery_app import celery_app
 
 @celery_app.task
 def process_call_analytics(call_sid: str):
@@ -12,10 +12,13 @@ def process_call_analytics(call_sid: str):
     db = SessionLocal()
     try:
         call = db.query(CallLog).filter(CallLog.call_sid == call_sid).first()
-        if call and call.conversation:
+        conversation_length = db.query(CallTurn).filter(CallTurn.call_sid == call_sid).count()
+        if call and not conversation_length and call.conversation:
+            # Calls recorded before call_turns existed
+            conversation_length = len(call.conversation)
+        if call and conversation_length:
             # Process conversation for insights
             # Calculate call duration, sentiment, etc.
-            conversation_length = len(call.conversation)
             
             # Update call log with analytics
             call.call_duration = conversation_length * 30  # Rough estimate
@@ -6,7 +6,7 @@ celery_app = Celery(
     "ai_call_assistant",
     broker=settings.redis_url,
     backend=settings.redis_url,
-    include=["app.tasks.background_tasks"]
+    include=["app.tasks.background_tasks", "app.tasks.ingestion_tasks"]
 )
 
 
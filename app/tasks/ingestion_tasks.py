@@ -0,0 +1,14 @@
+from app.ingestion_service import IngestionService
+from app.tasks.celery_app import celery_app
+
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
+def ingest_knowledge(job_id: str):
+    """Background task to parse and embed an uploaded knowledge file"""
+    # Acked only once the job finishes, so a worker that dies mid-file hands it on
+    IngestionService().run(job_id)
+
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
+def reindex_knowledge(client_id: str):
+    """Background task to re-embed a client's knowledge after the embedding model changes"""
+    from app.container import container
+    container.vector_store.reindex_client(client_id)
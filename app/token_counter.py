@@ -0,0 +1,39 @@
+from typing import List, Optional
+
+from app.config import settings
+
+# Per-message overhead of the chat format (role and separators)
+MESSAGE_OVERHEAD = 4
+
+_encoding = None
+_encoding_loaded = False
+
+def get_encoding():
+    """Load the chat model's tokenizer once; None if tiktoken or its BPE file is unavailable"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            try:
+                _encoding = tiktoken.encoding_for_model(settings.llm_model)
+            except KeyError:
+                # Models newer than this tiktoken use the GPT-4o tokenizer
+                _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print(f"Token counting falls back to an estimate: {e}")
+    return _encoding
+
+def count_tokens(text: Optional[str]) -> int:
+    """Count the tokens in a piece of text"""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+def count_message_tokens(messages: List) -> int:
+    """Count the prompt tokens of a list of chat messages"""
+    return sum(count_tokens(message.content) + MESSAGE_OVERHEAD for message in messages)
@@ -1,39 +1,69 @@
 from twilio.rest import Client
-from twilio.twiml.voice_response import VoiceResponse
+from twilio.twiml.voice_response import Connect, VoiceResponse
 import httpx
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
+from app.audio_cache import audio_cache
 from app.config import settings
 
 class TwilioService:
     def __init__(self):
         self.client = Client(settings.twilio_account_sid, settings.twilio_auth_token)
     
-    def create_twiml_response(self, text: str, voice_id: str = None) -> str:
+    async def create_twiml_response(self, text: str, voice_id: str = None) -> str:
         """Create TwiML response with text-to-speech"""
         response = VoiceResponse()
+        await self.add_speech(response, [text], voice_id)
+        self.add_gather(response)
+        return str(response)
+    
+    async def create_streaming_twiml(self, chunks: List[str], voice_id: str = None, finished: bool = True) -> str:
+        """Create TwiML that speaks the chunks ready so far.
+        
+        While the reply is still being generated, Twilio is redirected to
+        fetch the next chunks once these have been played.
+        """
+        response = VoiceResponse()
+        await self.add_speech(response, chunks, voice_id)
         
+        if finished:
+            self.add_gather(response)
+        else:
+            response.redirect('/call/continue-speech', method='POST')
+        
+        return str(response)
+    
+    def create_media_stream_twiml(self, stream_url: str, to_number: str) -> str:
+        """Create TwiML that connects the call's audio to a media stream WebSocket"""
+        response = VoiceResponse()
+        connect = Connect()
+        stream = connect.stream(url=stream_url)
+        # Tells the stream which client the call is for
+        stream.parameter(name="To", value=to_number)
+        response.append(connect)
+        return str(response)
+    
+    async def add_speech(self, response: VoiceResponse, texts: List[str], voice_id: str = None):
+        """Append text-to-speech for each of the texts to a TwiML response"""
         if voice_id:
-            # Use ElevenLabs for custom voice
-            audio_url = self.generate_audio_url(text, voice_id)
-            response.play(audio_url)
+            # Use ElevenLabs for custom voice; the texts are registered in one manifest write, off the event loop
+            for key in await audio_cache.aregister(texts, voice_id):
+                response.play(self.audio_url(key, voice_id))
         else:
             # Use Twilio's default TTS
-            response.say(text, voice='alice', language='en-US')
-        
-        # Add gather for user input
-        gather = response.gather(
+            for text in texts:
+                response.say(text, voice='alice', language='en-US')
+    
+    def add_gather(self, response: VoiceResponse):
+        """Append a gather for the caller's next utterance"""
+        response.gather(
             input='speech',
             action='/call/process-speech',
             method='POST',
             speech_timeout=3,
             timeout=10
         )
-        
-        return str(response)
     
-    def generate_audio_url(self, text: str, voice_id: str) -> str:
-        """Generate audio using ElevenLabs and return URL"""
-        # This would integrate with your audio generation service
-        # For now, return a placeholder
-        return f"/audio/{voice_id}/{hash(text)}"
\ No newline at end of file
+    def audio_url(self, key: str, voice_id: str) -> str:
+        """Get the URL of the cached ElevenLabs audio for a registered key, synthesised when first fetched"""
+        return f"/audio/{voice_id}/{key}"
\ No newline at end of file
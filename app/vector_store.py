@@ -1,68 +1,497 @@
+import asyncio
 import chromadb
-from langchain_community.embeddings import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from  langchain_community.vectorstores import Chroma
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import hashlib
+import random
+import threading
+import time
+
+import numpy as np
 
 from app.config import settings
+from app.embedding_cache import embedding_cache, normalize_text, parse_faq_questions
+from app.embedding_providers import collection_model, create_embeddings
+from app.lexical_index import BM25Index, LexicalIndexStore
+
+SPLIT_WINDOW_CHARS = 16000
+
+def create_vector_client():
+    """Build the vector backend selected by settings"""
+    if settings.vector_backend == "numpy":
+        from app.numpy_index import NumpyVectorClient
+        return NumpyVectorClient(
+            settings.vector_index_path,
+            settings.vector_index_max_loaded,
+            settings.vector_precision,
+            settings.vector_keep_exact,
+            settings.vector_rerank_factor
+        )
+    return chromadb.PersistentClient(path="./chroma_db")
+
+class TenantCollection:
+    """One client's chunks in a shared collection, behind the collection API.
+    
+    Reads, queries and deletes are filtered on the chunks' ``client_id``
+    metadata, so clients sharing a collection never see each other's chunks.
+    """
+    
+    def __init__(self, collection, client_id: str):
+        self.collection = collection
+        self.client_id = client_id
+    
+    @property
+    def metadata(self) -> Dict:
+        return self.collection.metadata
+    
+    def scope(self, where: Optional[Dict] = None) -> Dict:
+        """Add the client to a where filter"""
+        if not where:
+            return {"client_id": self.client_id}
+        # Chroma takes one condition per dict, so several need an explicit $and
+        return {"$and": [{"client_id": self.client_id}] + [{key: value} for key, value in where.items()]}
+    
+    def add(self, embeddings: List[List[float]], documents: List[str], metadatas: List[Dict], ids: List[str]):
+        self.collection.add(
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=[{**metadata, "client_id": self.client_id} for metadata in metadatas],
+            ids=ids
+        )
+    
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, include: Optional[List[str]] = None) -> Dict:
+        if include is None:
+            return self.collection.get(ids=ids, where=self.scope(where))
+        return self.collection.get(ids=ids, where=self.scope(where), include=include)
+    
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        self.collection.delete(ids=ids, where=self.scope(where))
+    
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10) -> Dict:
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, where=self.scope())
+    
+    def count(self) -> int:
+        return len(self.get(include=[])["ids"])
 
 class VectorStore:
     def __init__(self):
-        self.client = chromadb.PersistentClient(path="./chroma_db")
-        self.embeddings = OpenAIEmbeddings(api_key=settings.openai_api_key)
+        self.client = create_vector_client()
+        self.lexical_index = LexicalIndexStore(settings.lexical_index_path, settings.vector_index_max_loaded)
+        self.embeddings = create_embeddings()
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len
         )
+        self.reindexing = set()
+        self.reindex_lock = threading.Lock()
     
     def create_collection_for_client(self, client_id: str):
-        """Create a collection for a specific client"""
-        collection_name = f"client_{client_id}"
+        """Create a collection for a specific client, or its place in a shared one"""
+        name, collection = self.find_collection(client_id)
+        if collection is None:
+            collection = self.get_or_create_collection(name, self.embeddings.model)
+        if collection_model(collection) != self.embeddings.model:
+            # New chunks can't be added next to vectors from another model
+            return self.reindex_client(client_id)
+        return self.tenant_collection(name, collection, client_id)
+    
+    def collection_name(self, client_id: str) -> str:
+        return f"client_{client_id}"
+    
+    def shared_collection_name(self, client_id: str) -> str:
+        """The shared collection a client belongs in until it is promoted"""
+        bucket = int(hashlib.sha256(client_id.encode()).hexdigest()[:8], 16) % settings.vector_shared_collections
+        return f"shared_{bucket}"
+    
+    def find_collection(self, client_id: str) -> Tuple[str, object]:
+        """Name the collection holding a client's chunks, with the collection if it exists yet.
+        
+        In the shared layout a client only has a collection of its own once it
+        has been promoted; until then its chunks live in a shared one.
+        """
+        names = [self.collection_name(client_id)]
+        if settings.vector_layout == "shared":
+            names.append(self.shared_collection_name(client_id))
+        for name in names:
+            try:
+                return name, self.client.get_collection(name)
+            except:
+                pass
+        return names[-1], None
+    
+    def tenant_collection(self, name: str, collection, client_id: str):
+        """A client's own collection as it is, or its slice of a shared one"""
+        if name == self.collection_name(client_id):
+            return collection
+        return TenantCollection(collection, client_id)
+    
+    def get_or_create_collection(self, name: str, model: str):
         try:
-            collection = self.client.get_collection(collection_name)
+            return self.client.get_collection(name)
         except:
-            collection = self.client.create_collection(collection_name)
+            pass
+        try:
+            return self.client.create_collection(name, metadata={"embedding_model": model})
+        except:
+            # Another worker created it in the meantime
+            return self.client.get_collection(name)
+    
+    def promote_if_large(self, client_id: str, collection):
+        """Move a client out of its shared collection once it has more chunks than sharing suits"""
+        if isinstance(collection, TenantCollection) and collection.count() > settings.vector_dedicated_chunks:
+            moved = self.move_client(client_id, dedicated=True)
+            print(f"Promoted client {client_id} to a dedicated collection ({moved} chunks)")
+    
+    def move_client(self, client_id: str, dedicated: bool) -> int:
+        """Move a client's chunks into a collection of its own, or into its shared one; returns how many"""
+        names = [self.shared_collection_name(client_id), self.collection_name(client_id)]
+        source_name, target_name = names if dedicated else names[::-1]
+        source = self.tenant_collection(source_name, self.client.get_collection(source_name), client_id)
+        target = self.get_or_create_collection(target_name, collection_model(source))
+        if collection_model(target) != collection_model(source):
+            raise ValueError(f"{target_name} holds {collection_model(target)} vectors, not {collection_model(source)}")
+        target = self.tenant_collection(target_name, target, client_id)
+        
+        rows = source.get(include=["documents", "metadatas", "embeddings"])
+        if rows["ids"]:
+            target.add(embeddings=rows["embeddings"], documents=rows["documents"], metadatas=rows["metadatas"], ids=rows["ids"])
+        # Copied before removing, so searches find the chunks in one place or the other throughout
+        if dedicated:
+            if rows["ids"]:
+                source.delete(ids=rows["ids"])
+        else:
+            self.client.delete_collection(source_name)
+        return len(rows["ids"])
+    
+    def reindex_client(self, client_id: str):
+        """Re-embed the collection holding a client's chunks with the current model"""
+        name, collection = self.find_collection(client_id)
+        return self.tenant_collection(name, self.reindex_collection(name, collection), client_id)
+    
+    def reindex_collection(self, name: str, old=None):
+        """Re-embed a collection's chunks with the current model, replacing the collection"""
+        old = old if old is not None else self.client.get_collection(name)
+        if collection_model(old) == self.embeddings.model:
+            return old
+        
+        rows = old.get(include=["documents", "metadatas"])
+        embeddings = []
+        for batch in self.batch_chunks(rows["documents"]):
+            embeddings.extend(self.embed_documents(batch))
+        
+        # Everything is embedded before the old collection goes, so the swap is quick
+        self.client.delete_collection(name)
+        collection = self.client.create_collection(name, metadata={"embedding_model": self.embeddings.model})
+        if rows["ids"]:
+            collection.add(embeddings=embeddings, documents=rows["documents"], metadatas=rows["metadatas"], ids=rows["ids"])
+        print(f"Re-indexed {len(rows['ids'])} chunks in {name} with {self.embeddings.model}")
         return collection
     
-    def add_knowledge(self, client_id: str, content: str, source: str = None) -> List[str]:
-        """Add knowledge to client's vector store"""
+    def schedule_reindex(self, client_id: str):
+        """Re-index a client in the background, once per process"""
+        with self.reindex_lock:
+            if client_id in self.reindexing:
+                return
+            self.reindexing.add(client_id)
+        try:
+            from app.tasks.ingestion_tasks import reindex_knowledge
+            reindex_knowledge.delay(client_id)
+        except Exception as e:
+            print(f"Error queueing re-index for client {client_id}, running it here: {e}")
+            threading.Thread(target=self.run_reindex, args=(client_id,), daemon=True).start()
+    
+    def run_reindex(self, client_id: str):
+        try:
+            self.reindex_client(client_id)
+        except Exception as e:
+            print(f"Error re-indexing client {client_id}: {e}")
+        finally:
+            # Let the next search try again if this attempt failed
+            with self.reindex_lock:
+                self.reindexing.discard(client_id)
+    
+    def add_knowledge(self, client_id: str, content: str, source: str = None) -> Dict:
+        """Add knowledge to client's vector store, embedding only chunks it doesn't have yet"""
         collection = self.create_collection_for_client(client_id)
+        source = source or "unknown"
+        document_ids, new_chunks, stale_ids = self.plan_source(collection, client_id, content, source)
+        
+        # Embed in batches, then write the new chunks at once
+        embeddings = []
+        for batch in self.batch_chunks(list(new_chunks.values())):
+            embeddings.extend(self.embed_documents(batch))
+        self.apply_source(collection, client_id, source, new_chunks, embeddings, stale_ids)
+        self.promote_if_large(client_id, collection)
+        return self.source_report(document_ids, new_chunks, stale_ids)
+    
+    async def aadd_knowledge(self, client_id: str, content: str, source: str = None) -> Dict:
+        """Add knowledge to client's vector store, embedding new chunks in concurrent batches"""
+        collection = await asyncio.to_thread(self.create_collection_for_client, client_id)
+        source = source or "unknown"
+        document_ids, new_chunks, stale_ids = await asyncio.to_thread(
+            self.plan_source, collection, client_id, content, source
+        )
         
-        # Split text into chunks
-        chunks = self.text_splitter.split_text(content)
-        
-        # Generate embeddings and add to collection
-        document_ids = []
-        for i, chunk in enumerate(chunks):
-            doc_id = f"{client_id}_{source or 'unknown'}_{i}_{hashlib.md5(chunk.encode()).hexdigest()[:8]}"
-            
-            # Get embedding
-            embedding = self.embeddings.embed_query(chunk)
-            
-            # Add to collection
+        semaphore = asyncio.Semaphore(settings.embedding_concurrency)
+        
+        async def embed(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.aembed_documents(batch)
+        
+        # gather keeps the batches in order
+        results = await asyncio.gather(*(embed(batch) for batch in self.batch_chunks(list(new_chunks.values()))))
+        embeddings = [embedding for result in results for embedding in result]
+        await asyncio.to_thread(self.apply_source, collection, client_id, source, new_chunks, embeddings, stale_ids)
+        await asyncio.to_thread(self.promote_if_large, client_id, collection)
+        return self.source_report(document_ids, new_chunks, stale_ids)
+    
+    def delete_source(self, client_id: str, source: str) -> int:
+        """Remove every chunk of a source from a client's collection; returns how many"""
+        collection = self.get_collection(client_id)
+        if collection is None:
+            return 0
+        ids = collection.get(where={"source": source}, include=[])["ids"]
+        if ids:
+            collection.delete(ids=ids)
+            self.lexical_index.update(client_id, {}, ids)
+        return len(ids)
+    
+    def chunk_id(self, client_id: str, source: str, chunk: str) -> str:
+        """Content-addressed chunk id, so an unchanged chunk keeps its id across uploads"""
+        return f"{client_id}_{source}_{hashlib.sha256(chunk.encode()).hexdigest()[:16]}"
+    
+    def split_pages(self, pages: Iterable[str]) -> Iterator[str]:
+        """Chunk a document page by page instead of splitting it all at once"""
+        buffer = ""
+        for page in pages:
+            buffer = f"{buffer}\n{page}" if buffer else page
+            if len(buffer) < SPLIT_WINDOW_CHARS:
+                continue
+            chunks = self.text_splitter.split_text(buffer)
+            # The last chunk may carry on into the next page, so split it again with it
+            yield from chunks[:-1]
+            buffer = chunks[-1] if chunks else ""
+        if buffer:
+            yield from self.text_splitter.split_text(buffer)
+    
+    def plan_source(self, collection, client_id: str, content: Union[str, Iterable[str]], source: str) -> Tuple[List[str], Dict[str, str], List[str]]:
+        """Compare a source's new content (text, or its pages) with what is stored.
+        
+        Returns the ids of every chunk in the new content, the chunks that
+        need embedding (by id), and the ids of stored chunks that are gone.
+        """
+        pages = [content] if isinstance(content, str) else content
+        chunks: Dict[str, str] = {}
+        for chunk in self.split_pages(pages):
+            # A repeated chunk adds nothing to retrieval; keep one copy
+            chunks.setdefault(self.chunk_id(client_id, source, chunk), chunk)
+        
+        existing = set(collection.get(where={"source": source}, include=[])["ids"])
+        new_chunks = {doc_id: chunk for doc_id, chunk in chunks.items() if doc_id not in existing}
+        stale_ids = [doc_id for doc_id in existing if doc_id not in chunks]
+        return list(chunks), new_chunks, stale_ids
+    
+    def apply_source(self, collection, client_id: str, source: str, new_chunks: Dict[str, str], embeddings: List[List[float]], stale_ids: List[str]):
+        """Write a source's new chunks with a single bulk add, then drop its stale ones"""
+        if new_chunks:
             collection.add(
-                embeddings=[embedding],
-                documents=[chunk],
-                metadatas=[{"client_id": client_id, "source": source or "unknown"}],
-                ids=[doc_id]
+                embeddings=embeddings,
+                documents=list(new_chunks.values()),
+                metadatas=[{"client_id": client_id, "source": source} for _ in new_chunks],
+                ids=list(new_chunks)
             )
-            document_ids.append(doc_id)
+        # Deleting after adding means searches never see the source half-missing
+        if stale_ids:
+            collection.delete(ids=stale_ids)
         
-        return document_ids
+        if self.lexical_index.update(client_id, new_chunks, stale_ids) is None:
+            self.build_lexical_index(client_id, collection)
+    
+    @staticmethod
+    def source_report(document_ids: List[str], new_chunks: Dict[str, str], stale_ids: List[str]) -> Dict:
+        return {
+            "document_ids": document_ids,
+            "added": len(new_chunks),
+            "unchanged": len(document_ids) - len(new_chunks),
+            "removed": len(stale_ids)
+        }
+    
+    def batch_chunks(self, chunks: List[str]) -> List[List[str]]:
+        """Group chunks into embeddings requests"""
+        size = settings.embedding_batch_size
+        return [chunks[i:i + size] for i in range(0, len(chunks), size)]
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of chunks, backing off and retrying on errors"""
+        for attempt in range(settings.embedding_max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == settings.embedding_max_retries:
+                    raise
+                delay = self.retry_delay(attempt)
+                print(f"Error embedding batch, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of chunks without blocking the event loop, retrying on errors"""
+        for attempt in range(settings.embedding_max_retries + 1):
+            try:
+                return await self.embeddings.aembed_documents(texts)
+            except Exception as e:
+                if attempt == settings.embedding_max_retries:
+                    raise
+                delay = self.retry_delay(attempt)
+                print(f"Error embedding batch, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+    
+    @staticmethod
+    def retry_delay(attempt: int) -> float:
+        """Exponential backoff with jitter so concurrent batches don't retry in lockstep"""
+        delay = settings.embedding_retry_seconds * 2 ** attempt
+        return delay + random.uniform(0, delay)
+    
+    def get_collection(self, client_id: str):
+        """Get a client's collection, or None if it has no knowledge yet or is being re-indexed"""
+        name, collection = self.find_collection(client_id)
+        if collection is None:
+            return None
+        if collection_model(collection) != self.embeddings.model:
+            # Its vectors can't be compared with this model's query embeddings
+            self.schedule_reindex(client_id)
+            return None
+        return self.tenant_collection(name, collection, client_id)
     
     def search_knowledge(self, client_id: str, query: str, k: int = 5) -> List[Dict]:
         """Search for relevant knowledge for a client"""
-        collection_name = f"client_{client_id}"
-        try:
-            collection = self.client.get_collection(collection_name)
-        except:
+        collection = self.get_collection(client_id)
+        if collection is None:
             return []
         
         # Get query embedding
-        query_embedding = self.embeddings.embed_query(query)
+        query_embedding = self.embed_query(query)
+        
+        return self.retrieve(client_id, collection, query, query_embedding, k)
+    
+    async def asearch_knowledge(self, client_id: str, query: str, k: int = 5) -> List[Dict]:
+        """Search for relevant knowledge without blocking the event loop"""
+        collection = await asyncio.to_thread(self.get_collection, client_id)
+        if collection is None:
+            return []
+        
+        query_embedding = await self.aembed_query(query)
+        
+        # Chroma has no async client; run the query on a worker thread
+        return await asyncio.to_thread(self.retrieve, client_id, collection, query, query_embedding, k)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a caller utterance, reusing cached embeddings"""
+        model = self.embeddings.model
+        embedding = embedding_cache.get(model, query)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(normalize_text(query))
+            embedding_cache.put(model, query, embedding)
+        return embedding
+    
+    async def aembed_query(self, query: str) -> List[float]:
+        """Embed a caller utterance without blocking the event loop"""
+        model = self.embeddings.model
+        embedding = embedding_cache.get_memory(model, query)
+        if embedding is None:
+            # The disk tier is a local SQLite read; keep it off the event loop
+            embedding = await asyncio.to_thread(embedding_cache.get, model, query)
+        if embedding is None:
+            embedding = await self.embeddings.aembed_query(normalize_text(query))
+            await asyncio.to_thread(embedding_cache.put, model, query, embedding)
+        return embedding
+    
+    def prewarm_faqs(self, faqs: str) -> int:
+        """Embed a client's FAQ questions ahead of time; returns how many were new"""
+        model = self.embeddings.model
+        questions = embedding_cache.missing(model, parse_faq_questions(faqs))
+        if not questions:
+            return 0
+        
+        embeddings = self.embeddings.embed_documents([normalize_text(q) for q in questions])
+        embedding_cache.put_many(model, questions, embeddings)
+        return len(questions)
+    
+    def retrieve(self, client_id: str, collection, query: str, query_embedding: List[float], k: int) -> List[Dict]:
+        """Find a client's most relevant chunks using the configured retrieval mode"""
+        if settings.retrieval_mode == "hybrid":
+            return self.hybrid_query(client_id, collection, query, query_embedding, k)
+        return self.query_collection(collection, query_embedding, k)
+    
+    def hybrid_query(self, client_id: str, collection, query: str, query_embedding: List[float], k: int) -> List[Dict]:
+        """Fuse vector and BM25 rankings, returning at most k chunks that score well enough.
+        
+        Each candidate's score is a weighted sum of its cosine similarity and its
+        BM25 score relative to the best lexical match. Chunks below
+        ``retrieval_min_score``, or far behind the best chunk, are left out so
+        the prompt only carries knowledge that is likely to matter.
+        """
+        pool = max(k, settings.retrieval_candidates)
+        results = collection.query(query_embeddings=[query_embedding], n_results=pool)
+        
+        candidates: Dict[str, Dict] = {}
+        if results['ids'] and results['ids'][0]:
+            for i, doc_id in enumerate(results['ids'][0]):
+                candidates[doc_id] = {
+                    'content': results['documents'][0][i],
+                    'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
+                    'vector': 1 - results['distances'][0][i] / 2,
+                    'lexical': 0.0
+                }
         
+        index = self.lexical_index.get(client_id) or self.build_lexical_index(client_id, collection)
+        lexical = index.search(query, pool)
+        if lexical:
+            best_lexical = lexical[0][1]
+            missing = [doc_id for doc_id, _ in lexical if doc_id not in candidates]
+            if missing:
+                # Lexical-only matches: fetch them and score them against the query too
+                found = collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+                query_vector = np.asarray(query_embedding, dtype=np.float32)
+                for i, doc_id in enumerate(found['ids']):
+                    distance = float(np.sum((np.asarray(found['embeddings'][i], dtype=np.float32) - query_vector) ** 2))
+                    candidates[doc_id] = {
+                        'content': found['documents'][i],
+                        'metadata': found['metadatas'][i] if found['metadatas'] else {},
+                        'vector': 1 - distance / 2,
+                        'lexical': 0.0
+                    }
+            for doc_id, score in lexical:
+                if doc_id in candidates:
+                    candidates[doc_id]['lexical'] = score / best_lexical
+        
+        weight = settings.hybrid_vector_weight
+        ranked = sorted(
+            (
+                {
+                    'content': candidate['content'],
+                    'metadata': candidate['metadata'],
+                    'score': weight * candidate['vector'] + (1 - weight) * candidate['lexical']
+                }
+                for candidate in candidates.values()
+            ),
+            key=lambda result: result['score'],
+            reverse=True
+        )
+        if not ranked:
+            return []
+        
+        cutoff = max(settings.retrieval_min_score, ranked[0]['score'] * settings.retrieval_relative_cutoff)
+        return [result for result in ranked[:k] if result['score'] >= cutoff]
+    
+    def build_lexical_index(self, client_id: str, collection) -> BM25Index:
+        """Index every chunk a client already has, e.g. knowledge added before hybrid search"""
+        stored = collection.get(include=["documents"])
+        return self.lexical_index.build(client_id, dict(zip(stored['ids'], stored['documents'])))
+    
+    def query_collection(self, collection, query_embedding: List[float], k: int) -> List[Dict]:
+        """Run a nearest-neighbour query and format the results"""
         # Search
         results = collection.query(
             query_embeddings=[query_embedding],
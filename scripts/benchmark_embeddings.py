@@ -0,0 +1,81 @@
+"""Compare query embedding latency and ingestion throughput across embedding providers.
+
+    python scripts/benchmark_embeddings.py --providers openai local
+    python scripts/benchmark_embeddings.py --remote-latency 0.15   # fake OpenAI server instead of the API
+
+The local provider needs the model from scripts/download_embedding_model.py.
+Queries are unique, so the embedding cache doesn't hide the provider.
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer
+
+import chromadb
+import numpy as np
+from langchain_community.embeddings import OpenAIEmbeddings
+
+from app.config import settings
+from app.embedding_providers import LocalEmbeddings
+from app.vector_store import VectorStore
+from benchmark_ingestion import make_handler, sample_document
+
+QUESTIONS = [
+    "what time do you open on saturday",
+    "do you take delta dental insurance",
+    "can i book a cleaning next tuesday",
+    "where do i park when i arrive",
+    "how much is a consultation"
+]
+
+def build_provider(name: str, remote_latency: float):
+    if name == "local":
+        return LocalEmbeddings(
+            settings.local_embedding_model_path,
+            batch_size=settings.local_embedding_batch_size,
+            workers=settings.local_embedding_workers
+        )
+    if remote_latency:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(remote_latency))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return OpenAIEmbeddings(api_key="fake", openai_api_base=f"http://127.0.0.1:{server.server_port}/v1")
+    return OpenAIEmbeddings(api_key=settings.openai_api_key)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--providers", nargs="+", default=["openai", "local"], choices=["openai", "local"])
+    parser.add_argument("--remote-latency", type=float, default=0.0, help="Use a fake OpenAI server with this delay")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=50)
+    args = parser.parse_args()
+
+    content = sample_document(args.pages)
+    for name in args.providers:
+        embeddings = build_provider(name, args.remote_latency)
+        # Load the model / open the connection before timing
+        embeddings.embed_query("warm up")
+
+        latencies = []
+        for i in range(args.queries):
+            question = f"{random.choice(QUESTIONS)} {i}"
+            started = time.perf_counter()
+            embeddings.embed_query(question)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        vector_store = VectorStore()
+        vector_store.client = chromadb.EphemeralClient()
+        vector_store.embeddings = embeddings
+        started = time.perf_counter()
+        report = asyncio.run(vector_store.aadd_knowledge(f"benchmark_{uuid.uuid4().hex}", content, "benchmark"))
+        elapsed = time.perf_counter() - started
+
+        print(
+            f"{name:>6} ({embeddings.model}): query p50 {np.percentile(latencies, 50):.1f}ms  "
+            f"p99 {np.percentile(latencies, 99):.1f}ms  ingestion {report['added'] / elapsed:.0f} chunks/sec"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compare peak memory and time of whole-file and streaming PDF extraction.
+
+    python scripts/benchmark_extraction.py --pages 500 --padding-kb 200
+
+Generates a PDF (each page padded with an unused image-sized stream so the
+file is as heavy as a scanned brochure) and parses it in a fresh process per
+mode so the peak RSS numbers don't mix.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+import psutil
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+from app.config import settings
+from app.extractors import extract_pages
+
+def write_pdf(path: str, pages: int, padding_kb: int, lines: int):
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica")
+    }))
+    for number in range(pages):
+        page = PageObject.create_blank_page(width=612, height=792)
+        text = DecodedStreamObject()
+        operators = "".join(f"(Page {number} line {line}: opening hours, pricing and services) Tj T* " for line in range(lines))
+        text.set_data(f"BT /F1 10 Tf 12 TL 40 760 Td {operators}ET".encode())
+        padding = DecodedStreamObject()
+        padding.set_data(os.urandom(padding_kb * 1024))
+        padding.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(1),
+            NameObject("/Height"): NumberObject(1)
+        })
+        page[NameObject("/Contents")] = writer._add_object(text)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+            NameObject("/XObject"): DictionaryObject({NameObject("/Im1"): writer._add_object(padding)})
+        })
+        writer.add_page(page)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def whole_file(path: str) -> int:
+    """What the upload endpoint used to do: read the upload into memory and concatenate every page"""
+    import PyPDF2
+
+    with open(path, "rb") as f:
+        content = f.read()
+    reader = PyPDF2.PdfReader(BytesIO(content))
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text() + "\n"
+    return len(text)
+
+def streaming(path: str) -> int:
+    _, pages = extract_pages(path)
+    return sum(len(page) for page in pages)
+
+def sample_peak_rss(stop: threading.Event, peak: list):
+    """Track the highest combined RSS of this process and its extraction workers"""
+    process = psutil.Process()
+    while not stop.is_set():
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        peak[0] = max(peak[0], rss)
+        stop.wait(0.005)
+
+def run_mode(mode: str, path: str):
+    # ru_maxrss would include the parent's peak, which Linux carries across exec
+    rss_before = psutil.Process().memory_info().rss
+    peak = [rss_before]
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_peak_rss, args=(stop, peak))
+    sampler.start()
+
+    started = time.perf_counter()
+    if mode == "whole-file":
+        characters = whole_file(path)
+    else:
+        settings.extraction_workers = 1 if mode == "streaming" else settings.extraction_workers
+        characters = streaming(path)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+    print(f"{mode:>10}: {elapsed:.2f}s  {characters} chars  peak +{(peak[0] - rss_before) / 2**20:.0f}MB over {rss_before / 2**20:.0f}MB baseline")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["whole-file", "streaming", "parallel"])
+    parser.add_argument("--pdf")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--padding-kb", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=50, help="Text lines per page; more lines make pages slower to parse")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.pdf)
+        return
+
+    with tempfile.TemporaryDirectory() as path:
+        pdf = os.path.join(path, "benchmark.pdf")
+        write_pdf(pdf, args.pages, args.padding_kb, args.lines)
+        print(f"{args.pages} pages, {os.path.getsize(pdf) / 2**20:.0f}MB")
+        for mode in ("whole-file", "streaming", "parallel"):
+            subprocess.run([sys.executable, *sys.argv, "--mode", mode, "--pdf", pdf], check=True)
+
+if __name__ == "__main__":
+    main()
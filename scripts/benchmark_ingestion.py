@@ -0,0 +1,108 @@
+"""Measure knowledge ingestion throughput against a local fake embeddings API.
+
+    python scripts/benchmark_ingestion.py --pages 200 --latency 0.05
+
+The fake server answers OpenAI-style /embeddings requests after a fixed delay,
+so the numbers reflect round trips and Chroma writes rather than the network.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+
+import chromadb
+from langchain_community.embeddings import OpenAIEmbeddings
+
+from app.vector_store import VectorStore
+
+DIMENSIONS = 1536
+
+def make_handler(latency: float):
+    class FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(latency)
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            payload = json.dumps({
+                "object": "list",
+                "model": body.get("model"),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": [random.random() for _ in range(DIMENSIONS)]}
+                    for i in range(len(inputs))
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return FakeEmbeddingsHandler
+
+def sample_document(pages: int) -> str:
+    """Roughly 3,000 characters of prose per page"""
+    words = ["appointment", "clinic", "insurance", "schedule", "treatment", "parking", "hours", "policy"]
+    return "\n\n".join(
+        " ".join(random.choice(words) for _ in range(450)) for _ in range(pages)
+    )
+
+def serial_ingest(vector_store: VectorStore, client_id: str, content: str) -> int:
+    """The previous behaviour: one embeddings request and one add per chunk"""
+    collection = vector_store.create_collection_for_client(client_id)
+    chunks = vector_store.text_splitter.split_text(content)
+    for i, chunk in enumerate(chunks):
+        embedding = vector_store.embeddings.embed_query(chunk)
+        collection.add(embeddings=[embedding], documents=[chunk], ids=[f"{client_id}_{i}"])
+    return len(chunks)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per embeddings request")
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    vector_store = VectorStore()
+    vector_store.client = chromadb.EphemeralClient()
+    vector_store.embeddings = OpenAIEmbeddings(
+        api_key="fake",
+        openai_api_base=f"http://127.0.0.1:{server.server_port}/v1"
+    )
+    content = sample_document(args.pages)
+
+    if not args.skip_serial:
+        started = time.perf_counter()
+        chunks = serial_ingest(vector_store, f"serial_{uuid.uuid4().hex}", content)
+        elapsed = time.perf_counter() - started
+        print(f"serial:  {chunks} chunks in {elapsed:.2f}s ({chunks / elapsed:.1f} chunks/sec)")
+
+    client_id = f"batched_{uuid.uuid4().hex}"
+    started = time.perf_counter()
+    report = asyncio.run(vector_store.aadd_knowledge(client_id, content, "benchmark"))
+    elapsed = time.perf_counter() - started
+    chunks = report["added"]
+    print(f"batched: {chunks} chunks in {elapsed:.2f}s ({chunks / elapsed:.1f} chunks/sec)")
+
+    # Re-upload with one paragraph edited; only the chunks around it are re-embedded
+    paragraphs = content.split("\n\n")
+    paragraphs[len(paragraphs) // 2] += " updated"
+    started = time.perf_counter()
+    report = asyncio.run(vector_store.aadd_knowledge(client_id, "\n\n".join(paragraphs), "benchmark"))
+    elapsed = time.perf_counter() - started
+    print(f"re-upload: {report['added']} embedded, {report['unchanged']} unchanged, {report['removed']} removed in {elapsed:.2f}s")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
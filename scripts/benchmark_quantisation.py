@@ -0,0 +1,80 @@
+"""Measure recall, latency and size of quantised vector storage against float32.
+
+    python scripts/benchmark_quantisation.py --chunks 3000 --k 3
+    python scripts/benchmark_quantisation.py --collection vector_index/client_abc
+
+Uses clustered synthetic embeddings unless --collection points at a real
+numpy-backend collection, whose own vectors (slightly perturbed) become the
+queries. Recall is the share of float32 top-k results each mode also returns.
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.numpy_index import NumpyCollection, NumpyVectorClient
+
+MODES = [
+    ("float32", True),
+    ("float16", True),
+    ("float16", False),
+    ("int8", True),
+    ("int8", False)
+]
+
+def synthetic_vectors(chunks: int, dimensions: int, rng) -> np.ndarray:
+    """Unit vectors in topic clusters, roughly how chunk embeddings of one knowledge base look"""
+    centres = rng.normal(size=(max(chunks // 50, 1), dimensions))
+    vectors = centres[rng.integers(len(centres), size=chunks)] + rng.normal(scale=0.6, size=(chunks, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collection")
+    parser.add_argument("--chunks", type=int, default=3000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.collection:
+        source = NumpyCollection(args.collection)
+        vectors = source.snapshot[3].rows(list(range(source.count())))
+    else:
+        vectors = synthetic_vectors(args.chunks, args.dimensions, rng)
+    picks = rng.integers(len(vectors), size=args.queries)
+    queries = vectors[picks] + rng.normal(scale=0.02, size=(args.queries, vectors.shape[1])).astype(np.float32)
+
+    expected = None
+    with tempfile.TemporaryDirectory() as path:
+        for precision, keep_exact in MODES:
+            client = NumpyVectorClient(f"{path}/{precision}-{keep_exact}", precision=precision, keep_exact=keep_exact, rerank_factor=args.rerank_factor)
+            collection = client.create_collection("client_benchmark")
+            collection.add(
+                embeddings=vectors,
+                documents=[""] * len(vectors),
+                metadatas=[{}] * len(vectors),
+                ids=[str(i) for i in range(len(vectors))]
+            )
+
+            latencies, results = [], []
+            for query in queries:
+                started = time.perf_counter()
+                results.append(collection.query(query_embeddings=[query], n_results=args.k)["ids"][0])
+                latencies.append((time.perf_counter() - started) * 1000)
+            if expected is None:
+                expected = results
+            recall = np.mean([len(set(got) & set(want)) / len(want) for got, want in zip(results, expected)])
+
+            sizes = collection.nbytes()
+            label = f"{precision}{' + rerank' if keep_exact and precision != 'float32' else ''}"
+            print(
+                f"{label:>16}: recall@{args.k} {recall:.3f}  p50 {np.percentile(latencies, 50):.2f}ms  "
+                f"scanned {sizes['scanned'] / 2**20:.1f}MB  disk {sizes['disk'] / 2**20:.1f}MB"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compare per-query latency and memory of the dedicated and shared vector layouts.
+
+    python scripts/benchmark_tenant_layout.py                                   # 10, 1,000 and 10,000 tenants
+    python scripts/benchmark_tenant_layout.py --tenants 1000 --backend numpy
+
+Each layout is built in one process and queried from a fresh one, so the
+numbers are those of a server that has just started: opening the index,
+then serving searches spread across every tenant.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+import chromadb
+import numpy as np
+import psutil
+
+from app.config import settings
+from app.numpy_index import NumpyVectorClient
+from app.vector_store import TenantCollection, VectorStore
+
+BATCH_ROWS = 5000
+
+def open_store(path: str, backend: str, layout: str) -> VectorStore:
+    settings.vector_layout = layout
+    vector_store = VectorStore()
+    if backend == "numpy":
+        vector_store.client = NumpyVectorClient(path)
+    else:
+        vector_store.client = chromadb.PersistentClient(path=path)
+    return vector_store
+
+def build(path: str, backend: str, layout: str, tenants: int, chunks: int, dimensions: int):
+    rng = np.random.default_rng(0)
+    vector_store = open_store(path, backend, layout)
+
+    def add(collection, client_ids: List[str]):
+        collection.add(
+            embeddings=rng.random((len(client_ids) * chunks, dimensions), dtype=np.float32).tolist(),
+            documents=[f"chunk {i}" for _ in client_ids for i in range(chunks)],
+            metadatas=[{"client_id": client_id, "source": "benchmark"} for client_id in client_ids for _ in range(chunks)],
+            ids=[f"{client_id}_{i}" for client_id in client_ids for i in range(chunks)]
+        )
+
+    shared = {}
+    for tenant in range(tenants):
+        client_id = f"tenant{tenant}"
+        collection = vector_store.create_collection_for_client(client_id)
+        if isinstance(collection, TenantCollection):
+            # Tenants sharing a collection are written together, as the migration would,
+            # since the numpy backend rewrites a collection on every add
+            shared.setdefault(id(collection.collection), (collection.collection, []))[1].append(client_id)
+        else:
+            add(collection, [client_id])
+
+    per_add = max(BATCH_ROWS // chunks, 1)
+    for collection, client_ids in shared.values():
+        for start in range(0, len(client_ids), per_add):
+            add(collection, client_ids[start:start + per_add])
+
+def query(path: str, backend: str, layout: str, tenants: int, dimensions: int, queries: int):
+    rng = np.random.default_rng(1)
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    started = time.perf_counter()
+    vector_store = open_store(path, backend, layout)
+    latencies = []
+    for _ in range(queries):
+        client_id = f"tenant{rng.integers(tenants)}"
+        embedding = rng.random(dimensions, dtype=np.float32).tolist()
+        query_started = time.perf_counter()
+        # The same steps asearch_knowledge takes once the query is embedded
+        collection = vector_store.get_collection(client_id)
+        results = vector_store.query_collection(collection, embedding, 3)
+        latencies.append((time.perf_counter() - query_started) * 1000)
+        assert all(result["metadata"]["client_id"] == client_id for result in results)
+    elapsed = time.perf_counter() - started
+    rss = process.memory_info().rss
+
+    disk = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    print(
+        f"{layout:>9} {tenants:>7,} {np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 99):>8.2f} "
+        f"{elapsed:>8.1f} {rss / 2**20:>8.0f} {(rss - rss_before) / 2**20:>9.0f} {process.num_fds():>6} {disk / 2**20:>8.0f}",
+        flush=True
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--layout", choices=["dedicated", "shared"])
+    parser.add_argument("--tenants", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--phase", choices=["build", "query"])
+    parser.add_argument("--path")
+    args = parser.parse_args()
+
+    if args.phase == "build":
+        build(args.path, args.backend, args.layout, args.tenants[0], args.chunks, args.dimensions)
+        return
+    if args.phase == "query":
+        query(args.path, args.backend, args.layout, args.tenants[0], args.dimensions, args.queries)
+        return
+
+    print(f"{args.backend}, {args.chunks} chunks of {args.dimensions} dimensions per tenant, {args.queries} queries")
+    print(f"{'layout':>9} {'tenants':>7} {'p50 ms':>8} {'p99 ms':>8} {'total s':>8} {'rss MB':>8} {'+rss MB':>9} {'fds':>6} {'disk MB':>8}")
+    common = ["--backend", args.backend, "--chunks", str(args.chunks), "--dimensions", str(args.dimensions), "--queries", str(args.queries)]
+    for tenants in args.tenants:
+        for layout in [args.layout] if args.layout else ["dedicated", "shared"]:
+            with tempfile.TemporaryDirectory() as path:
+                for phase in ("build", "query"):
+                    subprocess.run(
+                        [sys.executable, __file__, *common, "--layout", layout, "--tenants", str(tenants), "--phase", phase, "--path", path],
+                        check=True
+                    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compare query latency and memory of the Chroma and numpy vector backends.
+
+    python scripts/benchmark_vector_backends.py --tenants 20 --chunks 300
+
+Each backend runs in its own process so the RSS numbers don't mix.
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+import psutil
+
+from app.numpy_index import NumpyVectorClient
+from app.vector_store import VectorStore
+
+def run_backend(backend: str, tenants: int, chunks: int, dimensions: int, queries: int):
+    rng = np.random.default_rng(0)
+    process = psutil.Process()
+    with tempfile.TemporaryDirectory() as path:
+        vector_store = VectorStore()
+        if backend == "numpy":
+            vector_store.client = NumpyVectorClient(path)
+        else:
+            vector_store.client = chromadb.PersistentClient(path=path)
+
+        for tenant in range(tenants):
+            collection = vector_store.create_collection_for_client(f"tenant{tenant}")
+            vectors = rng.random((chunks, dimensions), dtype=np.float32)
+            collection.add(
+                embeddings=vectors.tolist(),
+                documents=[f"chunk {i}" for i in range(chunks)],
+                metadatas=[{"source": "benchmark"} for _ in range(chunks)],
+                ids=[f"tenant{tenant}_{i}" for i in range(chunks)]
+            )
+
+        rss_before = process.memory_info().rss
+        latencies = []
+        for _ in range(queries):
+            client_id = f"tenant{rng.integers(tenants)}"
+            query = rng.random(dimensions, dtype=np.float32).tolist()
+            started = time.perf_counter()
+            # The same steps asearch_knowledge takes once the query is embedded
+            collection = vector_store.get_collection(client_id)
+            vector_store.query_collection(collection, query, 3)
+            latencies.append((time.perf_counter() - started) * 1000)
+        rss_after = process.memory_info().rss
+
+    print(
+        f"{backend:>6}: p50 {np.percentile(latencies, 50):.2f}ms  p99 {np.percentile(latencies, 99):.2f}ms  "
+        f"rss {rss_after / 2**20:.0f}MB (+{(rss_after - rss_before) / 2**20:.0f}MB while querying)"
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["chroma", "numpy"])
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.backend:
+        run_backend(args.backend, args.tenants, args.chunks, args.dimensions, args.queries)
+        return
+
+    for backend in ("chroma", "numpy"):
+        subprocess.run([sys.executable, *sys.argv, "--backend", backend], check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Fetch the all-MiniLM-L6-v2 ONNX export used by EMBEDDING_PROVIDER=local.
+
+    python scripts/download_embedding_model.py [--path ./models/all-MiniLM-L6-v2]
+
+This is the same archive Chroma's default embedding function downloads.
+"""
+import argparse
+import os
+import shutil
+import tarfile
+import tempfile
+import urllib.request
+
+from app.config import settings
+
+MODEL_URL = "https://chroma-onnx-models.s3.amazonaws.com/all-MiniLM-L6-v2/onnx.tar.gz"
+
+def download_embedding_model(path: str):
+    if os.path.exists(os.path.join(path, "model.onnx")):
+        print(f"Model already in {path}")
+        return
+    with tempfile.TemporaryDirectory() as workdir:
+        archive = os.path.join(workdir, "onnx.tar.gz")
+        urllib.request.urlretrieve(MODEL_URL, archive)
+        with tarfile.open(archive) as tar:
+            tar.extractall(workdir, filter="data")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        shutil.move(os.path.join(workdir, "onnx"), path)
+    print(f"Model saved to {path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default=settings.local_embedding_model_path)
+    args = parser.parse_args()
+    download_embedding_model(args.path)
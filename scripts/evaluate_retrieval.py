@@ -0,0 +1,79 @@
+"""Offline retrieval evaluation: recall and knowledge tokens per turn, by mode.
+
+    python scripts/evaluate_retrieval.py [--eval-set scripts/eval/retrieval_eval.json] [--chunk-size 300]
+
+Ingests the eval set's documents into a throwaway numpy index (this calls the
+embeddings API), then asks each question in vector and hybrid mode. A question
+counts as recalled when a returned chunk contains its expected passage.
+"""
+import argparse
+import json
+import tempfile
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from app.config import settings
+from app.numpy_index import NumpyVectorClient
+from app.lexical_index import LexicalIndexStore
+from app.token_counter import count_tokens
+from app.vector_store import VectorStore
+
+def evaluate(vector_store: VectorStore, client_id: str, questions, mode: str, k: int):
+    settings.retrieval_mode = mode
+    recalled = chunks = tokens = 0
+    misses = []
+    for item in questions:
+        results = vector_store.search_knowledge(client_id, item["question"], k)
+        if any(item["expected"] in result["content"] for result in results):
+            recalled += 1
+        else:
+            misses.append(item["question"])
+        chunks += len(results)
+        # Same joining as PromptCompiler.render
+        tokens += count_tokens("\n".join(result["content"] for result in results))
+    return {
+        "recall": recalled / len(questions),
+        "chunks": chunks / len(questions),
+        "tokens": tokens / len(questions),
+        "misses": misses
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eval-set", default="scripts/eval/retrieval_eval.json")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.eval_set) as f:
+        eval_set = json.load(f)
+
+    with tempfile.TemporaryDirectory() as path:
+        vector_store = VectorStore()
+        vector_store.client = NumpyVectorClient(f"{path}/vectors")
+        vector_store.lexical_index = LexicalIndexStore(f"{path}/lexical")
+        vector_store.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_size // 5,
+            length_function=len
+        )
+        client_id = eval_set["client_id"]
+        for source, content in eval_set["documents"].items():
+            vector_store.add_knowledge(client_id, content, source)
+
+        reports = {mode: evaluate(vector_store, client_id, eval_set["questions"], mode, args.k) for mode in ("vector", "hybrid")}
+
+    for mode, report in reports.items():
+        print(
+            f"{mode:>6}: recall@{args.k} {report['recall']:.0%}  "
+            f"{report['chunks']:.1f} chunks  {report['tokens']:.0f} knowledge tokens per turn"
+        )
+        for question in report["misses"]:
+            print(f"        missed: {question}")
+
+    saved = reports["vector"]["tokens"] - reports["hybrid"]["tokens"]
+    if reports["vector"]["tokens"]:
+        print(f"hybrid saves {saved:.0f} prompt tokens per turn ({saved / reports['vector']['tokens']:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import sys
+from datetime import datetime
+
+from app.database import engine, Base, SessionLocal, CallLog, CallTurn
+
+def parse_timestamp(value):
+    """Read the ISO timestamp stored with legacy messages"""
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def migrate_call_turns(clear_legacy: bool = False):
+    """Copy the JSON conversation of every call into call_turns"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        migrated = 0
+        kept = 0
+        for call in db.query(CallLog).filter(CallLog.conversation.isnot(None)).all():
+            already = db.query(CallTurn).filter(CallTurn.call_sid == call.call_sid).count()
+            if not already:
+                db.add_all([
+                    CallTurn(
+                        call_sid=call.call_sid,
+                        seq=seq,
+                        role=message.get("role", "user"),
+                        content=message.get("content", ""),
+                        started_at=parse_timestamp(message.get("timestamp")) or call.created_at,
+                        completed_at=parse_timestamp(message.get("timestamp"))
+                    )
+                    for seq, message in enumerate(call.conversation or [])
+                ])
+                migrated += 1
+            elif already != len(call.conversation or []):
+                # A call that spanned the deploy: its legacy history isn't all in call_turns
+                kept += 1
+                continue
+            if clear_legacy:
+                call.conversation = None
+        db.commit()
+        print(f"Migrated {migrated} calls to call_turns")
+        if kept:
+            print(f"Kept the legacy conversation of {kept} partially migrated calls")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate_call_turns(clear_legacy="--clear-legacy" in sys.argv)
@@ -0,0 +1,23 @@
+from sqlalchemy import inspect, text
+
+from app.database import engine
+
+COLUMNS = {
+    "version": "INTEGER DEFAULT 1",
+    "updated_at": "TIMESTAMP"
+}
+
+def migrate_knowledge_versions():
+    """Add the source versioning columns to an existing knowledge table"""
+    existing = {column["name"] for column in inspect(engine).get_columns("knowledge")}
+    with engine.begin() as connection:
+        for name, definition in COLUMNS.items():
+            if name not in existing:
+                connection.execute(text(f"ALTER TABLE knowledge ADD COLUMN {name} {definition}"))
+                print(f"Added knowledge.{name}")
+        connection.execute(text("UPDATE knowledge SET version = 1 WHERE version IS NULL"))
+        connection.execute(text("UPDATE knowledge SET updated_at = created_at WHERE updated_at IS NULL"))
+    print("Knowledge table is up to date")
+
+if __name__ == "__main__":
+    migrate_knowledge_versions()
@@ -0,0 +1,82 @@
+"""Move clients' chunks between the dedicated and shared vector layouts.
+
+    python scripts/migrate_tenant_layout.py --to shared       # small clients join shared collections
+    python scripts/migrate_tenant_layout.py --to dedicated    # every client gets a collection of its own
+
+Run it with VECTOR_LAYOUT=shared on the servers: that layout finds a client in
+either place, so searches keep working while chunks move. Clients with more
+than VECTOR_DEDICATED_CHUNKS chunks keep their own collection either way.
+"""
+import argparse
+from typing import Iterator, List, Tuple
+
+from app.config import settings
+from app.embedding_providers import collection_model
+from app.vector_store import VectorStore
+
+def collection_names(vector_store: VectorStore) -> List[str]:
+    # Chroma lists collections, the numpy backend their names
+    return sorted(
+        collection if isinstance(collection, str) else collection.name
+        for collection in vector_store.client.list_collections()
+    )
+
+def to_shared(vector_store: VectorStore) -> Iterator[Tuple[str, int, str, str]]:
+    """Move each small client's collection into its shared one"""
+    for name in collection_names(vector_store):
+        if not name.startswith("client_"):
+            continue
+        client_id = name[len("client_"):]
+        collection = vector_store.client.get_collection(name)
+        chunks = collection.count()
+        if chunks > settings.vector_dedicated_chunks:
+            yield client_id, chunks, name, name
+            continue
+        if collection_model(collection) != vector_store.embeddings.model:
+            print(f"Error moving {name}: built with {collection_model(collection)}; run scripts/reindex_embeddings.py first")
+            continue
+        try:
+            vector_store.move_client(client_id, dedicated=False)
+        except Exception as e:
+            print(f"Error moving {name}: {e}")
+            continue
+        yield client_id, chunks, name, vector_store.shared_collection_name(client_id)
+
+def to_dedicated(vector_store: VectorStore) -> Iterator[Tuple[str, int, str, str]]:
+    """Give every client in a shared collection one of its own, then drop the shared ones"""
+    for name in collection_names(vector_store):
+        if not name.startswith("shared_"):
+            continue
+        metadatas = vector_store.client.get_collection(name).get(include=["metadatas"])["metadatas"]
+        moved_all = True
+        for client_id in sorted({metadata["client_id"] for metadata in metadatas}):
+            if vector_store.shared_collection_name(client_id) != name:
+                # Clients are placed by hash, so the bucket count must match the one they were written with
+                print(f"Error moving {client_id}: expected in {vector_store.shared_collection_name(client_id)}, found in {name}; check VECTOR_SHARED_COLLECTIONS")
+                moved_all = False
+                continue
+            chunks = vector_store.move_client(client_id, dedicated=True)
+            yield client_id, chunks, name, vector_store.collection_name(client_id)
+        if moved_all:
+            vector_store.client.delete_collection(name)
+
+def migrate_tenant_layout(layout: str):
+    vector_store = VectorStore()
+    before = len(collection_names(vector_store))
+    moves = to_shared(vector_store) if layout == "shared" else to_dedicated(vector_store)
+
+    print(f"{'client':<40} {'chunks':>8}  {'from':<24} {'to':<24}")
+    clients = chunks = 0
+    for client_id, count, source, target in moves:
+        print(f"{client_id:<40} {count:>8,}  {source:<24} {target:<24}")
+        if source != target:
+            clients += 1
+            chunks += count
+    after = len(collection_names(vector_store))
+    print(f"Moved {clients} clients, {chunks:,} chunks; {before} collections -> {after}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--to", choices=["dedicated", "shared"], default=settings.vector_layout)
+    args = parser.parse_args()
+    migrate_tenant_layout(args.to)
@@ -0,0 +1,73 @@
+"""Store every numpy-backend collection at VECTOR_PRECISION and report the bytes saved.
+
+    python scripts/migrate_vector_precision.py                  # convert ./vector_index in place
+    python scripts/migrate_vector_precision.py --from-chroma    # copy ./chroma_db collections across first
+
+Set VECTOR_BACKEND=numpy afterwards to serve from the converted index.
+"""
+import argparse
+
+from app.config import settings
+from app.numpy_index import NumpyVectorClient
+
+def copy_from_chroma(client: NumpyVectorClient, chroma_path: str):
+    """Write each Chroma collection into the numpy index at the configured precision"""
+    import chromadb
+
+    chroma = chromadb.PersistentClient(path=chroma_path)
+    for source in chroma.list_collections():
+        rows = source.get(include=["embeddings", "documents", "metadatas"])
+        # Keeps the embedding_model tag, so the copy is searched with the model that built it
+        collection = client.create_collection(source.name, metadata=source.metadata)
+        if rows["ids"]:
+            collection.add(
+                embeddings=rows["embeddings"],
+                documents=rows["documents"],
+                metadatas=rows["metadatas"],
+                ids=rows["ids"]
+            )
+        # Chroma keeps float32 embeddings (plus its HNSW graph, not counted here)
+        dimensions = len(rows["embeddings"][0]) if rows["ids"] else 0
+        size = 4 * len(rows["ids"]) * (dimensions + 1)
+        yield source.name, {"disk": size, "scanned": size}
+
+def convert_numpy(client: NumpyVectorClient):
+    """Rewrite each collection already in the numpy index"""
+    for name in client.list_collections():
+        collection = client.get_collection(name)
+        before = collection.nbytes()
+        collection.rewrite()
+        yield name, before
+
+def migrate_vector_precision(from_chroma: bool = False, chroma_path: str = "./chroma_db"):
+    client = NumpyVectorClient(
+        settings.vector_index_path,
+        precision=settings.vector_precision,
+        keep_exact=settings.vector_keep_exact,
+        rerank_factor=settings.vector_rerank_factor
+    )
+    collections = copy_from_chroma(client, chroma_path) if from_chroma else convert_numpy(client)
+
+    # "scanned" is what every query reads, so what needs to stay in memory
+    print(f"{'collection':<32} {'disk before':>12} {'disk after':>12} {'saved':>6} {'scanned after':>14} {'saved':>6}")
+    totals = {"disk": [0, 0], "scanned": [0, 0]}
+    for name, before in collections:
+        after = client.get_collection(name).nbytes()
+        saved = {}
+        for key, total in totals.items():
+            total[0] += before[key]
+            total[1] += after[key]
+            saved[key] = 1 - after[key] / before[key] if before[key] else 0
+        print(
+            f"{name:<32} {before['disk']:>12,} {after['disk']:>12,} {saved['disk']:>6.0%} "
+            f"{after['scanned']:>14,} {saved['scanned']:>6.0%}"
+        )
+    for key, (before, after) in totals.items():
+        print(f"{key:>7} at {settings.vector_precision}: {before:,} -> {after:,} bytes ({before - after:,} saved)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--from-chroma", action="store_true")
+    parser.add_argument("--chroma-path", default="./chroma_db")
+    args = parser.parse_args()
+    migrate_vector_precision(args.from_chroma, args.chroma_path)
@@ -0,0 +1,18 @@
+import asyncio
+
+from app.client_cache import snapshot_client
+from app.database import SessionLocal, Client
+from app.phrase_bank import phrase_bank
+
+async def prerender_all_clients():
+    """Render every active client's greeting and fallback phrases into the audio cache"""
+    db = SessionLocal()
+    try:
+        for client in db.query(Client).filter(Client.is_active == True).all():
+            rendered = await phrase_bank.render(snapshot_client(client))
+            print(f"{client.business_name}: {rendered} new phrases rendered")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    asyncio.run(prerender_all_clients())
@@ -0,0 +1,16 @@
+from app.database import SessionLocal, Client
+from app.vector_store import VectorStore
+
+def prewarm_all_clients():
+    """Embed every active client's FAQ questions into the embedding cache"""
+    vector_store = VectorStore()
+    db = SessionLocal()
+    try:
+        for client in db.query(Client).filter(Client.is_active == True).all():
+            added = vector_store.prewarm_faqs(client.faqs)
+            print(f"{client.business_name}: {added} new FAQ embeddings")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    prewarm_all_clients()
@@ -0,0 +1,25 @@
+"""Re-embed every client collection built with a different model than EMBEDDING_PROVIDER's.
+
+    python scripts/reindex_embeddings.py
+
+Collections are otherwise re-indexed on first search after a model switch;
+running this during the switch avoids calls going without knowledge meanwhile.
+"""
+from app.embedding_providers import collection_model
+from app.vector_store import VectorStore
+
+def reindex_embeddings():
+    vector_store = VectorStore()
+    model = vector_store.embeddings.model
+    for collection in vector_store.client.list_collections():
+        name = collection if isinstance(collection, str) else collection.name
+        if not name.startswith(("client_", "shared_")):
+            continue
+        current = collection_model(vector_store.client.get_collection(name))
+        if current != model:
+            print(f"{name}: {current} -> {model}")
+            vector_store.reindex_collection(name)
+    print(f"Every collection uses {model}")
+
+if __name__ == "__main__":
+    reindex_embeddings()
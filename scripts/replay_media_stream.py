@@ -0,0 +1,106 @@
+"""Play a recorded caller into /call/media-stream the way Twilio would, and time each reply.
+
+    python scripts/replay_media_stream.py caller.wav --to +15550100
+    python scripts/replay_media_stream.py caller.wav --url wss://example.ngrok.app/call/media-stream
+
+The recording (mono WAV, 16-bit) is sent in real time as 20 ms μ-law frames,
+followed by a few seconds of silence; the assistant's audio is "played" at
+real-time speed before its marks are echoed, so barge-in behaves as on a
+phone. Latency is measured from the caller's last voiced frame to the first
+audio of the reply, the figure a Gather turn can't get below its
+speech_timeout for.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import time
+import uuid
+import wave
+
+import numpy as np
+import websockets
+
+from app.config import settings
+from app.speech_recognizer import SAMPLE_RATE, VoiceActivityDetector, encode_mulaw
+
+FRAME_BYTES = 160  # 20 ms
+
+def load_frames(path: str, trailing_silence_s: float) -> list:
+    """The recording as 20 ms frames of 8 kHz μ-law"""
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path} must be 16-bit PCM")
+        rate = f.getframerate()
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)[::f.getnchannels()]
+    if rate != SAMPLE_RATE:
+        positions = np.arange(0, len(samples), rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    audio = encode_mulaw(samples) + encode_mulaw(np.zeros(int(trailing_silence_s * SAMPLE_RATE)))
+    return [audio[start:start + FRAME_BYTES] for start in range(0, len(audio), FRAME_BYTES)]
+
+async def replay(url: str, to_number: str, frames: list):
+    call_sid = f"CA{uuid.uuid4().hex}"
+    stream_sid = f"MZ{uuid.uuid4().hex}"
+    vad = VoiceActivityDetector(settings.vad_threshold, settings.vad_start_ms, settings.vad_end_ms)
+    last_voiced = None
+    waiting_since = None
+    latencies = []
+    played_until = time.monotonic()
+
+    async with websockets.connect(url) as connection:
+        await connection.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+        await connection.send(json.dumps({
+            "event": "start",
+            "streamSid": stream_sid,
+            "start": {"callSid": call_sid, "streamSid": stream_sid, "customParameters": {"To": to_number}}
+        }))
+
+        async def listen():
+            nonlocal waiting_since, played_until
+            async for message in connection:
+                data = json.loads(message)
+                if data["event"] == "media":
+                    if waiting_since is not None:
+                        latencies.append((time.monotonic() - waiting_since) * 1000)
+                        print(f"turn {len(latencies)}: first reply audio after {latencies[-1]:.0f} ms")
+                        waiting_since = None
+                    audio = base64.b64decode(data["media"]["payload"])
+                    played_until = max(played_until, time.monotonic()) + len(audio) / SAMPLE_RATE
+                elif data["event"] == "mark":
+                    # Twilio echoes a mark once the audio sent before it has played
+                    await asyncio.sleep(max(played_until - time.monotonic(), 0))
+                    await connection.send(message)
+                elif data["event"] == "clear":
+                    print("barge-in: assistant audio cleared")
+                    played_until = time.monotonic()
+
+        listener = asyncio.create_task(listen())
+        started = time.monotonic()
+        for index, frame in enumerate(frames):
+            await asyncio.sleep(max(started + index * 0.02 - time.monotonic(), 0))
+            await connection.send(json.dumps({
+                "event": "media",
+                "streamSid": stream_sid,
+                "media": {"track": "inbound", "chunk": str(index + 1), "payload": base64.b64encode(frame).decode()}
+            }))
+            event = vad.feed(frame)
+            if vad.speaking and not vad.silent_ms:
+                last_voiced = time.monotonic()
+            if event == "end":
+                waiting_since = last_voiced
+        await asyncio.sleep(max(played_until - time.monotonic(), 0) + 0.5)
+        await connection.send(json.dumps({"event": "stop", "streamSid": stream_sid}))
+        listener.cancel()
+
+    if latencies:
+        print(f"{len(latencies)} turns, first reply audio p50 {np.percentile(latencies, 50):.0f} ms, max {max(latencies):.0f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording")
+    parser.add_argument("--url", default=f"ws://localhost:{settings.port}/call/media-stream")
+    parser.add_argument("--to", required=True, help="The client's phone number")
+    parser.add_argument("--trailing-silence", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(replay(args.url, args.to, load_frames(args.recording, args.trailing_silence)))
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.audio_cache import AudioCache, parse_range
+
+def test_keys_are_stable_and_distinguish_voices(tmp_path):
+    """Test a text registers under the same key every time, and a separate key per voice"""
+    cache = AudioCache(str(tmp_path), 1024)
+    key = cache.register("Thanks for calling!", "voice-a", "model", "mp3_44100_128")
+
+    assert key == AudioCache.key("voice-a", "model", "mp3_44100_128", "Thanks for calling! ")
+    assert key != cache.register("Thanks for calling!", "voice-b", "model", "mp3_44100_128")
+    assert cache.entry(key) == {"voice_id": "voice-a", "model_id": "model", "output_format": "mp3_44100_128", "text": "Thanks for calling!"}
+    assert cache.entry("unknown") is None
+
+def test_async_registration_writes_new_keys_once(tmp_path, monkeypatch):
+    """Test keys registered from the event loop match register's, and known keys skip the manifest"""
+    cache = AudioCache(str(tmp_path), 1024)
+    writes = []
+    register_many = cache.register_many
+    monkeypatch.setattr(cache, "register_many", lambda *args: writes.append(args) or register_many(*args))
+
+    keys = asyncio.run(cache.aregister(["Hello", "Goodbye"], "voice-a", "model", "mp3_44100_128"))
+    assert keys == [AudioCache.key("voice-a", "model", "mp3_44100_128", text) for text in ("Hello", "Goodbye")]
+    assert cache.entry(keys[1])["text"] == "Goodbye"
+    assert asyncio.run(cache.aregister(["Goodbye"], "voice-a", "model", "mp3_44100_128")) == keys[1:]
+    assert len(writes) == 1
+
+def test_concurrent_requests_synthesise_once(tmp_path):
+    """Test requests for audio that is being synthesised wait for it rather than synthesising again"""
+    cache = AudioCache(str(tmp_path), 1024)
+    key = cache.register("Hello", "voice-a", "model", "mp3_44100_128")
+    calls = []
+
+    async def synthesise(entry):
+        calls.append(entry["text"])
+        # Held until the other requests are waiting on it, however slowly they look the key up
+        for _ in range(100):
+            if cache.waits == 4:
+                break
+            await asyncio.sleep(0.01)
+        return b"audio"
+
+    async def fetch_all():
+        return await asyncio.gather(*(cache.get(key, synthesise) for _ in range(5)))
+
+    paths = asyncio.run(fetch_all())
+
+    assert calls == ["Hello"]
+    assert len(set(paths)) == 1
+    assert open(paths[0], "rb").read() == b"audio"
+    assert asyncio.run(cache.get(key, synthesise)) == paths[0]
+    assert calls == ["Hello"]
+    assert (cache.misses, cache.waits, cache.hits) == (1, 4, 1)
+
+def test_workers_share_a_lock_per_key(tmp_path):
+    """Test a second process's fill finds the audio the first one wrote instead of synthesising it"""
+    first, second = AudioCache(str(tmp_path), 1024), AudioCache(str(tmp_path), 1024)
+    key = first.register("Hello", "voice-a", "model", "mp3_44100_128")
+    entry = first.entry(key)
+    calls = []
+
+    async def synthesise(entry):
+        calls.append(entry["text"])
+        await asyncio.sleep(0.05)
+        return b"audio"
+
+    async def fill_both():
+        # Each instance has its own lock file handle, as separate workers would
+        return await asyncio.gather(*(cache.fill(key, entry, synthesise) for cache in (first, second)))
+
+    assert len(set(asyncio.run(fill_both()))) == 1
+
+    assert calls == ["Hello"]
+
+def test_evicts_least_recently_used_files(tmp_path):
+    """Test files are evicted oldest-use first once the cache is full, and can be synthesised again"""
+    cache = AudioCache(str(tmp_path), 10)
+    keys = [cache.register(text, "voice-a", "model", "mp3_44100_128") for text in ("one", "two", "three")]
+    async def synthesise(entry):
+        return b"12345"
+
+    asyncio.run(cache.get(keys[0], synthesise))
+    asyncio.run(cache.get(keys[1], synthesise))
+    time.sleep(0.01)
+    asyncio.run(cache.get(keys[0], synthesise))
+    asyncio.run(cache.get(keys[2], synthesise))
+
+    on_disk = [key for key in keys if (tmp_path / key[:2] / f"{key}.mp3").exists()]
+    assert on_disk == [keys[0], keys[2]]
+    assert cache.stats()["bytes"] == 10
+    assert asyncio.run(cache.get(keys[1], synthesise)) is not None
+
+def test_eviction_prunes_stale_manifest_rows(tmp_path):
+    """Test rows left without audio are dropped from the manifest once unused for the TTL, unless pinned"""
+    cache = AudioCache(str(tmp_path), 10, manifest_ttl_seconds=60)
+    evicted, kept, unfetched, pinned = [cache.register(text, "voice-a", "model", "mp3_44100_128") for text in ("one", "two", "three", "four")]
+    cache.pin("phrases", [pinned])
+    async def synthesise(entry):
+        return b"12345"
+
+    asyncio.run(cache.get(evicted, synthesise))
+    asyncio.run(cache.get(kept, synthesise))
+    cache._execute("UPDATE audio SET last_used = ?", (time.time() - 120,))
+    cache._execute("UPDATE audio SET last_used = ? WHERE key = ?", (time.time() - 180, evicted))
+    asyncio.run(cache.get(cache.register("five", "voice-a", "model", "mp3_44100_128"), synthesise))
+
+    assert [cache.entry(key) is None for key in (evicted, kept, unfetched, pinned)] == [True, False, True, False]
+    assert cache.stats()["pruned"] == 2
+    # A pruned key is registered again rather than taken as known
+    assert cache.register("one", "voice-a", "model", "mp3_44100_128") == evicted
+    assert cache.entry(evicted)["text"] == "one"
+
+def test_parse_range():
+    """Test single byte ranges, suffix ranges and unsatisfiable ranges"""
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+
+def test_stream_forwards_chunks_before_synthesis_finishes(tmp_path):
+    """Test streamed audio reaches the caller chunk by chunk and is cached once complete"""
+    cache = AudioCache(str(tmp_path), 1024)
+    key = cache.register("Hello", "voice-a", "model", "ulaw_8000")
+    entry = cache.entry(key)
+    released = asyncio.Event()
+
+    async def synthesise(entry):
+        yield b"first"
+        await released.wait()
+        yield b"second"
+
+    async def listen():
+        chunks = await cache.stream(key, entry, synthesise)
+        received = [await chunks.__anext__()]
+        assert not cache.exists(key, "ulaw_8000")
+        released.set()
+        received.extend([chunk async for chunk in chunks])
+        return received
+
+    assert asyncio.run(listen()) == [b"first", b"second"]
+    assert open(cache.file_path(key, "ulaw_8000"), "rb").read() == b"firstsecond"
+    assert cache.media_type("ulaw_8000") == "audio/ulaw"
+    assert cache.stats()["first_byte_ms_p50"] is not None
+
+def test_failed_stream_is_not_cached(tmp_path):
+    """Test a stream that breaks off is not kept, and one that never starts reports failure"""
+    cache = AudioCache(str(tmp_path), 1024)
+    key = cache.register("Hello", "voice-a", "model", "ulaw_8000")
+    entry = cache.entry(key)
+
+    async def broken(entry):
+        yield b"first"
+        raise ConnectionError("reset")
+
+    async def silent(entry):
+        return
+        yield
+
+    async def listen(synthesise):
+        chunks = await cache.stream(key, entry, synthesise)
+        return chunks and [chunk async for chunk in chunks]
+
+    assert asyncio.run(listen(broken)) == [b"first"]
+    assert not cache.exists(key, "ulaw_8000")
+    assert asyncio.run(listen(silent)) is None
+    assert os.listdir(os.path.dirname(cache.file_path(key, "ulaw_8000"))) == [".lock"]
@@ -0,0 +1,188 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.call_handler import DEADLINE_MISSED, CallHandler
+from app.call_log_writer import call_log_writer
+from app.config import settings
+from app.container import container
+from app.llm_service import LLMService
+
+class FakeLLMService:
+    """Streams a scripted reply; a number in the script pauses for that many seconds"""
+
+    def __init__(self, script, seconds: float = 0):
+        self.script = script
+        self.seconds = seconds
+        self.context_builder = SimpleNamespace(window_start=lambda history, *args: 0, token_budget=1000)
+
+    async def stream_response(self, client_data, user_input, history, turn_stats, summary, summarized):
+        for token in self.script:
+            await asyncio.sleep(self.seconds)
+            if isinstance(token, str):
+                yield token
+            else:
+                await asyncio.sleep(token)
+
+    async def agenerate_response(self, client_data, user_input, history, turn_stats, summary, summarized):
+        return "".join([token async for token in self.stream_response(client_data, user_input, history, turn_stats, summary, summarized)])
+
+class FakeClientCache:
+    def get_by_phone(self, db, phone_number):
+        return {"client_id": "client-1", "business_name": "Acme Dental", "voice_id": None, "is_active": True}
+
+class FakeChatModel:
+    """Answers after a pause, recording how many requests overlap"""
+
+    def __init__(self):
+        self.running = 0
+        self.most_running = 0
+
+    async def ainvoke(self, messages):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0.02)
+        self.running -= 1
+        return SimpleNamespace(content="We open at nine.")
+
+    async def astream(self, messages):
+        yield await self.ainvoke(messages)
+
+def make_handler(monkeypatch, llm_service):
+    monkeypatch.setattr(settings, "semantic_cache_enabled", False)
+    return CallHandler(llm_service=llm_service, appointment_service=SimpleNamespace())
+
+def serve_calls(monkeypatch, llm_service, streaming: bool = True):
+    """A handler answering Gather webhooks with the fake model, within a short deadline"""
+    handler = make_handler(monkeypatch, llm_service)
+    monkeypatch.setitem(container.services, "call_handler", handler)
+    monkeypatch.setattr(main, "client_cache", FakeClientCache())
+    monkeypatch.setattr(call_log_writer, "log_turn", lambda *args: None)
+    monkeypatch.setattr(settings, "warm_services_on_startup", False)
+    monkeypatch.setattr(settings, "streaming_responses", streaming)
+    monkeypatch.setattr(settings, "turn_deadline_seconds", 0.2)
+    return handler
+
+def test_streamed_turn_is_logged_when_generation_finishes(monkeypatch):
+    """Test a turn is logged once its reply is generated, without waiting for its last redirect"""
+    handler = make_handler(monkeypatch, FakeLLMService(["We open at nine. ", "See you then."], seconds=0.01))
+    logged = []
+    monkeypatch.setattr("app.call_handler.call_log_writer.log_turn", lambda *args: logged.append(args))
+
+    async def scenario():
+        turn = handler.start_turn({"client_id": "client-1"}, "when do you open", "CA1")
+        assert await turn.next_chunks() == ["We open at nine."]
+        # The caller hangs up, so no redirect ever asks for the rest
+        await turn.task
+
+    asyncio.run(scenario())
+    assert len(logged) == 1
+    call_sid, user_input, result = logged[0]
+    assert (call_sid, user_input) == ("CA1", "when do you open")
+    assert result["response"] == "We open at nine. See you then."
+
+def test_new_turn_cancels_the_one_still_streaming(monkeypatch):
+    """Test a turn started while the last is still streaming stops it, keeping the history in order"""
+    handler = make_handler(monkeypatch, FakeLLMService(["We open at nine. ", 0.2, "We close at five."], seconds=0.01))
+    monkeypatch.setattr("app.call_handler.call_log_writer.log_turn", lambda *args: None)
+
+    async def scenario():
+        first = handler.start_turn({"client_id": "client-1"}, "when do you open", "CA1")
+        assert await first.next_chunks() == ["We open at nine."]
+        second = handler.start_turn({"client_id": "client-1"}, "and on sundays", "CA1")
+        await second.task
+        assert first.task.cancelled()
+        assert handler.get_turn("CA1") is second
+        return await handler.get_conversation_history("CA1")
+
+    history = asyncio.run(scenario())
+    assert [(message["role"], message["content"]) for message in history] == [
+        ("user", "when do you open"),
+        ("assistant", DEADLINE_MISSED),
+        ("user", "and on sundays"),
+        ("assistant", "We open at nine. We close at five.")
+    ]
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_process_speech_falls_back_when_the_model_misses_the_deadline(monkeypatch, streaming):
+    """Test a caller hears the fallback rather than silence when no reply is ready in time"""
+    handler = serve_calls(monkeypatch, FakeLLMService([5, "We open at nine."]), streaming)
+
+    with TestClient(main.app) as client:
+        response = client.post("/call/process-speech", data={"SpeechResult": "when do you open", "CallSid": "CA1", "To": "+15550100"})
+
+    assert response.status_code == 200
+    assert DEADLINE_MISSED in response.text
+    assert "<Gather" in response.text
+    assert handler.get_turn("CA1") is None
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_missed_deadline_is_logged_and_answered_in_the_history(monkeypatch, streaming):
+    """Test a turn cut off by the deadline is logged with the fallback, which also answers it in the history"""
+    handler = serve_calls(monkeypatch, FakeLLMService([5, "We open at nine."]), streaming)
+    logged = []
+    monkeypatch.setattr(call_log_writer, "log_turn", lambda *args: logged.append(args))
+
+    with TestClient(main.app) as client:
+        client.post("/call/process-speech", data={"SpeechResult": "when do you open", "CallSid": "CA1", "To": "+15550100"})
+        # A streamed turn is cancelled after the webhook has answered
+        deadline = time.monotonic() + 2
+        while not logged and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert len(logged) == 1
+    call_sid, user_input, result = logged[0]
+    assert (call_sid, user_input, result["seq"]) == ("CA1", "when do you open", 0)
+    assert result["response"] == DEADLINE_MISSED
+    history = asyncio.run(handler.get_conversation_history("CA1"))
+    assert [(message["role"], message["content"]) for message in history] == [
+        ("user", "when do you open"),
+        ("assistant", DEADLINE_MISSED)
+    ]
+
+def test_continue_speech_falls_back_when_the_model_stalls(monkeypatch):
+    """Test a reply that stalls after its first sentence ends with the fallback, and stops generating"""
+    handler = serve_calls(monkeypatch, FakeLLMService(["We open at nine. ", 5, "We close at five."]))
+    form = {"SpeechResult": "when do you open", "CallSid": "CA1", "To": "+15550100"}
+
+    with TestClient(main.app) as client:
+        response = client.post("/call/process-speech", data=form)
+        assert "We open at nine." in response.text
+        assert "/call/continue-speech" in response.text
+        turn = handler.get_turn("CA1")
+
+        response = client.post("/call/continue-speech", data=form)
+
+    assert DEADLINE_MISSED in response.text
+    assert "<Gather" in response.text
+    assert handler.get_turn("CA1") is None
+    assert turn.task.cancelled()
+
+def test_completions_share_the_concurrency_limit(monkeypatch):
+    """Test no more completions run at once than llm_max_concurrency, whether streamed or not"""
+    monkeypatch.setattr(settings, "llm_max_concurrency", 2)
+    llm_service = LLMService(vector_store=SimpleNamespace())
+    llm_service.llm = FakeChatModel()
+
+    async def no_knowledge(client_id, query, k):
+        return []
+
+    llm_service.vector_store.asearch_knowledge = no_knowledge
+    monkeypatch.setattr(llm_service, "build_messages", lambda *args: [])
+    monkeypatch.setattr(llm_service, "record_prompt_tokens", lambda *args: None)
+
+    async def stream(i):
+        return "".join([token async for token in llm_service.stream_response({"client_id": "client-1"}, f"question {i}", [])])
+
+    async def burst():
+        return await asyncio.gather(
+            *[llm_service.agenerate_response({"client_id": "client-1"}, f"question {i}", []) for i in range(5)],
+            *[stream(i) for i in range(5)]
+        )
+
+    assert asyncio.run(burst()) == ["We open at nine."] * 10
+    assert llm_service.llm.most_running == 2
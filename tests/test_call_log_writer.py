@@ -0,0 +1,78 @@
+import asyncio
+
+from app.call_log_writer import CallLogWriter
+
+def recording_writer(**kwargs):
+    """Build a writer that records batches instead of touching the database"""
+    writer = CallLogWriter(**kwargs)
+    writer.batches_written = []
+    writer.write = lambda records: writer.batches_written.append(list(records))
+    return writer
+
+def test_writer_batches_by_size_and_drains_on_stop():
+    """Test queued rows are written in full batches and the rest on shutdown"""
+    writer = recording_writer(max_queue=100, batch_size=4, flush_seconds=60)
+
+    async def scenario():
+        writer.start()
+        for i in range(5):
+            writer.log_call("client", "+1555", f"CA{i}")
+        await asyncio.sleep(0.05)
+        assert [len(batch) for batch in writer.batches_written] == [4]
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert [len(batch) for batch in writer.batches_written] == [4, 1]
+
+def test_writer_flushes_after_interval():
+    """Test a partial batch is written once the flush interval passes"""
+    writer = recording_writer(max_queue=100, batch_size=50, flush_seconds=0.05)
+
+    async def scenario():
+        writer.start()
+        writer.log_turn("CA1", "hello", {"response": "hi", "appointment_booked": True, "seq": 0})
+        await asyncio.sleep(0.2)
+        assert len(writer.batches_written) == 1
+        await writer.stop()
+
+    asyncio.run(scenario())
+    kinds = [kind for kind, _ in writer.batches_written[0]]
+    assert kinds == ["turn", "turn", "booked"]
+    assert [row["seq"] for kind, row in writer.batches_written[0][:2]] == [0, 1]
+
+def test_writer_writes_inline_when_saturated():
+    """Test rows are written immediately rather than dropped when the queue is full"""
+    writer = recording_writer(max_queue=2, batch_size=50, flush_seconds=60)
+
+    async def scenario():
+        writer.start()
+        writer.log_call("client", "+1555", "CA1")
+        writer.log_call("client", "+1555", "CA2")
+        writer.log_call("client", "+1555", "CA3")
+        assert writer.inline_writes == 1
+        assert writer.batches_written[0][0][1]["call_sid"] == "CA3"
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert writer.stats()["inline_writes"] == 1
+    assert sum(len(batch) for batch in writer.batches_written) == 3
+
+def test_failed_batch_is_retried_then_written_row_by_row():
+    """Test a batch with a bad row loses only that row, and the drop is counted"""
+    writer = CallLogWriter()
+    attempts = []
+    written = []
+
+    def insert(records):
+        attempts.append(len(records))
+        if any(row["call_sid"] == "CA-duplicate" for kind, row in records):
+            raise ValueError("UNIQUE constraint failed: call_logs.call_sid")
+        written.extend(row["call_sid"] for kind, row in records)
+
+    writer.insert = insert
+    writer.write([("call", {"call_sid": sid}) for sid in ("CA1", "CA-duplicate", "CA2")])
+
+    assert attempts == [3, 3, 1, 1, 1]
+    assert written == ["CA1", "CA2"]
+    assert writer.stats()["written"] == 2
+    assert (writer.stats()["retries"], writer.stats()["dropped"]) == (1, 1)
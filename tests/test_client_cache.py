@@ -0,0 +1,47 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.client_cache import ClientCache
+from app.database import Base, Client
+
+engine = create_engine("sqlite://")
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base.metadata.create_all(bind=engine)
+
+db = TestingSessionLocal()
+db.add(Client(
+    client_id="cache-test",
+    name="Cache Test",
+    business_name="Cached Business",
+    phone_number="+15550001111",
+    email="cache@example.com"
+))
+db.commit()
+
+def test_snapshot_is_served_from_cache():
+    """Test a second lookup by phone or id does not miss"""
+    cache = ClientCache()
+    snapshot = cache.get_by_phone(db, "+15550001111")
+    assert snapshot["business_name"] == "Cached Business"
+    assert cache.get_by_client_id(db, "cache-test") is snapshot
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_invalidate_reloads_client():
+    """Test an update is visible after explicit invalidation"""
+    cache = ClientCache()
+    cache.get_by_client_id(db, "cache-test")
+    client = db.query(Client).filter(Client.client_id == "cache-test").first()
+    client.voice_id = "voice-2"
+    db.commit()
+    cache.invalidate("cache-test")
+    assert cache.get_by_phone(db, "+15550001111")["voice_id"] == "voice-2"
+
+def test_ttl_and_size_bounds():
+    """Test expired entries miss and the cache never exceeds its size"""
+    cache = ClientCache(max_size=1, ttl_seconds=0)
+    cache.get_by_client_id(db, "cache-test")
+    cache.get_by_client_id(db, "cache-test")
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["size"] == 1
+    assert cache.get_by_phone(db, "+15550009999") is None
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import app.token_counter as token_counter
+from app.config import settings
+from app.context_builder import ContextBuilder
+
+def turn(role, content):
+    return {"role": role, "content": content, "timestamp": "2024-01-01T00:00:00"}
+
+def test_current_utterance_is_sent_once():
+    """Test the utterance already in the history is not duplicated"""
+    history = [turn("user", "Hi"), turn("assistant", "Hello!"), turn("user", "Are you open?")]
+    messages = ContextBuilder().build(history, "Are you open?")
+    assert [m.content for m in messages] == ["Hi", "Hello!", "Are you open?"]
+
+def test_old_turns_are_replaced_by_summary():
+    """Test history beyond the budget is dropped and the summary is used instead"""
+    history = [turn("user" if i % 2 == 0 else "assistant", "word " * 50) for i in range(20)]
+    history.append(turn("user", "Book me in"))
+    builder = ContextBuilder(token_budget=200)
+
+    messages = builder.build(history, "Book me in", summary="Caller is Sam.", summarized=10)
+    assert messages[0].content.endswith("Caller is Sam.")
+    assert messages[-1].content == "Book me in"
+    assert 1 < len(messages) < len(history)
+
+def test_tokenizer_follows_the_chat_model(monkeypatch):
+    """Test tokens are counted with the configured model's encoding, or GPT-4o's for models tiktoken doesn't know"""
+    import tiktoken
+
+    def encoding_for_model(model):
+        if model == "gpt-4":
+            return SimpleNamespace(name="cl100k_base")
+        raise KeyError(model)
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", encoding_for_model)
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: SimpleNamespace(name=name))
+    # Restored afterwards, so other tests keep the real tokenizer
+    monkeypatch.setattr(token_counter, "_encoding", None)
+    for model, encoding in (("gpt-4", "cl100k_base"), ("gpt-5-preview", "o200k_base")):
+        monkeypatch.setattr(settings, "llm_model", model)
+        monkeypatch.setattr(token_counter, "_encoding_loaded", False)
+        assert token_counter.get_encoding().name == encoding
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.conversation_store import ConversationStore, InMemoryConversationStore, RedisConversationStore
+
+class FakeRedis:
+    """The subset of redis.asyncio used by RedisConversationStore"""
+
+    def __init__(self):
+        self.lists = {}
+        self.values = {}
+        self.expiry = {}
+
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    async def lrange(self, key, start, end):
+        values = self.lists.get(key, [])
+        return values[start:] if end == -1 else values[start:end + 1]
+
+    async def expire(self, key, seconds):
+        self.expiry[key] = seconds
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.expiry[key] = ex
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.lists.pop(key, None)
+            self.values.pop(key, None)
+
+def test_memory_store_evicts_least_recent_call():
+    """Test the memory backend never keeps more than max_calls"""
+    store = InMemoryConversationStore(max_calls=2)
+
+    async def scenario():
+        for call_sid in ("CA1", "CA2", "CA3"):
+            await store.append(call_sid, "user", f"hello from {call_sid}")
+        return await store.get("CA1"), await store.get("CA3")
+
+    evicted, kept = asyncio.run(scenario())
+    assert evicted == []
+    assert kept[0]["role"] == "user"
+    assert kept[0]["content"] == "hello from CA3"
+
+def test_memory_store_expires_idle_calls():
+    """Test idle calls are forgotten after the TTL"""
+    store = InMemoryConversationStore(ttl_seconds=0)
+
+    async def scenario():
+        await store.append("CA1", "user", "hi")
+        await asyncio.sleep(0.01)
+        return await store.get("CA1")
+
+    assert asyncio.run(scenario()) == []
+
+def test_redis_store_round_trip():
+    """Test the Redis backend keeps order, sets a TTL and forgets ended calls"""
+    redis = FakeRedis()
+    store = RedisConversationStore(redis, ttl_seconds=60)
+
+    async def scenario():
+        await store.append("CA1", "user", "What are your hours?")
+        await store.append("CA1", "assistant", "Nine to five.")
+        await store.set_summary("CA1", "Caller asked about hours.", 2)
+        history = await store.get("CA1")
+        summary = await store.get_summary("CA1")
+        await store.end("CA1")
+        return history, summary, await store.get("CA1"), await store.get_summary("CA1")
+
+    history, summary, after_end, summary_after_end = asyncio.run(scenario())
+    assert [m["content"] for m in history] == ["What are your hours?", "Nine to five."]
+    assert summary == ("Caller asked about hours.", 2)
+    assert redis.expiry["conversation:CA1"] == 60
+    assert after_end == []
+    assert summary_after_end == (None, 0)
+
+def test_incomplete_store_fails_when_created():
+    """Test a store missing part of the interface can't be created, rather than failing mid-call"""
+    class AppendOnlyStore(ConversationStore):
+        async def get(self, call_sid):
+            return []
+
+        async def append(self, call_sid, role, content):
+            pass
+
+    with pytest.raises(TypeError):
+        AppendOnlyStore()
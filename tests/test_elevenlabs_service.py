@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+from elevenlabs.core.api_error import ApiError
+
+from app.config import settings
+from app.elevenlabs_service import ElevenLabsService
+
+class FakeTextToSpeech:
+    def __init__(self, busy: int = 0, seconds: float = 0):
+        self.busy = busy
+        self.seconds = seconds
+        self.running = 0
+        self.most_running = 0
+
+    async def convert(self, voice_id, **kwargs):
+        # Like the SDK, nothing is sent until the first chunk is asked for
+        if self.busy:
+            self.busy -= 1
+            raise ApiError(status_code=429, body={"detail": {"status": "too_many_concurrent_requests"}})
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(self.seconds)
+        self.running -= 1
+        yield b"audio "
+        yield kwargs["text"].encode()
+
+    convert_as_stream = convert
+
+class FakeVoices:
+    def __init__(self):
+        self.calls = 0
+
+    async def get_all(self):
+        self.calls += 1
+        return SimpleNamespace(voices=[SimpleNamespace(voice_id=f"voice-{self.calls}", name="Rachel")])
+
+def make_service(monkeypatch, text_to_speech, **overrides):
+    for name, value in {"elevenlabs_max_concurrency": 2, "elevenlabs_retry_seconds": 0.01, **overrides}.items():
+        monkeypatch.setattr(settings, name, value)
+    service = ElevenLabsService()
+    service.client = SimpleNamespace(text_to_speech=text_to_speech, voices=FakeVoices())
+    return service
+
+def test_requests_retry_429_and_share_the_concurrency_limit(monkeypatch):
+    """Test a busy response is retried, and no more requests run at once than the plan allows"""
+    text_to_speech = FakeTextToSpeech(busy=2, seconds=0.05)
+    service = make_service(monkeypatch, text_to_speech)
+
+    async def calls():
+        assert await service.generate_speech("Hello") == b"audio Hello"
+        assert [chunk async for chunk in service.stream_speech("Hi")] == [b"audio ", b"Hi"]
+        assert service.retries == 2
+        # Waiting for a slot happens on the event loop, so callers queue without holding threads
+        await asyncio.gather(*[service.generate_speech(f"Caller {i}") for i in range(6)])
+
+    asyncio.run(calls())
+
+    stats = service.stats()
+    assert text_to_speech.most_running == 2
+    assert stats["requests"] == 8
+    assert (stats["in_flight"], stats["waiting"]) == (0, 0)
+    assert stats["queue_ms_p95"] > 0
+    assert stats["synthesis_ms_p50"] >= 50
+
+def test_requests_give_up_after_max_retries(monkeypatch):
+    """Test speech generation fails once 429s outlast the retries"""
+    service = make_service(monkeypatch, FakeTextToSpeech(busy=10), elevenlabs_max_retries=2)
+
+    assert asyncio.run(service.generate_speech("Hello")) is None
+    assert (service.retries, service.failures) == (2, 1)
+    assert service.stats()["in_flight"] == 0
+
+def test_voice_catalogue_is_cached_and_refreshed_in_background(monkeypatch):
+    """Test voices are fetched once, then served stale while a refresh runs"""
+    service = make_service(monkeypatch, FakeTextToSpeech())
+
+    async def fetch():
+        assert await service.get_available_voices() == [{"id": "voice-1", "name": "Rachel"}]
+        assert await service.get_available_voices() == [{"id": "voice-1", "name": "Rachel"}]
+        assert service.client.voices.calls == 1
+
+        monkeypatch.setattr(settings, "elevenlabs_voices_ttl_seconds", 0)
+        await asyncio.sleep(0.01)
+        assert await service.get_available_voices() == [{"id": "voice-1", "name": "Rachel"}]
+        await service.voices_refresh
+        assert (await service.get_available_voices())[0]["id"] == "voice-2"
+
+    asyncio.run(fetch())
@@ -0,0 +1,35 @@
+import time
+
+from app.embedding_cache import EmbeddingCache, parse_faq_questions
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Test a new cache instance reads embeddings written by another"""
+    path = str(tmp_path / "embeddings.sqlite3")
+    EmbeddingCache(path).put("model-a", "What are your hours?", [0.5, 0.25])
+
+    cache = EmbeddingCache(path)
+    assert cache.get("model-a", "  what are your HOURS ") == [0.5, 0.25]
+    assert cache.get("model-b", "What are your hours?") is None
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_disk_tier_expires_and_caps_rows(tmp_path, monkeypatch):
+    """Test disk rows past the TTL are neither served nor kept, and only the newest rows are kept past the cap"""
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path, ttl_seconds=60, max_disk_rows=2)
+    cache.put("model-a", "old", [1.0])
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    for text in ("one", "two", "three"):
+        cache.put_many("model-a", [text], [[2.0]])
+
+    cache = EmbeddingCache(path, ttl_seconds=60, max_disk_rows=2)
+    assert cache.get("model-a", "old") is None
+    assert cache.stats()["pruned"] == 2
+    assert [cache.get("model-a", text) is not None for text in ("one", "two", "three")].count(True) == 2
+    assert cache._execute("SELECT COUNT(*) FROM embeddings", ())[0][0] == 2
+
+def test_parse_faq_questions():
+    """Test questions are found whether answers share the line or not"""
+    faqs = "Q: Do you take insurance? A: Yes.\n\n  Q: Do you see children?\n  A: Yes."
+    assert parse_faq_questions(faqs) == ["Do you take insurance?", "Do you see children?"]
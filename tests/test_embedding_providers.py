@@ -0,0 +1,76 @@
+import tempfile
+
+import numpy as np
+from tokenizers import Tokenizer, models, pre_tokenizers
+
+from app.embedding_providers import LocalEmbeddings, collection_model
+from app.lexical_index import LexicalIndexStore
+from app.numpy_index import NumpyVectorClient
+from app.vector_store import VectorStore
+
+VOCABULARY = {"[PAD]": 0, "[UNK]": 1, "opening": 2, "hours": 3, "parking": 4, "insurance": 5}
+
+class FakeSession:
+    """Returns each token's one-hot vector as its hidden state and records batch shapes"""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, outputs, feeds):
+        self.batches.append(feeds["input_ids"].shape)
+        return [np.eye(len(VOCABULARY), dtype=np.float32)[feeds["input_ids"]]]
+
+def local_embeddings(batch_size=2):
+    tokenizer = Tokenizer(models.WordLevel(VOCABULARY, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+    embeddings = LocalEmbeddings("/models/test-minilm", batch_size=batch_size)
+    embeddings.session, embeddings.tokenizer = FakeSession(), tokenizer
+    return embeddings
+
+def test_local_embeddings_pool_batches_and_keep_order():
+    """Test texts are batched by length, mean-pooled over real tokens and returned in input order"""
+    embeddings = local_embeddings()
+    texts = ["parking", "opening hours parking insurance", "insurance", "opening hours"]
+
+    vectors = np.array(embeddings.embed_documents(texts))
+
+    assert embeddings.model == "test-minilm"
+    assert embeddings.session.batches == [(2, 1), (2, 4)]
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1, rtol=1e-6)
+    assert vectors[0].argmax() == VOCABULARY["parking"]
+    np.testing.assert_allclose(vectors[3][[2, 3]], [2 ** -0.5, 2 ** -0.5], rtol=1e-6)
+    assert vectors[3][0] == 0
+
+class FakeEmbeddings:
+    def __init__(self, model, dimensions):
+        self.model = model
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] + [1.0] * (self.dimensions - 1) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def test_model_switch_reindexes_collection(tmp_path):
+    """Test a collection built with another model is hidden from search until re-embedded"""
+    vector_store = VectorStore.__new__(VectorStore)
+    vector_store.client = NumpyVectorClient(str(tmp_path))
+    vector_store.lexical_index = LexicalIndexStore(tempfile.mkdtemp())
+    vector_store.text_splitter = type("Splitter", (), {"split_text": staticmethod(lambda text: text.split("|"))})()
+    vector_store.embeddings = FakeEmbeddings("remote-model", 4)
+    vector_store.add_knowledge("c1", "opening hours|parking", "faq")
+    assert collection_model(vector_store.get_collection("c1")) == "remote-model"
+
+    scheduled = []
+    vector_store.schedule_reindex = scheduled.append
+    vector_store.embeddings = FakeEmbeddings("local-model", 2)
+    assert vector_store.get_collection("c1") is None
+    assert scheduled == ["c1"]
+
+    collection = vector_store.reindex_client("c1")
+    assert collection_model(collection) == "local-model"
+    assert collection.snapshot[3].dimensions == 2
+    assert sorted(collection.get()["documents"]) == ["opening hours", "parking"]
+    assert vector_store.get_collection("c1") is not None
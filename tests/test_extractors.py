@@ -0,0 +1,103 @@
+import os
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from app.config import settings
+from app.exceptions import DocumentTooLargeError
+import app.extractors as extractors
+from app.extractors import extract_pages, extractor_for, parallel_pdf_pages, serial_pdf_pages
+from app.vector_store import VectorStore
+
+def write_pdf(path, pages):
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica")
+    }))
+    for number in range(pages):
+        page = PageObject.create_blank_page(width=612, height=792)
+        text = DecodedStreamObject()
+        text.set_data(f"BT /F1 10 Tf 40 760 Td (Page {number} covers opening hours) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(text)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+        writer.add_page(page)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def test_extractor_for_uses_extension_then_mime_type():
+    """Test uploads are matched by file name, falling back to the MIME type"""
+    assert extractor_for("Menu.PDF") == ".pdf"
+    assert extractor_for("notes", "text/plain; charset=utf-8") == ".txt"
+    assert extractor_for("virus.exe", "application/octet-stream") is None
+
+def test_pdf_pages_stream_in_order_and_respect_page_limit(monkeypatch):
+    """Test PDF pages come out in order, serially or from worker processes, within the page limit"""
+    path = os.path.join(tempfile.mkdtemp(), "menu.pdf")
+    write_pdf(path, 7)
+    monkeypatch.setattr(settings, "extraction_pages_per_task", 3)
+
+    pages_total, pages = extract_pages(path)
+    pages = list(pages)
+    assert pages_total == 7
+    assert [page.strip() for page in pages] == [f"Page {number} covers opening hours" for number in range(7)]
+
+    ranges = [(0, 3), (3, 6), (6, 7)]
+    assert list(parallel_pdf_pages(path, ranges, 2)) == list(serial_pdf_pages(path, ranges)) == pages
+
+    monkeypatch.setattr(settings, "extraction_max_pages", 5)
+    with pytest.raises(DocumentTooLargeError):
+        extract_pages(path)
+
+def test_split_pages_matches_splitting_whole_text():
+    """Test chunking page by page covers the text like splitting it in one go"""
+    vector_store = VectorStore.__new__(VectorStore)
+    vector_store.text_splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=20, length_function=len)
+    pages = [" ".join(f"page{page}word{word}" for word in range(400)) for page in range(30)]
+
+    short = list(vector_store.split_pages(pages[:1]))
+    assert short == vector_store.text_splitter.split_text(pages[0])
+
+    chunks = list(vector_store.split_pages(iter(pages)))
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert set(" ".join(chunks).split()) == set("\n".join(pages).split())
+
+def test_daemonic_workers_parse_serially(monkeypatch):
+    """Test a Celery prefork child, which can't start processes, parses large PDFs in-process"""
+    path = os.path.join(tempfile.mkdtemp(), "menu.pdf")
+    write_pdf(path, 4)
+    monkeypatch.setattr(settings, "extraction_parallel_pages", 2)
+    monkeypatch.setattr(settings, "extraction_workers", 2)
+    monkeypatch.setattr(extractors.os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(extractors.multiprocessing, "current_process", lambda: SimpleNamespace(daemon=True))
+    monkeypatch.setattr(extractors, "parallel_pdf_pages", None)
+
+    pages_total, pages = extract_pages(path)
+    assert pages_total == 4
+    assert len(list(pages)) == 4
+
+def test_docx_pages_are_counted_and_limited(monkeypatch):
+    """Test DOCX text comes out in page-sized blocks, and long documents hit the page limit"""
+    import docx
+
+    path = os.path.join(tempfile.mkdtemp(), "faq.docx")
+    document = docx.Document()
+    for number in range(40):
+        document.add_paragraph(f"Question {number}: " + "we are open from nine until five " * 5)
+    document.save(path)
+
+    pages_total, pages = extract_pages(path)
+    pages = list(pages)
+    assert pages_total == len(pages) == 3
+    assert "\n".join(pages).split("\n") == [paragraph.text for paragraph in docx.Document(path).paragraphs]
+
+    monkeypatch.setattr(settings, "extraction_max_pages", 2)
+    with pytest.raises(DocumentTooLargeError):
+        extract_pages(path)
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from fastapi import BackgroundTasks
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.ingestion_service as ingestion_module
+import app.main as main
+from app.config import settings
+from app.container import container
+from app.database import Base, IngestionJob, Knowledge
+from app.ingestion_service import IngestionService
+from app.lexical_index import LexicalIndexStore
+from app.tasks.ingestion_tasks import ingest_knowledge
+from app.vector_store import VectorStore
+
+class FakeEmbeddings:
+    """Embeds each text as its length and fails the requests numbered in ``failing``"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requests = []
+
+    def embed_documents(self, texts):
+        self.requests.append(list(texts))
+        if len(self.requests) in self.failing:
+            raise ConnectionError("rate limited")
+        return [[float(len(text))] for text in texts]
+
+class FakeCollection:
+    def __init__(self):
+        self.chunks = {}
+
+    def add(self, embeddings, documents, metadatas, ids):
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.chunks[doc_id] = (document, metadata["source"])
+
+    def get(self, ids=None, where=None, include=None):
+        doc_ids = [doc_id for doc_id, (_, source) in self.chunks.items() if where is None or source == where["source"]]
+        return {"ids": doc_ids, "documents": [self.chunks[doc_id][0] for doc_id in doc_ids]}
+
+    def delete(self, ids):
+        for doc_id in ids:
+            del self.chunks[doc_id]
+
+def make_store(embeddings):
+    vector_store = VectorStore.__new__(VectorStore)
+    vector_store.embeddings = embeddings
+    vector_store.collection = FakeCollection()
+    vector_store.text_splitter = type("Splitter", (), {"split_text": staticmethod(lambda text: text.split("|"))})()
+    vector_store.create_collection_for_client = lambda client_id: vector_store.collection
+    vector_store.lexical_index = LexicalIndexStore(tempfile.mkdtemp())
+    return vector_store
+
+def setup_service(monkeypatch, embeddings, content):
+    path = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{path}/jobs.db")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(ingestion_module, "SessionLocal", session_factory)
+    monkeypatch.setattr(settings, "ingestion_spool_path", path)
+    monkeypatch.setattr(settings, "embedding_batch_size", 2)
+    monkeypatch.setattr(settings, "embedding_max_retries", 0)
+
+    service = IngestionService(make_store(embeddings))
+    db = session_factory()
+    job = service.create_job(db, "c1", "faq.txt", ".txt")
+    with open(job.file_path, "w") as f:
+        f.write(content)
+    return service, db, job
+
+def test_job_parses_embeds_and_records_progress(monkeypatch):
+    """Test a job embeds its file in batches, records the source and removes the spooled file"""
+    embeddings = FakeEmbeddings()
+    service, db, job = setup_service(monkeypatch, embeddings, "a|bb|ccc|dddd|eeeee")
+
+    service.run(job.job_id)
+
+    db.refresh(job)
+    assert job.status == "completed"
+    assert (job.pages_parsed, job.chunks_total, job.chunks_embedded, job.failures) == (1, 5, 5, 0)
+    assert [len(request) for request in embeddings.requests] == [2, 2, 1]
+    assert db.query(Knowledge).filter(Knowledge.source == "faq.txt").count() == 1
+    assert not os.path.exists(job.file_path)
+
+def test_failed_job_resumes_without_re_embedding(monkeypatch):
+    """Test a job that lost a batch is failed, keeps its progress and only retries what is missing"""
+    embeddings = FakeEmbeddings(failing={2})
+    service, db, job = setup_service(monkeypatch, embeddings, "a|bb|ccc|dddd|eeeee")
+
+    service.run(job.job_id)
+    db.refresh(job)
+    assert job.status == "failed"
+    assert (job.chunks_embedded, job.failures) == (3, 2)
+    assert service.resume(db, job)
+
+    service.run(job.job_id)
+    db.refresh(job)
+    assert job.status == "completed"
+    assert job.attempts == 2
+    assert embeddings.requests[-1] == ["ccc", "dddd"]
+    assert len(service.vector_store.collection.chunks) == 5
+
+def test_cancelled_job_is_not_run(monkeypatch):
+    """Test a job cancelled while queued is skipped and can be resumed later"""
+    embeddings = FakeEmbeddings()
+    service, db, job = setup_service(monkeypatch, embeddings, "a|bb")
+
+    assert service.cancel(db, job)
+    service.run(job.job_id)
+    assert embeddings.requests == []
+    assert not service.cancel(db, job)
+    assert service.resume(db, job)
+    assert db.query(IngestionJob).filter(IngestionJob.job_id == job.job_id).one().status == "queued"
+
+def test_enqueue_fails_the_job_when_the_broker_hangs(monkeypatch):
+    """Test a broker that doesn't answer fails the job instead of stalling the request or running it twice"""
+    service, db, job = setup_service(monkeypatch, FakeEmbeddings(), "a|bb")
+    monkeypatch.setitem(container.services, "ingestion_service", service)
+    monkeypatch.setattr(settings, "ingestion_use_celery", True)
+    monkeypatch.setattr(settings, "ingestion_enqueue_timeout_seconds", 0.05)
+    monkeypatch.setattr(ingest_knowledge, "delay", lambda job_id: time.sleep(0.5))
+    background_tasks = BackgroundTasks()
+
+    async def enqueue():
+        started = time.monotonic()
+        await main.enqueue_ingestion(db, job, background_tasks)
+        return time.monotonic() - started
+
+    assert asyncio.run(enqueue()) < 0.5
+    assert background_tasks.tasks == []
+    db.refresh(job)
+    assert job.status == "failed"
+    assert service.resumable(job)
+
+def test_failed_spool_leaves_no_partial_upload(monkeypatch):
+    """Test an upload that breaks off mid-spool is removed so it can't be resumed half-written"""
+    class BrokenUpload:
+        def __init__(self):
+            self.reads = 0
+
+        async def read(self, size):
+            self.reads += 1
+            if self.reads > 1:
+                raise ConnectionError("client disconnected")
+            return b"a|bb"
+
+    service, db, job = setup_service(monkeypatch, FakeEmbeddings(), "")
+    try:
+        asyncio.run(service.spool(BrokenUpload(), job))
+    except ConnectionError:
+        pass
+    assert not os.path.exists(job.file_path)
@@ -0,0 +1,41 @@
+from app.lexical_index import BM25Index, LexicalIndexStore, tokenize
+
+def test_tokenize_keeps_names_and_numbers():
+    """Test stopwords are dropped but names and street numbers are kept"""
+    assert tokenize("Do you take Delta Dental at 42 Main St?") == ["take", "delta", "dental", "42", "main", "st"]
+
+def test_bm25_prefers_rare_terms_and_supports_removal():
+    """Test a chunk with the rare query term ranks first and removed chunks vanish"""
+    index = BM25Index()
+    index.add("a", "Invisalign clear aligners are available for adults")
+    index.add("b", "Cleanings are available for adults and children")
+    index.add("c", "Adults and children welcome")
+
+    assert index.search("invisalign for adults", 2)[0][0] == "a"
+
+    index.remove("a")
+    assert index.search("invisalign", 2) == []
+    assert index.total_length == sum(index.lengths.values())
+
+def test_store_updates_incrementally_and_persists(tmp_path):
+    """Test updates change a copy on disk that a fresh store can read"""
+    store = LexicalIndexStore(str(tmp_path))
+    assert store.update("c1", {"x": "hello"}, []) is None
+
+    store.build("c1", {"x": "Delta Dental accepted", "y": "Free parking"})
+    store.update("c1", {"z": "Open Saturdays"}, ["y"])
+
+    reloaded = LexicalIndexStore(str(tmp_path)).get("c1")
+    assert sorted(reloaded.documents) == ["x", "z"]
+    assert reloaded.search("saturdays")[0][0] == "z"
+
+def test_concurrent_workers_updates_are_not_lost(tmp_path):
+    """Test an update from a worker holding an older copy applies on top of the latest file"""
+    first, second = LexicalIndexStore(str(tmp_path)), LexicalIndexStore(str(tmp_path))
+    first.build("client-1", {"a": "Invisalign aligners"})
+    second.get("client-1")
+
+    first.update("client-1", {"b": "Teeth whitening"}, [])
+    second.update("client-1", {"c": "Emergency appointments"}, [])
+
+    assert set(LexicalIndexStore(str(tmp_path)).get("client-1").documents) == {"a", "b", "c"}
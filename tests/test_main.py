@@ -51,4 +51,44 @@ def test_health_check():
     """Test health check endpoint"""
     response = client.get("/health")
     assert response.status_code == 200
-    assert response.json()["status"] == "healthy"
\ No newline at end of file
+    assert response.json()["status"] == "healthy"
+
+def test_audio_is_synthesised_once_and_served_with_ranges(monkeypatch, tmp_path):
+    """Test cached audio supports ranges and revalidation, and voices can't fetch each other's keys"""
+    import app.main as main
+    from app.audio_cache import AudioCache
+    
+    cache = AudioCache(str(tmp_path), 1024 * 1024)
+    calls = []
+    monkeypatch.setattr(main, "audio_cache", cache)
+    
+    async def synthesise(entry):
+        calls.append(entry["text"])
+        return b"0123456789"
+    
+    async def stream(entry):
+        calls.append(entry["text"])
+        yield b"01234"
+        yield b"56789"
+    
+    monkeypatch.setattr(main, "synthesise_audio", synthesise)
+    monkeypatch.setattr(main, "stream_audio", stream)
+    key = cache.register("Hello", "voice-a", "model", "mp3_44100_128")
+    
+    # The first request streams the audio as it is synthesised, later ones are served from disk
+    response = client.get(f"/audio/voice-a/{key}")
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert client.get(f"/audio/voice-a/{key}").headers["content-length"] == "10"
+    
+    response = client.get(f"/audio/voice-a/{key}", headers={"Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == b"2345"
+    assert response.headers["content-range"] == "bytes 2-5/10"
+    
+    assert client.get(f"/audio/voice-a/{key}", headers={"If-None-Match": f'"{key}"'}).status_code == 304
+    assert client.get(f"/audio/voice-a/{key}", headers={"Range": "bytes=20-"}).status_code == 416
+    assert client.get(f"/audio/voice-b/{key}").status_code == 404
+    assert calls == ["Hello"]
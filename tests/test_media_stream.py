@@ -0,0 +1,128 @@
+import asyncio
+import base64
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.container import container
+from app.media_stream import media_stream_metrics
+from app.speech_recognizer import SpeechRecognizer, VoiceActivityDetector, decode_mulaw, encode_mulaw
+
+# 20 ms frames of 8 kHz μ-law: a loud tone standing in for speech, and silence
+SPEECH = encode_mulaw(8000 * np.sin(np.arange(160) * 2 * np.pi * 440 / 8000))
+SILENCE = encode_mulaw(np.zeros(160))
+
+def utterance(speech_ms: int = 500, silence_ms: int = 800):
+    return [SPEECH] * (speech_ms // 20) + [SILENCE] * (silence_ms // 20)
+
+class FakeRecognizer(SpeechRecognizer):
+    """Hears each utterance as the next of a scripted list of transcripts"""
+
+    def __init__(self, transcripts):
+        super().__init__()
+        self.transcripts = list(transcripts)
+        self.vad = VoiceActivityDetector(800, 200, 600)
+
+    async def send(self, audio):
+        if self.vad.feed(audio) == "end" and self.transcripts:
+            self.results.put_nowait(self.transcripts.pop(0))
+
+class FakeCallHandler:
+    def __init__(self):
+        self.heard = []
+        self.ended = []
+
+    async def stream_call(self, client_data, user_input, call_sid, result):
+        self.heard.append(user_input)
+        yield "Sure."
+        if user_input == "tell me everything":
+            # A long answer the caller talks over
+            await asyncio.Event().wait()
+        yield "We open at nine."
+        result.update({"response": "Sure. We open at nine.", "appointment_booked": False, "appointment_data": None})
+
+    async def end_conversation(self, call_sid):
+        self.ended.append(call_sid)
+
+class FakeClientCache:
+    def get_by_phone(self, db, phone_number):
+        return {"client_id": "client-1", "business_name": "Acme Dental", "voice_id": None, "is_active": True}
+
+async def speak(text, voice_id):
+    yield text.encode()
+
+class FakeMediaStreamsClient:
+    """Plays Twilio's side of a media stream: sends caller audio and acknowledges played audio"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+
+    def start(self):
+        self.websocket.send_json({"event": "connected", "protocol": "Call", "version": "1.0.0"})
+        self.websocket.send_json({
+            "event": "start",
+            "streamSid": "MZ1",
+            "start": {"callSid": "CA1", "customParameters": {"To": "+15550100"}}
+        })
+
+    def replay(self, frames):
+        for frame in frames:
+            self.websocket.send_json({
+                "event": "media",
+                "streamSid": "MZ1",
+                "media": {"track": "inbound", "payload": base64.b64encode(frame).decode()}
+            })
+
+    def hear(self):
+        """Audio sent until the next mark, which is echoed back as if played"""
+        audio = b""
+        while True:
+            message = self.websocket.receive_json()
+            if message["event"] == "mark":
+                self.websocket.send_json(message)
+                return audio.decode()
+            assert message["event"] == "media"
+            audio += base64.b64decode(message["media"]["payload"])
+
+def test_mulaw_round_trip_and_voice_activity():
+    """Test μ-law audio decodes to what it encoded and speech is detected between pauses"""
+    samples = np.array([-32000, -1000, 0, 1000, 32000])
+    assert np.allclose(decode_mulaw(encode_mulaw(samples)), samples, rtol=0.05)
+
+    vad = VoiceActivityDetector(800, 200, 600)
+    events = [vad.feed(frame) for frame in utterance()]
+    assert [event for event in events if event] == ["start", "end"]
+    assert events.index("start") == 9
+
+def test_media_stream_call_answers_and_handles_barge_in(monkeypatch):
+    """Test a call over a media stream is greeted, answered chunk by chunk, and can talk over a reply"""
+    call_handler = FakeCallHandler()
+    monkeypatch.setitem(container.services, "call_handler", call_handler)
+    monkeypatch.setattr(main, "client_cache", FakeClientCache())
+    monkeypatch.setattr(main, "create_speech_recognizer", lambda: FakeRecognizer(["when do you open", "tell me everything"]))
+    monkeypatch.setattr("app.media_stream.speech_audio", speak)
+    monkeypatch.setattr(main.call_log_writer, "log_turn", lambda *args: None)
+    barge_ins = media_stream_metrics.barge_ins
+
+    with TestClient(main.app).websocket_connect("/call/media-stream") as websocket:
+        caller = FakeMediaStreamsClient(websocket)
+        caller.start()
+        assert caller.hear() == "Hello! Thank you for calling Acme Dental. How can I help you today?"
+
+        caller.replay(utterance())
+        assert [caller.hear(), caller.hear()] == ["Sure.", "We open at nine."]
+
+        caller.replay(utterance())
+        assert websocket.receive_json()["event"] == "media"
+        # The mark for "Sure." isn't echoed: the caller talks while it is still playing
+        assert websocket.receive_json()["event"] == "mark"
+        caller.replay([SPEECH] * 15)
+        assert websocket.receive_json() == {"event": "clear", "streamSid": "MZ1"}
+
+        websocket.send_json({"event": "stop", "streamSid": "MZ1"})
+
+    assert call_handler.heard == ["when do you open", "tell me everything"]
+    assert call_handler.ended == ["CA1"]
+    assert media_stream_metrics.barge_ins == barge_ins + 1
+    assert media_stream_metrics.stats()["first_audio_ms_p50"] is not None
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import scripts.migrate_call_turns as migrate_module
+from app.database import Base, CallLog, CallTurn
+from app.main import load_conversations
+from scripts.migrate_call_turns import migrate_call_turns
+
+CONVERSATION = [
+    {"role": "user", "content": "when do you open", "timestamp": "2024-03-01T09:00:05"},
+    {"role": "assistant", "content": "We open at nine.", "timestamp": "2024-03-01T09:00:06"},
+    {"role": "user", "content": "thanks"}
+]
+
+def test_migrated_conversation_reads_back_from_call_turns(monkeypatch, tmp_path):
+    """Test a legacy JSON conversation is copied into call_turns once and reads back as it was stored"""
+    engine = create_engine(f"sqlite:///{tmp_path}/calls.db")
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    monkeypatch.setattr(migrate_module, "engine", engine)
+    monkeypatch.setattr(migrate_module, "SessionLocal", SessionLocal)
+
+    db = SessionLocal()
+    created_at = datetime(2024, 3, 1, 9, 0)
+    db.add(CallLog(client_id="client-1", caller_phone="+15550101", call_sid="CA1", conversation=CONVERSATION, created_at=created_at))
+    db.commit()
+    db.close()
+
+    migrate_call_turns(clear_legacy=True)
+    # Running it again must not copy the conversation twice
+    migrate_call_turns(clear_legacy=True)
+
+    db = SessionLocal()
+    try:
+        turns = db.query(CallTurn).filter(CallTurn.call_sid == "CA1").order_by(CallTurn.seq).all()
+        assert [(turn.seq, turn.role, turn.content) for turn in turns] == [
+            (0, "user", "when do you open"),
+            (1, "assistant", "We open at nine."),
+            (2, "user", "thanks")
+        ]
+        # A message saved without a timestamp starts when the call did
+        assert turns[2].started_at == created_at and turns[2].completed_at is None
+
+        call = db.query(CallLog).filter(CallLog.call_sid == "CA1").one()
+        assert call.conversation is None
+        conversations = load_conversations(db, [call])
+    finally:
+        db.close()
+
+    assert conversations["CA1"] == [
+        {"role": "user", "content": "when do you open", "timestamp": "2024-03-01T09:00:05", "latency_ms": None},
+        {"role": "assistant", "content": "We open at nine.", "timestamp": "2024-03-01T09:00:06", "latency_ms": None},
+        {"role": "user", "content": "thanks", "timestamp": "2024-03-01T09:00:00", "latency_ms": None}
+    ]
+
+def test_partially_migrated_conversation_keeps_its_legacy_history(monkeypatch, tmp_path):
+    """Test clearing legacy history spares a call whose turns are only partly in call_turns"""
+    engine = create_engine(f"sqlite:///{tmp_path}/calls.db")
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    monkeypatch.setattr(migrate_module, "engine", engine)
+    monkeypatch.setattr(migrate_module, "SessionLocal", SessionLocal)
+
+    db = SessionLocal()
+    db.add_all([
+        # Spanned the deploy: one turn was written to call_turns, the rest only to the JSON
+        CallLog(client_id="client-1", caller_phone="+15550101", call_sid="CA1", conversation=CONVERSATION),
+        CallTurn(call_sid="CA1", seq=0, role="user", content="when do you open"),
+        # Already migrated in full by an earlier run
+        CallLog(client_id="client-1", caller_phone="+15550102", call_sid="CA2", conversation=CONVERSATION[:1]),
+        CallTurn(call_sid="CA2", seq=0, role="user", content="when do you open")
+    ])
+    db.commit()
+    db.close()
+
+    migrate_call_turns(clear_legacy=True)
+
+    db = SessionLocal()
+    try:
+        assert db.query(CallTurn).filter(CallTurn.call_sid == "CA1").count() == 1
+        assert db.query(CallLog).filter(CallLog.call_sid == "CA1").one().conversation == CONVERSATION
+        assert db.query(CallLog).filter(CallLog.call_sid == "CA2").one().conversation is None
+    finally:
+        db.close()
@@ -0,0 +1,144 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from app.numpy_index import NumpyVectorClient
+
+def test_query_returns_nearest_by_squared_l2(tmp_path):
+    """Test top-k matches a brute-force search and uses Chroma's distance"""
+    client = NumpyVectorClient(str(tmp_path))
+    collection = client.create_collection("client_a")
+    vectors = np.random.default_rng(0).random((50, 8)).astype(np.float32)
+    collection.add(
+        embeddings=vectors.tolist(),
+        documents=[f"doc {i}" for i in range(50)],
+        metadatas=[{"source": "s"} for _ in range(50)],
+        ids=[f"id{i}" for i in range(50)]
+    )
+
+    query = vectors[7] + 0.01
+    results = collection.query(query_embeddings=[query.tolist()], n_results=3)
+
+    expected = np.argsort(((vectors - query) ** 2).sum(axis=1))[:3]
+    assert results["ids"][0] == [f"id{i}" for i in expected]
+    assert results["distances"][0][0] == pytest.approx(float(((vectors[7] - query) ** 2).sum()), rel=1e-3)
+
+def test_changes_persist_and_reload(tmp_path):
+    """Test adds and deletes survive a new client and replace rows by id"""
+    client = NumpyVectorClient(str(tmp_path))
+    collection = client.create_collection("client_a")
+    collection.add(embeddings=[[1, 0], [0, 1]], documents=["a", "b"], metadatas=[{"source": "x"}, {"source": "y"}], ids=["1", "2"])
+    collection.add(embeddings=[[1, 1]], documents=["a2"], metadatas=[{"source": "x"}], ids=["1"])
+    collection.delete(ids=["2"])
+
+    reloaded = NumpyVectorClient(str(tmp_path)).get_collection("client_a")
+    assert reloaded.get(where={"source": "x"}, include=[])["ids"] == ["1"]
+    assert reloaded.query(query_embeddings=[[1, 1]], n_results=5)["documents"] == [["a2"]]
+    assert len(list(tmp_path.joinpath("client_a").glob("vectors-*.f32"))) == 1
+
+def test_missing_collection_and_eviction(tmp_path):
+    """Test unknown tenants raise like Chroma and only max_loaded stay in memory"""
+    client = NumpyVectorClient(str(tmp_path), max_loaded=2)
+    with pytest.raises(ValueError):
+        client.get_collection("client_missing")
+
+    for name in ("client_a", "client_b", "client_c"):
+        client.create_collection(name)
+    assert list(client.collections) == ["client_b", "client_c"]
+    assert client.get_collection("client_a").count() == 0
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_quantised_storage_reranks_to_exact_results(tmp_path, precision):
+    """Test quantised collections are smaller and, re-ranked, return the float32 top-k"""
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(300, 64)).astype(np.float32)
+    exact = NumpyVectorClient(str(tmp_path / "exact")).create_collection("client_a")
+    quantised = NumpyVectorClient(str(tmp_path / "quantised"), precision=precision).create_collection("client_a")
+    compact = NumpyVectorClient(str(tmp_path / "compact"), precision=precision, keep_exact=False).create_collection("client_a")
+    for collection in (exact, quantised, compact):
+        collection.add(
+            embeddings=vectors.tolist(),
+            documents=[f"doc {i}" for i in range(300)],
+            metadatas=[{"source": "s"} for _ in range(300)],
+            ids=[f"id{i}" for i in range(300)]
+        )
+
+    queries = (vectors[:20] + rng.normal(scale=0.3, size=(20, 64))).tolist()
+    expected = exact.query(query_embeddings=queries, n_results=5)
+    results = quantised.query(query_embeddings=queries, n_results=5)
+    assert results["ids"] == expected["ids"]
+    np.testing.assert_allclose(results["distances"], expected["distances"], rtol=1e-4)
+
+    scanned = {"float16": 2, "int8": 1}[precision] * 300 * 64
+    assert compact.nbytes()["disk"] < exact.nbytes()["disk"]
+    assert quantised.nbytes()["scanned"] < exact.nbytes()["scanned"] / 1.9
+    assert compact.snapshot[3].codes.nbytes == scanned
+
+def test_rewrite_converts_existing_collection(tmp_path):
+    """Test a float32 collection is converted in place when reopened at another precision"""
+    collection = NumpyVectorClient(str(tmp_path)).create_collection("client_a")
+    collection.add(embeddings=[[1, 0], [0, 2]], documents=["a", "b"], metadatas=[{"source": "x"}] * 2, ids=["1", "2"])
+
+    converted = NumpyVectorClient(str(tmp_path), precision="int8", keep_exact=False).get_collection("client_a")
+    converted.rewrite()
+
+    reloaded = NumpyVectorClient(str(tmp_path)).get_collection("client_a")
+    assert reloaded.snapshot[3].precision == "int8"
+    assert reloaded.get(include=["embeddings"])["embeddings"] == [[1, 0], [0, 2]]
+    assert sorted(path.name.split("-")[0] for path in tmp_path.joinpath("client_a").glob("*-*")) == ["codes", "norms", "scales"]
+
+@pytest.mark.parametrize("precision", ["float32", "int8"])
+def test_filtered_query_only_scores_matching_rows(tmp_path, precision):
+    """Test a where filter, including Chroma's $and form, limits queries and gets to matching rows"""
+    collection = NumpyVectorClient(str(tmp_path), precision=precision).create_collection("shared_0")
+    vectors = np.random.default_rng(0).random((40, 8)).astype(np.float32)
+    collection.add(
+        embeddings=vectors.tolist(),
+        documents=[f"doc {i}" for i in range(40)],
+        metadatas=[{"client_id": f"c{i % 4}", "source": f"s{i % 2}"} for i in range(40)],
+        ids=[f"id{i}" for i in range(40)]
+    )
+
+    results = collection.query(query_embeddings=[vectors[5].tolist()], n_results=3, where={"client_id": "c1"})
+    rows = np.arange(1, 40, 4)
+    expected = rows[np.argsort(((vectors[rows] - vectors[5]) ** 2).sum(axis=1))[:3]]
+    assert results["ids"][0] == [f"id{i}" for i in expected]
+    assert results["distances"][0][0] == pytest.approx(0, abs=1e-3)
+
+    found = collection.get(where={"$and": [{"client_id": "c2"}, {"source": "s0"}]}, include=[])
+    assert found["ids"] == [f"id{i}" for i in range(2, 40, 4)]
+    assert collection.query(query_embeddings=[vectors[0].tolist()], n_results=3, where={"client_id": "c9"})["ids"] == [[]]
+
+def test_writers_with_stale_snapshots_keep_each_others_rows(tmp_path):
+    """Test a write from an out-of-date collection object (another worker's) doesn't undo newer rows"""
+    first = NumpyVectorClient(str(tmp_path)).create_collection("client_a")
+    second = NumpyVectorClient(str(tmp_path)).get_collection("client_a")
+
+    first.add(embeddings=[[1.0, 0.0]], documents=["upload"], metadatas=[{"source": "pdf"}], ids=["a"])
+    second.add(embeddings=[[0.0, 1.0]], documents=["text"], metadatas=[{"source": "text"}], ids=["b"])
+    first.delete(ids=["a"])
+
+    assert NumpyVectorClient(str(tmp_path)).get_collection("client_a").get()["ids"] == ["b"]
+    # Only the files the current metadata points at are left
+    with open(tmp_path / "client_a" / "meta.json") as f:
+        meta = json.load(f)
+    assert [name for name in os.listdir(tmp_path / "client_a") if name.startswith("vectors")] == [meta["vectors"]]
+
+def test_copy_from_chroma_keeps_collection_metadata(tmp_path):
+    """Test a collection copied from Chroma keeps the embedding model it was built with"""
+    import chromadb
+
+    from scripts.migrate_vector_precision import copy_from_chroma
+
+    chroma = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    source = chroma.create_collection("client_a", metadata={"embedding_model": "all-MiniLM-L6-v2"})
+    source.add(embeddings=[[1.0, 0.0], [0.0, 2.0]], documents=["a", "b"], metadatas=[{"source": "x"}] * 2, ids=["1", "2"])
+
+    client = NumpyVectorClient(str(tmp_path / "index"))
+    assert [name for name, _ in copy_from_chroma(client, str(tmp_path / "chroma"))] == ["client_a"]
+
+    copied = NumpyVectorClient(str(tmp_path / "index")).get_collection("client_a")
+    assert copied.metadata == {"embedding_model": "all-MiniLM-L6-v2"}
+    assert copied.get()["ids"] == ["1", "2"]
@@ -0,0 +1,51 @@
+import asyncio
+
+from app.audio_cache import AudioCache
+from app.phrase_bank import PhraseBank, client_phrases, greeting
+
+class FakeElevenLabsService:
+    def __init__(self):
+        self.texts = []
+
+    async def synthesise(self, entry):
+        self.texts.append(entry["text"])
+        return b"x" * 100
+
+async def padding(entry):
+    return b"x" * 100
+
+def make_client(**overrides):
+    client = {"client_id": "client-1", "business_name": "Acme Dental", "voice_id": "voice-a"}
+    client.update(overrides)
+    return client
+
+def test_render_synthesises_only_missing_phrases(tmp_path):
+    """Test a client's phrases are synthesised once, and a new name re-renders just the greeting"""
+    service = FakeElevenLabsService()
+    bank = PhraseBank(AudioCache(str(tmp_path), 10000), service)
+
+    assert asyncio.run(bank.render(make_client())) == len(client_phrases(make_client()))
+    assert asyncio.run(bank.render(make_client())) == 0
+    assert asyncio.run(bank.render(make_client(business_name="Acme Orthodontics"))) == 1
+    assert service.texts[-1] == greeting("Acme Orthodontics")
+    assert asyncio.run(bank.render(make_client(voice_id=None))) == 0
+
+def test_pinned_phrases_survive_eviction(tmp_path):
+    """Test eviction removes other audio before a client's rendered phrases"""
+    cache = AudioCache(str(tmp_path), 1000)
+    bank = PhraseBank(cache, FakeElevenLabsService())
+    asyncio.run(bank.render(make_client()))
+    phrase_keys = [cache.register(text, "voice-a") for text in client_phrases(make_client())]
+
+    for i in range(10):
+        key = cache.register(f"Answer {i}", "voice-a")
+        asyncio.run(cache.fill(key, cache.entry(key), padding))
+
+    assert all(cache.exists(key, cache.entry(key)["output_format"]) for key in phrase_keys)
+    assert cache.stats()["bytes"] <= 1000
+
+    # Once the greeting changes the old one is no longer pinned
+    asyncio.run(bank.render(make_client(business_name="Acme Orthodontics")))
+    key = cache.register("One more answer", "voice-a")
+    asyncio.run(cache.fill(key, cache.entry(key), padding))
+    assert not cache.exists(phrase_keys[0], cache.entry(phrase_keys[0])["output_format"])
@@ -0,0 +1,28 @@
+from app.prompt_compiler import PromptCompiler
+
+CLIENT = {
+    "client_id": "prompt-test",
+    "business_name": "Prompt Dental",
+    "phone_number": "+15550002222",
+    "business_hours": {"monday": {"open": "09:00", "close": "17:00"}},
+    "faqs": "Q: Do you take insurance?\nA: Yes.",
+    "updated_at": "2024-01-01T00:00:00"
+}
+
+def test_static_prefix_comes_first():
+    """Test retrieved knowledge is appended after the cacheable prefix"""
+    compiler = PromptCompiler()
+    prefix, token_count = compiler.static_prefix(CLIENT)
+    prompt = compiler.render(CLIENT, [{"content": "Parking is free."}])
+    assert prompt.startswith(prefix)
+    assert prompt.rstrip().endswith("Parking is free.")
+    assert token_count > 0
+
+def test_prefix_recompiles_when_client_changes():
+    """Test a new updated_at or an invalidation rebuilds the prefix"""
+    compiler = PromptCompiler()
+    compiler.static_prefix(CLIENT)
+    updated = dict(CLIENT, business_name="Renamed Dental", updated_at="2024-02-01T00:00:00")
+    assert "Renamed Dental" in compiler.static_prefix(updated)[0]
+    compiler.invalidate("prompt-test")
+    assert compiler.prefixes == {}
@@ -0,0 +1,24 @@
+from app.response_cache import SemanticResponseCache
+
+CLIENT = {"client_id": "answers-test", "updated_at": "2024-01-01T00:00:00"}
+
+def test_similar_question_is_served_from_cache():
+    """Test a near-duplicate question hits and a different one misses"""
+    cache = SemanticResponseCache(threshold=0.9)
+    cache.store(CLIENT, "What are your hours?", [1.0, 0.0], "Nine to five.", latency=1.5)
+    assert cache.lookup(CLIENT, [0.99, 0.05]) == "Nine to five."
+    assert cache.lookup(CLIENT, [0.0, 1.0]) is None
+    stats = cache.stats()["answers-test"]
+    assert stats["hits"] == 1
+    assert stats["latency_saved_seconds"] == 1.5
+
+def test_profile_change_and_invalidate_clear_answers():
+    """Test answers are dropped when the client or its knowledge changes"""
+    cache = SemanticResponseCache()
+    cache.store(CLIENT, "Do you take insurance?", [1.0, 0.0], "Yes.", latency=1.0)
+    updated = dict(CLIENT, updated_at="2024-02-01T00:00:00")
+    assert cache.lookup(updated, [1.0, 0.0]) is None
+
+    cache.store(updated, "Do you take insurance?", [1.0, 0.0], "Yes.", latency=1.0)
+    cache.invalidate("answers-test")
+    assert cache.lookup(updated, [1.0, 0.0]) is None
@@ -0,0 +1,37 @@
+from app.speech_chunker import SpeechChunker
+
+def stream(chunker, text, size=3):
+    """Feed text to the chunker a few characters at a time"""
+    chunks = []
+    for i in range(0, len(text), size):
+        chunks.extend(chunker.feed(text[i:i + size]))
+    chunks.extend(chunker.flush())
+    return chunks
+
+def test_first_sentence_is_emitted_before_stream_ends():
+    """Test a complete sentence is spoken without waiting for the rest"""
+    chunker = SpeechChunker()
+    chunks = chunker.feed("We are open until five today. We also")
+    assert chunks == ["We are open until five today."]
+    assert chunker.flush() == ["We also"]
+
+def test_short_sentences_are_merged():
+    """Test abbreviations do not produce tiny chunks"""
+    chunks = stream(SpeechChunker(), "Dr. Johnson is in on Monday. See you then!")
+    assert chunks == ["Dr. Johnson is in on Monday.", "See you then!"]
+
+def test_booking_json_is_never_spoken():
+    """Test text after the booking marker is held back as payload"""
+    chunker = SpeechChunker()
+    text = 'Great, let me book that. BOOK_APPOINTMENT: {"name": "Sam", "time": "10:00"}'
+    chunks = stream(chunker, text, size=2)
+    assert chunks == ["Great, let me book that."]
+    assert chunker.booking_payload.strip() == '{"name": "Sam", "time": "10:00"}'
+
+def test_partial_marker_is_held_back():
+    """Test a marker split across tokens is not spoken"""
+    chunker = SpeechChunker()
+    assert chunker.feed("Booking now. BOOK_APP") == ["Booking now."]
+    assert chunker.feed('OINTMENT: {}') == []
+    assert chunker.flush() == []
+    assert chunker.booking_payload == " {}"
@@ -0,0 +1,146 @@
+import asyncio
+import tempfile
+
+from app.config import settings
+from app.lexical_index import LexicalIndexStore
+from app.numpy_index import NumpyVectorClient
+from app.vector_store import VectorStore
+
+class FakeEmbeddings:
+    """Embeds each text as its length and fails the first ``failures`` requests"""
+
+    model = "fake"
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.requests = []
+
+    async def aembed_documents(self, texts):
+        self.requests.append(list(texts))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("rate limited")
+        return [[float(len(text))] for text in texts]
+
+class FakeCollection:
+    def __init__(self):
+        self.adds = []
+        self.chunks = {}
+
+    def add(self, embeddings, documents, metadatas, ids):
+        self.adds.append((embeddings, documents, ids))
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.chunks[doc_id] = (document, metadata["source"])
+
+    def get(self, ids=None, where=None, include=None):
+        rows = [
+            (doc_id, document) for doc_id, (document, source) in self.chunks.items()
+            if where is None or source == where["source"]
+        ]
+        return {"ids": [doc_id for doc_id, _ in rows], "documents": [document for _, document in rows]}
+
+    def delete(self, ids):
+        for doc_id in ids:
+            del self.chunks[doc_id]
+
+def make_store(embeddings, collection):
+    vector_store = VectorStore.__new__(VectorStore)
+    vector_store.embeddings = embeddings
+    vector_store.text_splitter = type("Splitter", (), {"split_text": staticmethod(lambda text: text.split("|"))})()
+    vector_store.create_collection_for_client = lambda client_id: collection
+    vector_store.get_collection = lambda client_id: collection
+    vector_store.lexical_index = LexicalIndexStore(tempfile.mkdtemp())
+    return vector_store
+
+def test_add_knowledge_batches_and_writes_once(monkeypatch):
+    """Test chunks are embedded in batches, in order, and added in one call"""
+    monkeypatch.setattr(settings, "embedding_batch_size", 2)
+    embeddings, collection = FakeEmbeddings(), FakeCollection()
+    vector_store = make_store(embeddings, collection)
+
+    report = asyncio.run(vector_store.aadd_knowledge("c1", "a|bb|ccc|dddd|eeeee", "doc"))
+
+    assert [len(request) for request in embeddings.requests] == [2, 2, 1]
+    assert len(collection.adds) == 1
+    added_embeddings, documents, added_ids = collection.adds[0]
+    assert added_embeddings == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert documents == ["a", "bb", "ccc", "dddd", "eeeee"]
+    assert added_ids == report["document_ids"]
+
+def test_add_knowledge_retries_failed_batches(monkeypatch):
+    """Test a transient embeddings error is retried rather than failing the upload"""
+    monkeypatch.setattr(settings, "embedding_retry_seconds", 0)
+    embeddings, collection = FakeEmbeddings(failures=2), FakeCollection()
+    vector_store = make_store(embeddings, collection)
+
+    report = asyncio.run(vector_store.aadd_knowledge("c1", "a|bb", "doc"))
+
+    assert report["added"] == 2
+    assert len(embeddings.requests) == 3
+
+def test_reupload_embeds_only_changed_chunks():
+    """Test unchanged chunks are skipped and removed ones are deleted"""
+    embeddings, collection = FakeEmbeddings(), FakeCollection()
+    vector_store = make_store(embeddings, collection)
+    asyncio.run(vector_store.aadd_knowledge("c1", "a|bb|ccc", "manual.pdf"))
+    embeddings.requests.clear()
+
+    report = asyncio.run(vector_store.aadd_knowledge("c1", "a|bb|cccc", "manual.pdf"))
+
+    assert embeddings.requests == [["cccc"]]
+    assert (report["added"], report["unchanged"], report["removed"]) == (1, 2, 1)
+    assert sorted(collection.chunks) == sorted(report["document_ids"])
+
+    assert vector_store.delete_source("c1", "manual.pdf") == 3
+    assert collection.chunks == {}
+
+def test_hybrid_search_finds_names_and_drops_weak_chunks(monkeypatch, tmp_path):
+    """Test a lexical match outranks vector neighbours and weak chunks are cut"""
+    monkeypatch.setattr(settings, "retrieval_mode", "hybrid")
+    collection = NumpyVectorClient(str(tmp_path)).create_collection("client_c1")
+    vector_store = make_store(FakeEmbeddings(), collection)
+    chunks = {
+        "hours": ("We are open nine to five on weekdays.", [1.0, 0.0, 0.0]),
+        "parking": ("Parking is free behind the building.", [0.9, 0.43, 0.0]),
+        "insurance": ("We accept Delta Dental and most PPO plans.", [0.0, 0.0, 1.0])
+    }
+    vector_store.apply_source(
+        collection, "c1", "faq",
+        {doc_id: text for doc_id, (text, _) in chunks.items()},
+        [vector for _, vector in chunks.values()],
+        []
+    )
+
+    # By vector alone the hours and parking chunks rank above insurance
+    query_embedding = [0.8, 0.0, 0.6]
+    vector_only = vector_store.query_collection(collection, query_embedding, 3)
+    assert vector_only[-1]["content"].startswith("We accept Delta Dental")
+
+    results = vector_store.retrieve("c1", collection, "do you take delta dental", query_embedding, 3)
+
+    assert results[0]["content"].startswith("We accept Delta Dental")
+    assert len(results) < 3
+
+def test_shared_layout_isolates_clients_and_promotes_large_ones(monkeypatch, tmp_path):
+    """Test small clients share a collection without seeing each other, and a large one moves out"""
+    monkeypatch.setattr(settings, "vector_layout", "shared")
+    monkeypatch.setattr(settings, "vector_shared_collections", 1)
+    monkeypatch.setattr(settings, "vector_dedicated_chunks", 3)
+    vector_store = VectorStore.__new__(VectorStore)
+    vector_store.client = NumpyVectorClient(str(tmp_path))
+    vector_store.embeddings = FakeEmbeddings()
+    vector_store.text_splitter = type("Splitter", (), {"split_text": staticmethod(lambda text: text.split("|"))})()
+    vector_store.lexical_index = LexicalIndexStore(tempfile.mkdtemp())
+
+    asyncio.run(vector_store.aadd_knowledge("c1", "a|bb", "faq"))
+    asyncio.run(vector_store.aadd_knowledge("c2", "aa|b", "faq"))
+    assert vector_store.client.list_collections() == ["shared_0"]
+    results = vector_store.query_collection(vector_store.get_collection("c1"), [2.0], 5)
+    assert [result["content"] for result in results] == ["bb", "a"]
+    assert vector_store.delete_source("c2", "faq") == 2
+    assert vector_store.get_collection("c1").count() == 2
+
+    asyncio.run(vector_store.aadd_knowledge("c1", "a|bb|ccc|dddd", "faq"))
+    assert vector_store.client.list_collections() == ["client_c1", "shared_0"]
+    assert vector_store.client.get_collection("shared_0").count() == 0
+    assert sorted(vector_store.get_collection("c1").get()["documents"]) == ["a", "bb", "ccc", "dddd"]